@@ -1,2 +1,23 @@
 from .generate_synthetic_data import *
-from .plot_squashing_scaler import *
\ No newline at end of file
+from .plot_squashing_scaler import *
+from .persistence import *
+from .report_cache import *
+from .associations import *
+from .streaming_report import *
+from .lazy_report import *
+from .profiling import *
+from .dataops_memory import *
+from .scaler_benchmark import *
+from .dtype_policy import *
+from .sparse_output import *
+from .datetime_cache import *
+from .unique_encoding import *
+from .vector_cache import *
+from .streaming_gap import *
+from .shared_cv import *
+from .linear_scorer import *
+from .scoring_export import *
+from .selector_cache import *
+from .exercise_backends import *
+from .credit_fraud import *
+from .concurrent_dataops import *
\ No newline at end of file
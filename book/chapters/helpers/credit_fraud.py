@@ -0,0 +1,355 @@
+"""
+Generate tables with the schema of the credit fraud dataset, offline and at
+any scale.
+
+The DataOps example of the course uses ``skrub.datasets.fetch_credit_fraud``,
+which downloads the data and has a fixed size (61,241 baskets and 109,380
+products in the train split). This module provides:
+- ``generate_credit_fraud``: write ``baskets.parquet`` (``ID``,
+  ``fraud_flag``) and ``products.parquet`` (``basket_ID``, ``item``,
+  ``cash_price``, ``make``, ``model``, ``goods_code``,
+  ``Nbr_of_prod_purchas``) with any number of baskets, one chunk of baskets at
+  a time, so that the memory used does not depend on the number of baskets
+- ``load_credit_fraud``: read them back, like ``fetch_credit_fraud``
+- ``credit_fraud_plan``: the DataOps plan of the course (vectorize the
+  products, aggregate them per basket, join them to the baskets and fit a
+  classifier)
+- ``main``: time the generation and the fit of the plan at 1x and 10x the
+  size of the real dataset
+
+Fraudulent baskets contain more products, and more often expensive
+electronics, so that the classifier has something to learn. The values are
+made up; only the schema, the cardinalities and the rough distributions follow
+the real data.
+"""
+
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sklearn.utils import Bunch
+
+from .benchmarking import measure, print_results
+
+__all__ = [
+    "CREDIT_FRAUD_BASKETS",
+    "generate_credit_fraud",
+    "load_credit_fraud",
+    "credit_fraud_plan",
+]
+
+# number of baskets in the train split of the real dataset
+CREDIT_FRAUD_BASKETS = 61_241
+
+# category -> (typical price, relative frequency, often bought by fraudsters)
+ITEMS = {
+    "COMPUTERS": (1100, 8, True),
+    "COMPUTER PERIPHERALS ACCESSORIES": (250, 8, True),
+    "TELEVISIONS HOME CINEMA": (800, 6, True),
+    "TELEPHONES FAX MACHINES TWO-WAY RADIOS": (700, 5, True),
+    "GAMING": (400, 3, True),
+    "WATCHES": (350, 2, True),
+    "AUDIO ACCESSORIES": (150, 5, False),
+    "HEALTH BEAUTY ELECTRICAL": (120, 6, False),
+    "KITCHEN ACCESSORIES": (60, 7, False),
+    "BEDROOM FURNITURE": (700, 5, False),
+    "LIVING DINING FURNITURE": (900, 4, False),
+    "HOME AND PERSONAL SECURITY": (200, 2, False),
+    "BABY CHILD TRAVEL": (250, 2, False),
+    "HOUSEHOLD CLEANING": (180, 3, False),
+    "POWER ACCESSORIES": (40, 3, False),
+    "PRINTERS SCANNERS": (200, 2, False),
+    "FULFILMENT CHARGE": (20, 1, False),
+    "WARRANTY": (100, 0.5, False),
+}
+# these lines have no make and no model
+SERVICES = {"FULFILMENT CHARGE", "WARRANTY"}
+
+BRANDS = [
+    "APPLE", "SAMSUNG", "LG", "SONY", "HP", "LENOVO", "MICROSOFT", "DYSON",
+    "BOSE", "PANASONIC", "PHILIPS", "ASUS", "ACER", "DELL", "GOOGLE",
+    "NINTENDO", "GARMIN", "FITBIT", "CANON", "EPSON", "TEFAL", "KENWOOD",
+    "SMEG", "BRAUN", "ORAL-B", "SILENTNIGHT", "JOHN LEWIS", "HOUSE", "NEST",
+    "RING", "JBL", "SONOS", "BOSCH", "MIELE", "DE'LONGHI", "NESPRESSO",
+]  # fmt: skip
+_SYLLABLES = ["KA", "RO", "VEN", "TRI", "LUX", "NO", "MA", "ZEN", "PRO", "TEK"]
+LINES = [
+    "PRO", "AIR", "MAX", "MINI", "ULTRA", "PLUS", "LITE", "SERIES", "SMART",
+    "CLASSIC", "ELITE", "SPORT", "HOME", "STUDIO", "EDGE", "ONE", "NEO",
+]  # fmt: skip
+SPECS = [
+    "13", "15.6", "32GB", "64GB", "128GB", "256GB", "512GB", "1TB", "4K",
+    "OLED", "HDR", "WIFI", "BLUETOOTH", "SPACE GREY", "SILVER", "BLACK",
+    "WHITE", "GOLD", "CORE I5", "CORE I7", "M1", "M2", "2020", "2021", "2022",
+]  # fmt: skip
+
+
+def _zipf_choice(rng, n_values, size, exponent=1.1):
+    """Draw indices in ``[0, n_values)`` from a Zipf law (0 is the most likely)."""
+    weights = np.arange(1, n_values + 1, dtype=float) ** -exponent
+    cumulative = np.cumsum(weights)
+    return np.searchsorted(cumulative, rng.random(size) * cumulative[-1])
+
+
+def _catalog(n_makes, n_models, seed):
+    """The models that can be bought, with their item, make, code and price."""
+    rng = np.random.default_rng([seed, 0])
+    extra = [
+        "".join(rng.choice(_SYLLABLES, size=rng.integers(2, 4)))
+        for _ in range(max(n_makes - len(BRANDS), 0))
+    ]
+    makes = np.asarray((BRANDS + extra)[:n_makes], dtype=object)
+    names = list(ITEMS)
+    frequencies = np.asarray([ITEMS[name][1] for name in names], dtype=float)
+    item = rng.choice(len(names), size=n_models, p=frequencies / frequencies.sum())
+    make = _zipf_choice(rng, n_makes, n_models)
+    line = rng.choice(LINES, size=n_models)
+    specs = rng.choice(SPECS, size=(n_models, 3))
+    model = [
+        f"{makes[m]} {line[i]} {i % 97 + 1} {' '.join(specs[i])}"
+        for i, m in enumerate(make)
+    ]
+    is_service = np.isin(np.asarray(names)[item], list(SERVICES))
+    typical = np.asarray([ITEMS[name][0] for name in names], dtype=float)[item]
+    return Bunch(
+        item=pa.array(np.asarray(names, dtype=object)[item]),
+        make=pa.array(makes[make], mask=is_service),
+        model=pa.array(np.asarray(model, dtype=object), mask=is_service),
+        goods_code=pa.array(
+            rng.choice(900_000_000, size=n_models, replace=False).astype(str)
+        ),
+        price=typical * rng.lognormal(0.0, 0.5, size=n_models),
+        risky=np.asarray([ITEMS[name][2] for name in names])[item],
+    )
+
+
+def _products_per_basket(rng, size, distribution, mean_products, fanout_exponent):
+    """The number of products in each basket (at least 1)."""
+    if callable(distribution):
+        counts = distribution(rng, size)
+    elif distribution == "geometric":
+        counts = rng.geometric(1.0 / mean_products, size=size)
+    elif distribution == "poisson":
+        counts = 1 + rng.poisson(mean_products - 1.0, size=size)
+    elif distribution == "zipf":
+        counts = np.minimum(rng.zipf(fanout_exponent, size=size), 200)
+    else:
+        raise ValueError(
+            "products_per_basket should be 'geometric', 'poisson', 'zipf' or a "
+            f"callable, got {distribution!r}"
+        )
+    return np.maximum(np.asarray(counts, dtype=np.int64), 1)
+
+
+def generate_credit_fraud(
+    directory,
+    n_baskets=CREDIT_FRAUD_BASKETS,
+    products_per_basket="geometric",
+    mean_products=1.8,
+    fanout_exponent=2.5,
+    fraud_rate=0.015,
+    fraud_fanout=2.0,
+    n_makes=700,
+    n_models=6500,
+    chunk_size=100_000,
+    seed=0,
+):
+    """Write baskets and products tables with the credit fraud schema.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Where ``baskets.parquet`` and ``products.parquet`` are written; it is
+        created if needed.
+    n_baskets : int, default=CREDIT_FRAUD_BASKETS
+        The number of baskets; the number of products follows from
+        ``products_per_basket``.
+    products_per_basket : {"geometric", "poisson", "zipf"} or callable
+        The distribution of the number of products in a basket. "geometric"
+        and "poisson" have a mean of ``mean_products``; "zipf" has a heavy
+        tail controlled by ``fanout_exponent`` (capped at 200 products). A
+        callable is called with a NumPy ``Generator`` and a number of
+        baskets, and returns their numbers of products.
+    mean_products : float, default=1.8
+        See ``products_per_basket``; the real dataset has about 1.8.
+    fanout_exponent : float, default=2.5
+        See ``products_per_basket``.
+    fraud_rate : float, default=0.015
+        The fraction of baskets with ``fraud_flag == 1``.
+    fraud_fanout : float, default=2.0
+        How many times more products the fraudulent baskets have, on average.
+    n_makes, n_models : int, default=700 and 6500
+        The number of distinct makes and models (and goods codes), as in the
+        real dataset.
+    chunk_size : int, default=100_000
+        The number of baskets generated and written at a time. The output
+        depends on it, as each chunk has its own random stream.
+    seed : int, default=0
+
+    Returns
+    -------
+    Bunch
+        With ``baskets_path``, ``products_path``, ``n_baskets`` and
+        ``n_products``.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    catalog = _catalog(n_makes, n_models, seed)
+    all_models, risky_models = np.arange(n_models), np.flatnonzero(catalog.risky)
+    baskets_path = directory / "baskets.parquet"
+    products_path = directory / "products.parquet"
+    baskets_writer = products_writer = None
+    n_products = 0
+    try:
+        for chunk, start in enumerate(range(0, n_baskets, chunk_size), 1):
+            rng = np.random.default_rng([seed, chunk])
+            ids = np.arange(start, min(start + chunk_size, n_baskets))
+            fraud = (rng.random(len(ids)) < fraud_rate).astype(np.int64)
+            counts = _products_per_basket(
+                rng, len(ids), products_per_basket, mean_products, fanout_exponent
+            )
+            # fraud_fanout times more products on average in fraudulent baskets
+            whole = np.floor(fraud_fanout)
+            multiplier = whole + (rng.random(len(ids)) < fraud_fanout - whole)
+            counts = np.where(fraud == 1, counts * multiplier, counts).astype(np.int64)
+            row_fraud = np.repeat(fraud, counts).astype(bool)
+            # fraudsters mostly buy expensive electronics
+            models = all_models[_zipf_choice(rng, n_models, len(row_fraud))]
+            from_risky = row_fraud & (rng.random(len(row_fraud)) < 0.8)
+            models[from_risky] = risky_models[
+                _zipf_choice(rng, len(risky_models), from_risky.sum())
+            ]
+            indices = pa.array(models)
+            price = catalog.price[models] * rng.lognormal(0.0, 0.1, len(models))
+            products = pa.table(
+                {
+                    "basket_ID": np.repeat(ids, counts),
+                    "item": catalog.item.take(indices),
+                    "cash_price": np.round(price).astype(np.int64),
+                    "make": catalog.make.take(indices),
+                    "model": catalog.model.take(indices),
+                    "goods_code": catalog.goods_code.take(indices),
+                    "Nbr_of_prod_purchas": np.minimum(
+                        rng.zipf(4.0, size=len(models)), 40
+                    ),
+                }
+            )
+            baskets = pa.table({"ID": ids, "fraud_flag": fraud})
+            if baskets_writer is None:
+                baskets_writer = pq.ParquetWriter(baskets_path, baskets.schema)
+                products_writer = pq.ParquetWriter(products_path, products.schema)
+            baskets_writer.write_table(baskets)
+            products_writer.write_table(products)
+            n_products += len(products)
+    finally:
+        for writer in (baskets_writer, products_writer):
+            if writer is not None:
+                writer.close()
+    return Bunch(
+        baskets_path=str(baskets_path),
+        products_path=str(products_path),
+        n_baskets=n_baskets,
+        n_products=n_products,
+    )
+
+
+def load_credit_fraud(directory):
+    """Read the tables written by ``generate_credit_fraud``, as pandas dataframes.
+
+    The result has the same keys as ``fetch_credit_fraud``: ``baskets``,
+    ``products``, ``baskets_path`` and ``products_path``.
+    """
+    directory = Path(directory)
+    baskets_path = directory / "baskets.parquet"
+    products_path = directory / "products.parquet"
+    return Bunch(
+        baskets=pd.read_parquet(baskets_path),
+        products=pd.read_parquet(products_path),
+        baskets_path=str(baskets_path),
+        products_path=str(products_path),
+    )
+
+
+def credit_fraud_plan(baskets, products, classifier=None):
+    """The DataOps plan of the course, on the given baskets and products.
+
+    ``baskets`` and ``products`` are dataframes, or DataOps that compute them
+    (e.g. that read them from a file). ``classifier`` defaults to
+    ``ExtraTreesClassifier(n_jobs=-1)``. The returned DataOp is the
+    prediction; use ``.skb.make_learner()`` to fit it, or
+    ``.skb.full_report()`` to write its report.
+    """
+    import skrub
+    from sklearn.ensemble import ExtraTreesClassifier
+    from skrub import selectors as s
+
+    if classifier is None:
+        classifier = ExtraTreesClassifier(n_jobs=-1)
+    if not isinstance(baskets, skrub.DataOp):
+        baskets = skrub.var("baskets", baskets)
+    if not isinstance(products, skrub.DataOp):
+        products = skrub.var("products", products)
+    X = baskets[["ID"]].skb.mark_as_X()
+    y = baskets["fraud_flag"].skb.mark_as_y()
+    vectorizer = skrub.TableVectorizer(high_cardinality=skrub.StringEncoder())
+    vectorized_products = products.skb.apply(vectorizer, cols=s.all() - "basket_ID")
+    aggregated_products = (
+        vectorized_products.groupby("basket_ID").agg("mean").reset_index()
+    )
+    features = X.merge(aggregated_products, left_on="ID", right_on="basket_ID")
+    features = features.drop(columns=["ID", "basket_ID"])
+    return features.skb.apply(classifier, y=y)
+
+
+def _directory_size(paths):
+    return sum(Path(path).stat().st_size for path in paths)
+
+
+def main():
+    """Generate the tables at 1x and 10x, and fit the plan on each."""
+    import tempfile
+
+    from sklearn.ensemble import ExtraTreesClassifier
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in [1, 10]:
+            directory = Path(tmp) / f"x{scale}"
+            _, generate_stats = measure(
+                generate_credit_fraud, directory, n_baskets=scale * CREDIT_FRAUD_BASKETS
+            )
+            start = time.perf_counter()
+            data = load_credit_fraud(directory)
+            load_time = time.perf_counter() - start
+            predictions = credit_fraud_plan(
+                data.baskets,
+                data.products,
+                ExtraTreesClassifier(n_estimators=20, min_samples_leaf=5),
+            )
+            learner = predictions.skb.make_learner()
+            _, fit_stats = measure(learner.fit, predictions.skb.get_data())
+            rows.append(
+                {
+                    "scale": f"{scale}x",
+                    "n_baskets": len(data.baskets),
+                    "n_products": len(data.products),
+                    "fraud_rate": data.baskets["fraud_flag"].mean(),
+                    "parquet_size": _directory_size(
+                        [data.baskets_path, data.products_path]
+                    ),
+                    "generate_time": generate_stats["wall_time"],
+                    "generate_peak_memory": generate_stats["peak_memory"],
+                    "load_time": load_time,
+                    "fit_time": fit_stats["wall_time"],
+                    "fit_peak_memory": fit_stats["peak_memory"],
+                }
+            )
+            del data, predictions, learner
+    print_results(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Parse each distinct datetime string once.
+
+``ToDatetime`` (used by the ``Cleaner`` and the ``TableVectorizer``) parses
+every row of a column, although datetime columns are very repetitive: the
+9,228 rows of ``date_first_hired`` in employee_salaries hold about 2,000
+distinct dates, and the timestamps of a log often repeat. This module
+provides:
+- ``CachedToDatetime``: a ``ToDatetime`` that infers the format and parses
+  the unique values only, then broadcasts the results back to the rows; the
+  parsed values are kept, so that ``transform`` only parses the values it has
+  not seen yet
+- ``datetime_parse_cache``: a context manager in which the ``Cleaner`` and the
+  ``TableVectorizer`` that are fitted use ``CachedToDatetime``
+- ``CachedCleaner``: a ``Cleaner`` that always uses ``CachedToDatetime``
+
+The fitted transformers keep using the cache outside of the context manager,
+and can be pickled.
+"""
+
+import contextlib
+import time
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from skrub import Cleaner, ToDatetime, _table_vectorizer
+from skrub import _dataframe as sbd
+from skrub._to_datetime import _cast_date_objects
+
+from .benchmarking import DATA_DIR, print_results
+
+__all__ = ["CachedToDatetime", "CachedCleaner", "datetime_parse_cache"]
+
+
+def _unique_strings(column):
+    if sbd.is_pandas(column):
+        return pd.Series(pd.unique(column.dropna()), name=sbd.name(column))
+    return column.drop_nulls().unique(maintain_order=True)
+
+
+def _concat(first, second):
+    if sbd.is_pandas(first):
+        return pd.concat([first, second], ignore_index=True)
+    return first.append(second)
+
+
+class CachedToDatetime(ToDatetime):
+    """``ToDatetime`` that parses each distinct string only once.
+
+    Parameters
+    ----------
+    format : str, optional
+        As for ``ToDatetime``; when it is ``None``, the format is inferred
+        from a sample of the unique values.
+    max_cache_size : int, default=1_000_000
+        When the number of cached values would exceed it, the cache is
+        emptied before parsing the new values.
+
+    Attributes
+    ----------
+    cache_size_ : int
+        The number of distinct strings currently cached.
+    """
+
+    def __init__(self, format=None, max_cache_size=1_000_000):
+        super().__init__(format=format)
+        self.max_cache_size = max_cache_size
+
+    def fit_transform(self, column, y=None):
+        column = _cast_date_objects(column)
+        if not (sbd.is_pandas_object(column) or sbd.is_string(column)):
+            # already datetimes, or rejected by ToDatetime
+            self._keys = None
+            return super().fit_transform(column, y)
+        uniques = _unique_strings(column)
+        parsed = super().fit_transform(uniques, y)
+        self.all_outputs_ = [sbd.name(column)]
+        self._keys, self._values = pd.Index(sbd.to_numpy(uniques)), parsed
+        return self._gather(column)
+
+    def transform(self, column):
+        if getattr(self, "_keys", None) is None:
+            return super().transform(column)
+        uniques = _unique_strings(column)
+        is_new = ~pd.Index(sbd.to_numpy(uniques)).isin(self._keys)
+        new = sbd.filter(uniques, is_new)
+        if len(new):
+            parsed = super().transform(new)
+            if len(self._keys) + len(new) > self.max_cache_size:
+                self._keys, self._values = pd.Index(sbd.to_numpy(new)), parsed
+            else:
+                self._keys = self._keys.append(pd.Index(sbd.to_numpy(new)))
+                self._values = _concat(self._values, parsed)
+        return self._gather(column)
+
+    @property
+    def cache_size_(self):
+        return 0 if getattr(self, "_keys", None) is None else len(self._keys)
+
+    def _gather(self, column):
+        if sbd.is_pandas(column):
+            positions = self._keys.get_indexer(column)
+            values = self._values.array.take(positions, allow_fill=True)
+            return pd.Series(values, index=column.index, name=sbd.name(column))
+        import polars as pl
+
+        positions = column.replace_strict(
+            pl.Series(self._keys.to_numpy()),
+            pl.Series(np.arange(len(self._keys))),
+            default=None,
+            return_dtype=pl.Int64,
+        )
+        return self._values.gather(positions).alias(sbd.name(column))
+
+
+@contextlib.contextmanager
+def datetime_parse_cache():
+    """Use ``CachedToDatetime`` in the ``Cleaner`` and ``TableVectorizer``.
+
+    The transformers fitted inside the ``with`` block parse the unique values
+    of their datetime columns only.
+    """
+    with mock.patch.object(_table_vectorizer, "ToDatetime", CachedToDatetime):
+        yield
+
+
+class CachedCleaner(Cleaner):
+    """A ``Cleaner`` whose datetime columns are parsed with ``CachedToDatetime``.
+
+    It takes the same parameters as the ``Cleaner``.
+    """
+
+    def fit_transform(self, X, y=None):
+        with datetime_parse_cache():
+            return super().fit_transform(X, y)
+
+
+def _repeated_dates(n_rows, n_unique, datetime_format, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2000-01-01") + pd.to_timedelta(
+        rng.integers(0, 20 * 365, size=n_unique), unit="D"
+    )
+    strings = days.strftime(datetime_format).to_numpy()
+    return pd.DataFrame({"date": strings[rng.integers(0, n_unique, size=n_rows)]})
+
+
+def _time(func, *args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    """Compare the ``Cleaner`` with and without the parse cache."""
+    salaries = pd.read_csv(DATA_DIR / "employee_salaries" / "data.csv")
+    datasets = {
+        "employee_salaries": (salaries[["date_first_hired"]], None),
+        "1M rows, 1000 dates": (
+            _repeated_dates(1_000_000, 1000, "%d-%b-%Y"),
+            "%d-%b-%Y",
+        ),
+        "1M rows, 1000 dates (polars)": (
+            _repeated_dates(1_000_000, 1000, "%d %B %Y"),
+            "%d %B %Y",
+        ),
+    }
+    rows = []
+    for name, (df, datetime_format) in datasets.items():
+        if "polars" in name:
+            import polars as pl
+
+            df = pl.from_pandas(df)
+        results = {}
+        for cleaner in [Cleaner, CachedCleaner]:
+            fitted, fit_time = _time(
+                lambda df: cleaner(datetime_format=datetime_format).fit(df), df
+            )
+            # the first transform parses the values the cache has not seen
+            output, transform_time = _time(fitted.transform, df)
+            results[cleaner.__name__] = sbd.to_pandas(output)
+            rows.append(
+                {
+                    "data": name,
+                    "cleaner": cleaner.__name__,
+                    "fit_time": fit_time,
+                    "transform_time": transform_time,
+                }
+            )
+        same = results["Cleaner"].equals(results["CachedCleaner"])
+        print(f"{name}: same output: {same}")
+    print()
+    print_results(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+Keep the features of a pipeline in float32, from the ``Cleaner`` to the
+estimator.
+
+``Cleaner(cast_to_float32=True)`` and the ``TableVectorizer`` produce float32
+columns, but several encoders that are often combined by hand produce float64
+(the ``OneHotEncoder`` by default, the ``DatetimeEncoder`` for the periodic
+and total seconds features), which doubles the memory of the feature matrix.
+This module provides:
+- ``ToFloat32``: a transformer that casts the numeric features of a dataframe
+  (pandas or polars), a NumPy array or a sparse matrix to float32
+- ``float32_pipeline``: a copy of a pipeline where every ``dtype`` and
+  ``cast_to_float32`` parameter asks for float32, and a ``ToFloat32`` step
+  follows every transformer
+- ``audit_dtypes``: fit a pipeline step by step and flag the steps (and, for
+  ``ApplyToCols`` and the ``TableVectorizer``, the columns) that upcast
+- ``benchmark_dtype_policy``: compare the memory and throughput of a pipeline
+  with and without the policy, on ``cleaner_data.csv`` scaled up with
+  ``generate_synthetic_dataframe``
+"""
+
+import warnings
+
+import numpy as np
+from scipy import sparse
+from scipy.linalg import LinAlgWarning
+from sklearn.base import BaseEstimator, TransformerMixin, clone, is_classifier
+from sklearn.base import is_regressor
+from sklearn.pipeline import Pipeline
+from skrub import _dataframe as sbd
+
+from .benchmarking import measure, print_results
+from .dataops_memory import nbytes
+from .generate_synthetic_data import generate_synthetic_dataframe
+
+__all__ = [
+    "ToFloat32",
+    "float32_pipeline",
+    "audit_dtypes",
+    "scaled_cleaner_data",
+    "benchmark_dtype_policy",
+]
+
+# the settings with which ``generate_synthetic_data.main`` wrote cleaner_data.csv
+CLEANER_DATA_SETTINGS = dict(
+    n_numeric=3,
+    n_categorical=5,
+    n_null_columns=1,
+    null_fraction=0.75,
+    n_constant_columns=1,
+    constant_column_name="contract_type",
+    constant_value="CONTRACT",
+    n_datetime_columns=2,
+    datetime_format="%d-%b-%Y",
+    columns_with_nulls={"first_name": 0.1, "city": 0.15},
+)
+
+
+def _to_float32(X):
+    if sbd.is_dataframe(X):
+        new_columns = {
+            name: sbd.to_float32(column, strict=False)
+            for name, column in zip(sbd.column_names(X), sbd.to_column_list(X))
+            if sbd.is_numeric(column) and sbd.dtype(column) != np.float32
+        }
+        return sbd.with_columns(X, **new_columns) if new_columns else X
+    if sparse.issparse(X) or isinstance(X, np.ndarray):
+        if X.dtype.kind in "iuf" and X.dtype != np.float32:
+            return X.astype(np.float32)
+        return X
+    return X
+
+
+class ToFloat32(TransformerMixin, BaseEstimator):
+    """Cast the numeric features to float32.
+
+    Dataframe columns that are not numeric (strings, datetimes, booleans...)
+    are left unchanged; so are inputs that are already float32, without a
+    copy.
+    """
+
+    def fit(self, X, y=None):
+        if sbd.is_dataframe(X):
+            self.feature_names_in_ = np.asarray(sbd.column_names(X), dtype=object)
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def transform(self, X):
+        return _to_float32(X)
+
+    def get_feature_names_out(self, input_features=None):
+        if input_features is not None:
+            return np.asarray(input_features, dtype=object)
+        if hasattr(self, "feature_names_in_"):
+            return self.feature_names_in_
+        return np.asarray([f"x{i}" for i in range(self.n_features_in_)], dtype=object)
+
+
+def _is_predictor(estimator):
+    return is_classifier(estimator) or is_regressor(estimator)
+
+
+def _is_float_dtype(value):
+    try:
+        return np.dtype(value).kind == "f"
+    except TypeError:
+        return False
+
+
+def _request_float32(estimator):
+    params = estimator.get_params(deep=True)
+    updates = {}
+    for name, value in params.items():
+        param = name.rsplit("__", 1)[-1]
+        if param == "dtype" and _is_float_dtype(value):
+            updates[name] = np.float32
+        elif param == "cast_to_float32":
+            updates[name] = True
+    estimator.set_params(**updates)
+
+
+def float32_pipeline(pipeline):
+    """Return a copy of a pipeline that keeps its features in float32.
+
+    Every nested ``dtype`` parameter (e.g. of a ``OneHotEncoder``) that
+    requests a floating dtype is set to float32, every ``cast_to_float32``
+    parameter (of a ``Cleaner``) to ``True``, and a ``ToFloat32`` step is
+    inserted after each transformer, so that whatever the steps produce, the
+    next step (and finally the estimator) receives float32 features.
+
+    Parameters
+    ----------
+    pipeline : Pipeline
+        The pipeline, fitted or not (the copy is not fitted).
+
+    Returns
+    -------
+    Pipeline
+    """
+    pipeline = clone(pipeline)
+    _request_float32(pipeline)
+    steps = []
+    for i, (name, step) in enumerate(pipeline.steps):
+        steps.append((name, step))
+        if step is None or step == "passthrough" or isinstance(step, ToFloat32):
+            continue
+        if i == len(pipeline.steps) - 1 and _is_predictor(step):
+            continue
+        next_step = pipeline.steps[i + 1][1] if i + 1 < len(pipeline.steps) else None
+        if not isinstance(next_step, ToFloat32):
+            steps.append((f"{name}_float32", ToFloat32()))
+    return Pipeline(steps, memory=pipeline.memory, verbose=pipeline.verbose)
+
+
+def _float_dtypes(X):
+    """The dtype of each float feature of ``X``, by feature name."""
+    if sbd.is_dataframe(X):
+        return {
+            name: str(sbd.dtype(column)).lower()
+            for name, column in zip(sbd.column_names(X), sbd.to_column_list(X))
+            if sbd.is_float(column)
+        }
+    if getattr(X, "dtype", None) is not None and X.dtype.kind == "f":
+        return {i: str(X.dtype) for i in range(X.shape[1])}
+    return {}
+
+
+def _dtype_counts(dtypes):
+    """The number of float32 and float64 features, from ``_float_dtypes``."""
+    return {
+        "n_float32": sum(dtype == "float32" for dtype in dtypes.values()),
+        "n_float64": sum(dtype == "float64" for dtype in dtypes.values()),
+    }
+
+
+def _upcast_outputs(step, output_dtypes, input_dtypes):
+    """The float64 outputs whose input column was not float64.
+
+    The input of an output is given by ``output_to_input_`` when the step has
+    it, and is the column with the same name (or position) otherwise.
+    """
+    output_to_input = getattr(step, "output_to_input_", None) or {}
+    return [
+        output
+        for output, dtype in output_dtypes.items()
+        if dtype == "float64"
+        and input_dtypes.get(output_to_input.get(output, output)) != "float64"
+    ]
+
+
+def _upcast_sources(step, upcast_outputs):
+    """The input columns (and their transformer) that produced float64 outputs."""
+    output_to_input = getattr(step, "output_to_input_", None)
+    if output_to_input is None:
+        # e.g. ApplyToCols with a transformer that takes several columns
+        inner = getattr(step, "transformer", None)
+        return type(inner).__name__ if upcast_outputs and inner is not None else ""
+    transformers = getattr(step, "transformers_", {})
+    sources = {}
+    for output in upcast_outputs:
+        source = output_to_input.get(output, output)
+        transformer = transformers.get(source)
+        label = type(transformer).__name__ if transformer is not None else "?"
+        sources[source] = label
+    return ", ".join(f"{column} ({label})" for column, label in sources.items())
+
+
+def audit_dtypes(pipeline, X, y=None):
+    """Fit a pipeline step by step and flag the steps that upcast to float64.
+
+    A step upcasts when one of its float64 outputs comes from an input column
+    that was not float64 (columns are compared one by one, so a step that
+    downcasts a column and upcasts another is flagged). For ``ApplyToCols`` and ``TableVectorizer`` steps,
+    the input columns that produced float64 outputs are listed, with their
+    transformer.
+
+    Parameters
+    ----------
+    pipeline : Pipeline
+        The pipeline to audit; it is cloned, and the copy is fitted.
+    X, y
+        The training data.
+
+    Returns
+    -------
+    list of dict
+        One row per transformer step, plus a last row, ``"estimator input"``,
+        for the features the final estimator receives (the input data when
+        the pipeline has no transformer). Each row has the keys
+        ``step``, ``transformer``, ``n_float32``, ``n_float64``, ``upcast``,
+        ``sources`` and ``output_size`` (in bytes).
+    """
+    pipeline = clone(pipeline)
+    steps = pipeline.steps
+    if _is_predictor(steps[-1][1]):
+        steps = steps[:-1]
+    rows = []
+    Xt, input_dtypes = X, _float_dtypes(X)
+    for name, step in steps:
+        if step is None or step == "passthrough":
+            continue
+        Xt = step.fit_transform(Xt, y)
+        output_dtypes = _float_dtypes(Xt)
+        upcast_outputs = _upcast_outputs(step, output_dtypes, input_dtypes)
+        rows.append(
+            {
+                "step": name,
+                "transformer": type(step).__name__,
+                **_dtype_counts(output_dtypes),
+                "upcast": bool(upcast_outputs),
+                "sources": _upcast_sources(step, upcast_outputs),
+                "output_size": nbytes(Xt),
+            }
+        )
+        input_dtypes = output_dtypes
+    counts = _dtype_counts(input_dtypes)
+    rows.append(
+        {
+            "step": "estimator input",
+            "transformer": type(Xt).__name__,
+            **counts,
+            "upcast": counts["n_float64"] > 0,
+            "sources": "",
+            "output_size": nbytes(Xt),
+        }
+    )
+    return rows
+
+
+def scaled_cleaner_data(n_rows=100_000, seed=123):
+    """A pandas version of ``cleaner_data.csv`` with ``n_rows`` rows."""
+    df = generate_synthetic_dataframe(n_rows, seed=seed, **CLEANER_DATA_SETTINGS)
+    return df.to_pandas()
+
+
+def _example_pipeline():
+    """The hand-built vectorizer of the exercises, followed by a Ridge."""
+    import skrub.selectors as s
+    from sklearn.linear_model import Ridge
+    from sklearn.preprocessing import OneHotEncoder
+    from skrub import ApplyToCols, Cleaner, DatetimeEncoder, StringEncoder
+
+    return Pipeline(
+        [
+            (
+                "cleaner",
+                Cleaner(
+                    drop_if_constant=True,
+                    drop_null_fraction=0.5,
+                    datetime_format="%d-%b-%Y",
+                ),
+            ),
+            (
+                "low_cardinality",
+                ApplyToCols(
+                    OneHotEncoder(sparse_output=False, handle_unknown="ignore"),
+                    cols=s.cardinality_below(40) & s.string(),
+                ),
+            ),
+            (
+                "high_cardinality",
+                ApplyToCols(StringEncoder(n_components=30), cols=s.string()),
+            ),
+            (
+                "datetime",
+                ApplyToCols(
+                    DatetimeEncoder(periodic_encoding="spline", add_total_seconds=True),
+                    cols=s.any_date(),
+                ),
+            ),
+            ("ridge", Ridge()),
+        ]
+    )
+
+
+def benchmark_dtype_policy(n_rows=100_000, pipeline=None, seed=123):
+    """Compare a pipeline with and without the float32 policy.
+
+    Parameters
+    ----------
+    n_rows : int, default=100_000
+        Number of rows of the scaled-up ``cleaner_data.csv``.
+    pipeline : Pipeline, optional
+        Defaults to the hand-built vectorizer of the exercises followed by a
+        ``Ridge``; the target is the ``num_3`` column.
+    seed : int, default=123
+        Seed of the data.
+
+    Returns
+    -------
+    list of dict
+        One row per variant with the keys ``variant``, ``fit_time``,
+        ``predict_time``, ``rows_per_second`` (prediction throughput),
+        ``peak_memory`` (of the fit), ``features_size`` and
+        ``features_dtype`` (of the estimator input).
+    """
+    pipeline = _example_pipeline() if pipeline is None else pipeline
+    X = scaled_cleaner_data(n_rows, seed)
+    y = X.pop("num_3").to_numpy()
+    results = []
+    # the total seconds of the datetimes are on a much larger scale than the
+    # other features, which makes the Ridge solver warn
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", LinAlgWarning)
+        for variant, candidate in [
+            ("default", clone(pipeline)),
+            ("float32", float32_pipeline(pipeline)),
+        ]:
+            _, fit_stats = measure(candidate.fit, X, y)
+            _, predict_stats = measure(candidate.predict, X)
+            features = candidate[:-1].transform(X)
+            results.append(
+                {
+                    "variant": variant,
+                    "fit_time": fit_stats["wall_time"],
+                    "predict_time": predict_stats["wall_time"],
+                    "rows_per_second": n_rows / predict_stats["wall_time"],
+                    "peak_memory": fit_stats["peak_memory"],
+                    "features_size": nbytes(features),
+                    "features_dtype": ", ".join(
+                        sorted(set(_float_dtypes(features).values()))
+                    ),
+                }
+            )
+            del features
+    return results
+
+
+def main():
+    """Audit the example pipeline, then benchmark it with and without the policy."""
+    X = scaled_cleaner_data(10_000)
+    y = X.pop("num_3").to_numpy()
+    pipeline = _example_pipeline()
+    print("Audit of the example pipeline\n")
+    print_results(audit_dtypes(pipeline, X, y))
+    print("\nAudit with the float32 policy\n")
+    print_results(audit_dtypes(float32_pipeline(pipeline), X, y))
+    n_rows = 20_000
+    print(f"\nFitting on {n_rows} rows\n")
+    print_results(benchmark_dtype_policy(n_rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+Predictions of an exported linear pipeline, with NumPy only.
+
+This module provides:
+- ``LinearScorer``: computes the predictions of a linear ``tabular_pipeline``
+  (see ``export_linear_pipeline`` in ``scoring_export``) from
+  - a lookup table per one-hot encoded column, which maps every value seen
+    in the training data to its contribution to the prediction
+  - a closed-form function per numeric column (the float32 cast, imputation,
+    missing indicator, scaling and squashing of the pipeline)
+  - the features of the ``DatetimeEncoder`` per datetime column (year, month,
+    ..., total seconds, and the periodic encodings as a table of their values
+    for each month, day, hour or weekday), followed by the same functions
+  - the character n-gram tf-idf and the SVD projection of the
+    ``StringEncoder`` per string column, followed by the same functions
+  It predicts a NumPy batch (or any mapping of column name to values) or a
+  single row given as a dict.
+
+Unlike ``scoring_export``, this module only imports NumPy and the standard
+library. The scorer only holds NumPy arrays, dicts and tuples, but loading a
+pickled scorer imports the ``helpers`` package, and so scikit-learn and skrub.
+"""
+
+import math
+import re
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+__all__ = ["LinearScorer"]
+
+# the key of missing values in the lookup tables
+_MISSING = None
+_EPOCH = datetime(1970, 1, 1)
+# the number of datetime or string values per column whose contribution is
+# kept by ``predict_row``
+_MAX_CACHED_VALUES = 100_000
+# as in scikit-learn's text vectorizers
+_WHITE_SPACES = re.compile(r"\s\s+")
+# divisor and modulo of the nanoseconds since midnight
+_TIME_OF_DAY = {
+    "hour": (3600 * 10**9, 24),
+    "minute": (60 * 10**9, 60),
+    "second": (10**9, 60),
+    "microsecond": (1000, 10**6),
+    "nanosecond": (1, 1000),
+}
+
+
+def _key(value):
+    try:
+        # NaN and NaT are not equal to themselves
+        if value is None or value != value:
+            return _MISSING
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+def _apply_ops(x, ops):
+    """The numeric operations on an array of float64 values."""
+    for op in ops:
+        if op[0] == "fill":
+            x = np.where(np.isnan(x), op[1], x)
+        elif op[0] == "isnan":
+            x = np.isnan(x).astype(np.float64)
+        elif op[0] == "affine":
+            x = op[1] * x + op[2]
+        else:
+            _, a, b, max_abs = op
+            with np.errstate(invalid="ignore"):
+                z = a * x + b
+                z = z / np.sqrt(1 + (z / max_abs) ** 2)
+            x = np.where(np.isinf(x), np.sign(x) * max_abs, z)
+    return x
+
+
+def _apply_ops_scalar(x, ops):
+    """The numeric operations on a single float, without NumPy overhead."""
+    for op in ops:
+        if op[0] == "fill":
+            x = op[1] if x != x else x
+        elif op[0] == "isnan":
+            x = 1.0 if x != x else 0.0
+        elif op[0] == "affine":
+            x = op[1] * x + op[2]
+        else:
+            _, a, b, max_abs = op
+            if math.isinf(x):
+                x = math.copysign(max_abs, x)
+            elif x == x:
+                z = a * x + b
+                x = z / math.sqrt(1 + (z / max_abs) ** 2)
+    return x
+
+
+def _to_float(values):
+    # the vectorizer casts numeric columns to float32
+    return np.asarray(values, dtype=np.float32).astype(np.float64)
+
+
+def _parse_datetime(value, format):
+    """A ``datetime``, or None for missing and unparsable values.
+
+    Strings are parsed with the format detected by skrub's ``ToDatetime``
+    (values that do not match it become missing, as in the pipeline).
+    """
+    if isinstance(value, str):
+        try:
+            if format is None:
+                return datetime.fromisoformat(value)
+            return datetime.strptime(value, format)
+        except ValueError:
+            return None
+    if value is None or value != value:
+        return None
+    if isinstance(value, np.datetime64):
+        return value.astype("datetime64[us]").item()
+    return value
+
+
+def _to_datetime64(values, format):
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[ns]")
+    parsed = {}
+    for value in values:
+        key = _key(value)
+        if key not in parsed:
+            parsed[key] = _parse_datetime(value, format)
+    return np.asarray([parsed[_key(value)] for value in values], dtype="datetime64[ns]")
+
+
+def _datetime_feature(dt, feature):
+    """A feature of an array of datetime64[ns], as the ``DatetimeEncoder`` has it."""
+    if feature == "total_seconds":
+        return (dt - np.datetime64(0, "ns")).astype(np.int64) / 1e9
+    days = dt.astype("datetime64[D]")
+    if feature == "year":
+        return dt.astype("datetime64[Y]").astype(np.int64) + 1970
+    if feature == "month":
+        return dt.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    if feature == "day":
+        return (days - dt.astype("datetime64[M]").astype("datetime64[D]")).astype(
+            np.int64
+        ) + 1
+    if feature == "weekday":
+        # 1970-01-01 was a Thursday; Monday is 1
+        return (days.astype(np.int64) + 3) % 7 + 1
+    if feature == "day_of_year":
+        return (days - dt.astype("datetime64[Y]").astype("datetime64[D]")).astype(
+            np.int64
+        ) + 1
+    divisor, modulo = _TIME_OF_DAY[feature]
+    return (dt - days).astype(np.int64) // divisor % modulo
+
+
+def _datetime_feature_scalar(dt, feature):
+    if feature == "total_seconds":
+        return (dt - _EPOCH).total_seconds()
+    if feature == "weekday":
+        return dt.isoweekday()
+    if feature == "day_of_year":
+        return dt.timetuple().tm_yday
+    if feature == "nanosecond":
+        return getattr(dt, "nanosecond", 0)
+    return getattr(dt, feature)
+
+
+def _char_ngrams(text, analyzer, ngram_range):
+    """The n-grams of scikit-learn's ``char`` and ``char_wb`` analyzers."""
+    text = _WHITE_SPACES.sub(" ", text.lower())
+    min_n, max_n = ngram_range
+    if analyzer == "char":
+        return [
+            text[i : i + n]
+            for n in range(min_n, min(max_n, len(text)) + 1)
+            for i in range(len(text) - n + 1)
+        ]
+    ngrams = []
+    for word in text.split():
+        word = f" {word} "
+        for n in range(min_n, max_n + 1):
+            ngrams.extend(word[i : i + n] for i in range(max(len(word) - n, 0) + 1))
+            if len(word) <= n:
+                # a short word is counted once
+                break
+    return ngrams
+
+
+def _string_embedding(values, encoding):
+    """The output of a fitted ``StringEncoder``, shape (n_values, n_components).
+
+    ``encoding`` is ``(analyzer, ngram_range, vocabulary, idf, projection)``:
+    the tf-idf weights of the n-grams are normalized, cast to float32 and
+    multiplied by ``projection`` (the SVD components divided by the scaling
+    factor of the encoder).
+    """
+    analyzer, ngram_range, vocabulary, idf, projection = encoding
+    embedded = {}
+    for value in values:
+        key = _key(value)
+        if key in embedded:
+            continue
+        text = "" if key is _MISSING else str(value)
+        counts = Counter(
+            vocabulary[ngram]
+            for ngram in _char_ngrams(text, analyzer, ngram_range)
+            if ngram in vocabulary
+        )
+        if not counts:
+            embedded[key] = np.zeros(projection.shape[1])
+            continue
+        index = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        weights *= idf[index]
+        weights = (weights / np.sqrt(weights @ weights)).astype(np.float32)
+        embedded[key] = weights @ projection[index]
+    return _to_float([embedded[_key(value)] for value in values])
+
+
+def _stacked_terms(x, terms):
+    """The sum of the terms of a column, from its encoded features ``x``.
+
+    Each term is ``(sources, coef, ops)``: the indices of the features in
+    ``x`` and, stacked for all of them, their coefficients and operations.
+    """
+    total = 0.0
+    for sources, coef, ops in terms:
+        total = total + _apply_ops(x[..., sources], ops) @ coef
+    return total
+
+
+class LinearScorer:
+    """Predictions of a linear ``tabular_pipeline``, computed with NumPy.
+
+    Use ``export_linear_pipeline`` to create it.
+
+    Attributes
+    ----------
+    columns : list of str
+        The input columns.
+    intercept : ndarray of shape (n_outputs,)
+        The intercept of the estimator.
+    tables : dict
+        Column -> ``(index, contributions)``: ``index`` maps each known value
+        (``None`` for missing values) to a row of ``contributions``, an array
+        of shape (n_values, n_outputs) whose last row is the contribution of
+        unknown values.
+    numeric : dict
+        Column -> list of ``(coef, ops)``, one per feature computed from the
+        column: the operations applied to the values and the coefficients of
+        the resulting feature.
+    dates : dict
+        Column -> ``(format, terms)``: the format used to parse strings, and
+        one ``(feature, table, coef, ops)`` per feature computed from the
+        column. ``feature`` is the name of a ``DatetimeEncoder`` feature
+        (``"year"``, ``"total_seconds"``, ...); ``table``, for the periodic
+        encodings, holds the encoded value of each integer value of the
+        feature, and is None for the others.
+    strings : dict
+        Column -> ``(encoding, terms)``: the n-gram vocabulary, idf weights
+        and projection of the ``StringEncoder`` (see ``_string_embedding``),
+        and groups of its output features that go through the same kinds of
+        operations, as ``(sources, coef, ops)`` with stacked parameters.
+    classes : ndarray or None
+        The classes of a classifier.
+    n_fallbacks : int
+        The number of unknown values that were encoded by the pipeline.
+    """
+
+    def __init__(
+        self,
+        columns,
+        intercept,
+        tables,
+        numeric,
+        dates,
+        strings,
+        classes,
+        encoder=None,
+    ):
+        self.columns = columns
+        self.intercept = intercept
+        self.tables = tables
+        self.numeric = numeric
+        self.dates = dates
+        self.strings = strings
+        self.classes = classes
+        self._encoder = encoder
+        self.n_fallbacks = 0
+        self._row_cache = {}
+
+    def __getstate__(self):
+        # the pipeline is only needed to encode unknown values; it is not
+        # saved, so that the pickle only holds NumPy arrays and dicts
+        return {**self.__dict__, "_encoder": None, "_row_cache": {}}
+
+    def _column_values(self, X, position, column):
+        if isinstance(X, np.ndarray):
+            return X[:, position]
+        is_object = column in self.tables or column in self.strings
+        return np.asarray(X[column], dtype=object if is_object else None)
+
+    def _add_unknown(self, column, values):
+        """Encode unknown values with the pipeline and add them to the table."""
+        index, contributions = self.tables[column]
+        new = self._encoder.contributions(column, values)
+        self.tables[column] = (
+            {**index, **{_key(v): len(index) + i for i, v in enumerate(values)}},
+            np.concatenate([contributions[:-1], new, contributions[-1:]]),
+        )
+        self.n_fallbacks += len(values)
+
+    def _date_terms(self, column, values):
+        format, terms = self.dates[column]
+        dt = _to_datetime64(values, format)
+        missing = np.isnat(dt)
+        features = {}
+        for feature, table, coef, ops in terms:
+            if feature not in features:
+                features[feature] = _datetime_feature(dt, feature)
+            x = features[feature]
+            if table is None:
+                x = _to_float(x)
+            else:
+                x = table[np.where(missing, 0, x)]
+            x = np.where(missing, np.nan, x)
+            yield np.outer(_apply_ops(x, ops), coef)
+
+    def decision_function(self, X):
+        """The raw predictions (the decision function of a classifier).
+
+        ``X`` is a dataframe, a mapping of column name to values, or a 2D
+        array whose columns are in the order of ``columns``.
+        """
+        total = None
+        for position, column in enumerate(self.columns):
+            values = self._column_values(X, position, column)
+            if column in self.numeric:
+                x = _to_float(values)
+                for coef, ops in self.numeric[column]:
+                    term = np.outer(_apply_ops(x, ops), coef)
+                    total = term if total is None else total + term
+                continue
+            if column in self.dates or column in self.strings:
+                term = self._cached_terms(column, values)
+                total = term if total is None else total + term
+                continue
+            index, _ = self.tables[column]
+            keys = [_key(v) for v in values]
+            if self._encoder is not None:
+                unknown = {k: v for k, v in zip(keys, values) if k not in index}
+                if unknown:
+                    self._add_unknown(column, list(unknown.values()))
+            index, contributions = self.tables[column]
+            unknown_row = len(contributions) - 1
+            rows = np.fromiter(
+                (index.get(k, unknown_row) for k in keys),
+                dtype=np.intp,
+                count=len(keys),
+            )
+            term = contributions[rows]
+            total = term if total is None else total + term
+        total = total + self.intercept
+        return total[:, 0] if total.shape[1] == 1 else total
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if self.classes is None:
+            return scores
+        if scores.ndim == 1:
+            return self.classes[(scores > 0).astype(int)]
+        return self.classes[scores.argmax(axis=1)]
+
+    def predict_proba(self, X):
+        if self.classes is None:
+            raise AttributeError("predict_proba is only available for classifiers.")
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            positive = 1 / (1 + np.exp(-scores))
+            return np.stack([1 - positive, positive], axis=1)
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def _cached_terms(self, column, values):
+        """The contributions of the values of a datetime or string column.
+
+        Each distinct value is encoded once, and its contribution is kept for
+        the next calls.
+        """
+        cache = self._row_cache.setdefault(column, {})
+        keys = [_key(v) for v in values]
+        new = {k: v for k, v in zip(keys, values) if k not in cache}
+        computed = {}
+        if new:
+            new_values = np.asarray(list(new.values()), dtype=values.dtype)
+            if column in self.strings:
+                encoding, terms = self.strings[column]
+                embedding = _string_embedding(new_values, encoding)
+                new_terms = _stacked_terms(embedding, terms)
+            else:
+                new_terms = sum(self._date_terms(column, new_values))
+            computed = dict(zip(new, new_terms))
+            for key in list(computed)[: max(_MAX_CACHED_VALUES - len(cache), 0)]:
+                cache[key] = computed[key]
+        return np.asarray([cache[k] if k in cache else computed[k] for k in keys])
+
+    def _row_term(self, column, value):
+        """The contribution of the value of a datetime or string column."""
+        if column in self.strings:
+            encoding, terms = self.strings[column]
+            return _stacked_terms(_string_embedding([value], encoding)[0], terms)
+        format, terms = self.dates[column]
+        dt = _parse_datetime(value, format)
+        total = np.zeros_like(self.intercept)
+        for feature, table, coef, ops in terms:
+            if dt is None:
+                x = math.nan
+            elif table is None:
+                x = float(np.float32(_datetime_feature_scalar(dt, feature)))
+            else:
+                x = float(table[_datetime_feature_scalar(dt, feature)])
+            total += _apply_ops_scalar(x, ops) * coef
+        return total
+
+    def predict_row(self, row):
+        """Predict a single row, given as a dict of column name to value.
+
+        As in ``decision_function``, the contributions of the datetime and
+        string values are kept, so that the values that come again are not
+        encoded again.
+        """
+        total = self.intercept.copy()
+        for column in self.columns:
+            value = row[column]
+            if column in self.numeric:
+                x = float(np.float32(value)) if value is not None else math.nan
+                for coef, ops in self.numeric[column]:
+                    total += _apply_ops_scalar(x, ops) * coef
+                continue
+            if column in self.dates or column in self.strings:
+                cache = self._row_cache.setdefault(column, {})
+                key = _key(value)
+                term = cache.get(key)
+                if term is None:
+                    term = self._row_term(column, value)
+                    if len(cache) < _MAX_CACHED_VALUES:
+                        cache[key] = term
+                total += term
+                continue
+            index, contributions = self.tables[column]
+            key = _key(value)
+            if key not in index and self._encoder is not None:
+                self._add_unknown(column, [value])
+                index, contributions = self.tables[column]
+            total += contributions[index.get(key, -1)]
+        if self.classes is None:
+            return total[0] if len(total) == 1 else total
+        if len(total) == 1:
+            return self.classes[int(total[0] > 0)]
+        return self.classes[total.argmax()]
@@ -0,0 +1,395 @@
+"""
+Find where time and memory go when fitting or applying a pipeline.
+
+``profile_pipeline`` instruments a scikit-learn or skrub estimator for the
+duration of a ``with`` block. Every call to ``fit``, ``fit_transform``,
+``transform``, ``predict``... of the estimator, of the steps of a
+``Pipeline`` (recursively), and of the per-column transformers created by
+``ApplyToCols`` is recorded with:
+- its wall time and CPU time
+- the peak memory allocated during the call (tracked with ``tracemalloc``)
+  and the change in resident set size (RSS)
+- the shapes of its input and output
+
+The records can be exported as a table, as a Chrome trace (to open in
+``chrome://tracing`` or https://ui.perfetto.dev) or as "folded" stacks that
+flamegraph tools (``flamegraph.pl``, https://www.speedscope.app) read, and
+plotted as an icicle graph with matplotlib.
+
+The per-column transformers of ``ApplyToCols`` are only recorded when they
+run in the main process (``n_jobs=None`` or 1, or a thread-based joblib
+backend).
+"""
+
+import contextlib
+import json
+import threading
+import time
+import tracemalloc
+import zlib
+from unittest import mock
+
+import matplotlib.pyplot as plt
+import pandas as pd
+from sklearn.pipeline import Pipeline
+from skrub import _apply_to_each_col
+from skrub import _dataframe as sbd
+
+from .benchmarking import DATA_DIR, current_rss, print_results
+
+__all__ = ["profile_pipeline", "PipelineProfile"]
+
+PROFILED_METHODS = [
+    "fit",
+    "fit_transform",
+    "transform",
+    "predict",
+    "predict_proba",
+    "decision_function",
+    "score",
+]
+
+_COLUMNS = [
+    "path",
+    "method",
+    "wall_time",
+    "self_time",
+    "cpu_time",
+    "peak_memory",
+    "rss_delta",
+    "input_shape",
+    "output_shape",
+]
+
+
+def _shape(obj):
+    shape = getattr(obj, "shape", None)
+    return None if shape is None else tuple(shape)
+
+
+class PipelineProfile:
+    """Records of the calls made while a pipeline is profiled.
+
+    Each record is a dict with the keys ``path`` (the names of the enclosing
+    steps, joined with ``"/"``), ``method``, ``start`` (in seconds since the
+    profile was created), ``wall_time``, ``self_time`` (the wall time not
+    spent in nested records), ``cpu_time``, ``peak_memory``, ``rss_delta``,
+    ``input_shape``, ``output_shape``, ``thread`` and ``parent`` (the index
+    of the enclosing record, or ``None``).
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+
+    @property
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _is_current(self, owner):
+        return bool(self._stack) and self._stack[-1]["owner"] is owner
+
+    @contextlib.contextmanager
+    def span(self, name, method, X=None, owner=None):
+        """Record the block as one call named ``name`` (nested in the current one)."""
+        stack = self._stack
+        parent = stack[-1] if stack else None
+        record = {
+            "path": "/".join([parent["record"]["path"], name]) if parent else name,
+            "method": method,
+            "start": time.perf_counter() - self._origin,
+            "input_shape": _shape(X),
+            "output_shape": None,
+            "thread": threading.get_ident(),
+            "parent": None if parent is None else parent["index"],
+        }
+        frame = {"record": record, "owner": owner, "children_peak": 0}
+        if self.trace_memory:
+            # the peak of tracemalloc is global: save the peak reached so far
+            # by the enclosing call before resetting it for this one
+            if parent is not None:
+                parent["children_peak"] = max(
+                    parent["children_peak"], tracemalloc.get_traced_memory()[1]
+                )
+            tracemalloc.reset_peak()
+            frame["start_memory"] = tracemalloc.get_traced_memory()[0]
+        frame["index"] = len(self.records)
+        self.records.append(record)
+        stack.append(frame)
+        start_rss = current_rss()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_time"] = time.perf_counter() - start_wall
+            record["cpu_time"] = time.process_time() - start_cpu
+            end_rss = current_rss()
+            record["rss_delta"] = None if start_rss is None else end_rss - start_rss
+            stack.pop()
+            if self.trace_memory:
+                peak = max(frame["children_peak"], tracemalloc.get_traced_memory()[1])
+                record["peak_memory"] = peak - frame["start_memory"]
+                if parent is not None:
+                    parent["children_peak"] = max(parent["children_peak"], peak)
+                tracemalloc.reset_peak()
+            else:
+                record["peak_memory"] = None
+
+    def _self_times(self):
+        self_times = [r["wall_time"] for r in self.records]
+        for record in self.records:
+            if record["parent"] is not None:
+                self_times[record["parent"]] -= record["wall_time"]
+        return self_times
+
+    def to_frame(self):
+        """Return the records as a pandas DataFrame, in call order."""
+        records = [
+            {**record, "self_time": self_time}
+            for record, self_time in zip(self.records, self._self_times())
+        ]
+        return pd.DataFrame(records, columns=_COLUMNS + ["start", "thread", "parent"])
+
+    def print(self, sort_by=None, max_rows=None):
+        """Print the records as a table, optionally sorted (descending) by a column."""
+        frame = self.to_frame()
+        if sort_by is not None:
+            frame = frame.sort_values(sort_by, ascending=False)
+        if max_rows is not None:
+            frame = frame.head(max_rows)
+        print_results(frame.to_dict("records"), columns=_COLUMNS)
+
+    def to_chrome_trace(self, path=None):
+        """Return (and optionally write) the records in the Chrome trace format."""
+        events = []
+        for record in self.records:
+            events.append(
+                {
+                    "name": record["path"].rsplit("/", 1)[-1],
+                    "cat": record["method"],
+                    "ph": "X",
+                    "ts": record["start"] * 1e6,
+                    "dur": record["wall_time"] * 1e6,
+                    "pid": 0,
+                    "tid": record["thread"],
+                    "args": {
+                        key: record[key]
+                        for key in [
+                            "path",
+                            "method",
+                            "cpu_time",
+                            "peak_memory",
+                            "rss_delta",
+                            "input_shape",
+                            "output_shape",
+                        ]
+                    },
+                }
+            )
+        trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+        if path is not None:
+            with open(path, "w") as fp:
+                json.dump(trace, fp)
+        return trace
+
+    def to_folded(self, path=None):
+        """Return (and optionally write) the self times as folded stacks.
+
+        Each line is ``step;sub step;... <microseconds>``, the input format of
+        ``flamegraph.pl`` and speedscope.
+        """
+        totals = {}
+        for record, self_time in zip(self.records, self._self_times()):
+            names = record["path"].split("/")
+            names[-1] = f"{names[-1]}.{record['method']}"
+            stack = ";".join(names)
+            totals[stack] = totals.get(stack, 0) + self_time
+        folded = "\n".join(
+            f"{stack} {max(round(seconds * 1e6), 0)}"
+            for stack, seconds in totals.items()
+        )
+        if path is not None:
+            with open(path, "w") as fp:
+                fp.write(folded + "\n")
+        return folded
+
+    def plot_flamegraph(self, ax=None, min_width=0.05):
+        """Plot the records as an icicle graph (time on x, nesting on y).
+
+        Calls shorter than ``min_width`` times the total time are not labeled.
+        """
+        if ax is None:
+            _, ax = plt.subplots(figsize=(12, 4))
+        depths = []
+        for record in self.records:
+            parent = record["parent"]
+            depths.append(0 if parent is None else depths[parent] + 1)
+        total = max((r["start"] + r["wall_time"] for r in self.records), default=0)
+        start = min((r["start"] for r in self.records), default=0)
+        colors = plt.get_cmap("tab20").colors
+        for i, (record, depth) in enumerate(zip(self.records, depths)):
+            ax.barh(
+                -depth,
+                record["wall_time"],
+                left=record["start"],
+                height=0.9,
+                color=colors[zlib.crc32(record["path"].encode()) % len(colors)],
+                edgecolor="white",
+            )
+            if record["wall_time"] > min_width * (total - start):
+                ax.text(
+                    record["start"] + record["wall_time"] / 2,
+                    -depth,
+                    f"{record['path'].rsplit('/', 1)[-1]}.{record['method']}",
+                    ha="center",
+                    va="center",
+                    fontsize=7,
+                    clip_on=True,
+                )
+        ax.set_yticks([])
+        ax.set_xlabel("time (s)")
+        ax.set_xlim(start, total)
+        return ax
+
+
+def _instrument(estimator, name, profile, instrumented):
+    for method_name in PROFILED_METHODS:
+        if not hasattr(estimator, method_name):
+            continue
+        method = getattr(estimator, method_name)
+
+        def profiled(X=None, *args, _method=method, _name=method_name, **kwargs):
+            # e.g. ``fit`` calling ``self.fit_transform``: a single record
+            if profile._is_current(estimator):
+                return _method(X, *args, **kwargs)
+            with profile.span(name, _name, X, owner=estimator) as record:
+                result = _method(X, *args, **kwargs)
+                if result is not estimator:
+                    record["output_shape"] = _shape(result)
+                return result
+
+        # shadow the method of the class with an attribute of the instance
+        setattr(estimator, method_name, profiled)
+        instrumented.append((estimator, method_name))
+    if isinstance(estimator, Pipeline):
+        for step_name, step in estimator.steps:
+            if step is not None and step != "passthrough":
+                _instrument(step, step_name, profile, instrumented)
+
+
+def _column_span_name(column, transformer):
+    # a column can go through several ``ApplyToCols``, e.g. inside a ``Cleaner``
+    return f"{sbd.name(column)}[{type(transformer).__name__}]"
+
+
+def _profiled_column_functions(profile):
+    fit_transform_column = _apply_to_each_col._fit_transform_column
+    transform_column = _apply_to_each_col._transform_column
+
+    def profiled_fit_transform_column(column, y, columns_to_handle, transformer, *args):
+        if sbd.name(column) not in columns_to_handle:
+            return fit_transform_column(
+                column, y, columns_to_handle, transformer, *args
+            )
+        name = _column_span_name(column, transformer)
+        with profile.span(name, "fit_transform", column) as record:
+            result = fit_transform_column(
+                column, y, columns_to_handle, transformer, *args
+            )
+            record["output_shape"] = (sbd.shape(column)[0], len(result[1]))
+            return result
+
+    def profiled_transform_column(column, transformer, kwargs):
+        if transformer is None:
+            return transform_column(column, transformer, kwargs)
+        name = _column_span_name(column, transformer)
+        with profile.span(name, "transform", column) as record:
+            result = transform_column(column, transformer, kwargs)
+            record["output_shape"] = (sbd.shape(column)[0], len(result))
+            return result
+
+    return profiled_fit_transform_column, profiled_transform_column
+
+
+@contextlib.contextmanager
+def profile_pipeline(estimator, name=None, trace_memory=True):
+    """Record the calls made to ``estimator`` and its steps inside a ``with`` block.
+
+    Parameters
+    ----------
+    estimator : estimator
+        The estimator or pipeline to profile. It is modified in place for the
+        duration of the block, and restored afterwards.
+    name : str, optional
+        Name of the estimator in the records; defaults to its class name.
+    trace_memory : bool, default=True
+        Whether to track the peak memory with ``tracemalloc``, which makes
+        Python-heavy code noticeably slower.
+
+    Yields
+    ------
+    PipelineProfile
+        The profile, filled as the estimator is used.
+
+    Examples
+    --------
+    >>> with profile_pipeline(pipeline) as profile:  # doctest: +SKIP
+    ...     pipeline.fit(X, y).predict(X)
+    >>> profile.print(sort_by="self_time")  # doctest: +SKIP
+    >>> profile.to_chrome_trace("trace.json")  # doctest: +SKIP
+    """
+    profile = PipelineProfile(trace_memory=trace_memory)
+    instrumented = []
+    was_tracing = tracemalloc.is_tracing()
+    if trace_memory and not was_tracing:
+        tracemalloc.start()
+    fit_transform_column, transform_column = _profiled_column_functions(profile)
+    try:
+        _instrument(estimator, name or type(estimator).__name__, profile, instrumented)
+        with (
+            mock.patch.object(
+                _apply_to_each_col, "_fit_transform_column", fit_transform_column
+            ),
+            mock.patch.object(
+                _apply_to_each_col, "_transform_column", transform_column
+            ),
+        ):
+            yield profile
+    finally:
+        for obj, method_name in instrumented:
+            obj.__dict__.pop(method_name, None)
+        if trace_memory and not was_tracing:
+            tracemalloc.stop()
+
+
+def main():
+    """Profile a pipeline fitted on employee_salaries."""
+    import skrub.selectors as s
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import OrdinalEncoder, StandardScaler
+    from skrub import ApplyToCols, Cleaner, DatetimeEncoder
+
+    X = pd.read_csv(DATA_DIR / "employee_salaries" / "data.csv")
+    y = pd.read_csv(DATA_DIR / "employee_salaries" / "target.csv").iloc[:, 0]
+    pipeline = make_pipeline(
+        Cleaner(),
+        ApplyToCols(StandardScaler(), cols=s.numeric()),
+        ApplyToCols(OrdinalEncoder(), cols=s.string()),
+        ApplyToCols(DatetimeEncoder(), cols=s.any_date()),
+        HistGradientBoostingRegressor(),
+    )
+    with profile_pipeline(pipeline) as profile:
+        pipeline.fit(X, y).predict(X)
+    profile.print(sort_by="self_time", max_rows=15)
+    profile.to_chrome_trace("pipeline_trace.json")
+    profile.to_folded("pipeline_trace.folded")
+    print("\nWrote pipeline_trace.json (chrome://tracing) and pipeline_trace.folded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""
+Cross-validate pipelines on a dataset shared by the worker processes.
+
+With ``cross_validate(..., n_jobs=4)``, joblib pickles the dataframe for every
+fold and each worker unpickles its own copy, and the ``TableVectorizer`` of a
+``tabular_pipeline`` is fitted again for every fold of every model, even when
+several models (e.g. ``Ridge`` with several values of ``alpha``) share the
+same preprocessing. This module provides:
+- ``SharedDataset``: writes ``X`` once to an uncompressed Arrow file and ``y``
+  to a ``.npy`` file; the workers memory-map them (with polars) instead of
+  receiving a copy, and only materialize the rows of their fold (as a pandas
+  dataframe)
+- ``shared_cross_validate``: a ``cross_validate`` that runs on a
+  ``SharedDataset``, and caches the preprocessing of each fold on disk (with
+  ``dump_memmapped``), so that the other models evaluated on the same folds
+  load the transformed features instead of fitting the preprocessing again
+- ``benchmark_shared_cv``: compare the wall time and the memory of all the
+  worker processes with plain ``cross_validate``
+
+The preprocessing is still fitted on the training rows of each fold only: a
+cached fit is reused only for the same preprocessing parameters, the same
+data and the same train and test rows, so caching cannot leak information
+from the test rows.
+
+Most of the memory of each worker is used by fitting the pipeline, not by the
+data: the shared dataset saves a copy of the full dataframe per worker, and
+the cache saves the memory and time of fitting the preprocessing again.
+
+The memory is the sum of the resident set size (RSS) and of the proportional
+set size (PSS, Linux only) of the main process and all its child processes,
+sampled during the run.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib.externals.loky import get_reusable_executor
+from scipy.linalg import LinAlgWarning
+from sklearn.base import clone, is_classifier
+from sklearn.linear_model import Ridge
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import check_cv, cross_validate
+from sklearn.pipeline import Pipeline
+from sklearn.utils import _safe_indexing
+from sklearn.utils.parallel import Parallel, delayed
+from skrub import _dataframe as sbd
+from skrub import tabular_pipeline
+
+from .benchmarking import DATA_DIR, print_results
+from .generate_synthetic_data import generate_synthetic_dataframe
+from .persistence import dump_memmapped, load_memmapped
+
+__all__ = ["SharedDataset", "shared_cross_validate", "benchmark_shared_cv"]
+
+_COLUMNS = [
+    "dataset",
+    "runner",
+    "n_models",
+    "n_cache_hits",
+    "wall_time",
+    "peak_total_rss",
+    "peak_total_pss",
+    "mean_score",
+]
+
+# the datasets attached by this process: path -> (fingerprint, (X, y))
+_ATTACHED = {}
+
+
+def _file_digest(*paths):
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        with open(path, "rb") as fp:
+            while chunk := fp.read(1 << 20):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SharedDataset:
+    """A dataset written once to disk, and memory-mapped by each process.
+
+    It is cheap to pickle (it only holds paths), so it can be sent to the
+    workers instead of the data. Use it as a context manager to delete the
+    files at the end.
+
+    Parameters
+    ----------
+    X : pandas or polars DataFrame
+        The features.
+    y : array-like
+        The target.
+    directory : str or Path, optional
+        Where the files are written; defaults to a new temporary directory.
+
+    Attributes
+    ----------
+    n_rows : int
+        The number of rows.
+    fingerprint : str
+        A hash of the content of the files, which identifies the data in the
+        cache of ``shared_cross_validate``.
+    """
+
+    def __init__(self, X, y, directory=None):
+        import polars as pl
+
+        self._owns_directory = directory is None
+        self.directory = Path(tempfile.mkdtemp() if directory is None else directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.X_path = self.directory / "X.arrow"
+        self.y_path = self.directory / "y.npy"
+        X = pl.from_pandas(X) if sbd.is_pandas(X) else X
+        # memory mapping needs an uncompressed file
+        X.write_ipc(self.X_path, compression="uncompressed")
+        np.save(self.y_path, np.asarray(y), allow_pickle=False)
+        self.n_rows = X.shape[0]
+        self.fingerprint = _file_digest(self.X_path, self.y_path)
+
+    def load(self):
+        """The memory-mapped ``(X, y)``, opened once per process."""
+        key = str(self.X_path)
+        fingerprint, data = _ATTACHED.get(key, (None, None))
+        if fingerprint != self.fingerprint:
+            import polars as pl
+
+            # another dataset may have been written to the same directory
+            # since this process attached it
+            data = (
+                pl.read_ipc(self.X_path, memory_map=True),
+                np.load(self.y_path, mmap_mode="r"),
+            )
+            _ATTACHED[key] = (self.fingerprint, data)
+        return data
+
+    def close(self):
+        _ATTACHED.pop(str(self.X_path), None)
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _rows(X, indices):
+    """The given rows of the memory-mapped dataframe, as a pandas dataframe."""
+    return _safe_indexing(X, indices).to_pandas()
+
+
+def _cached_features(preprocessing, data, X, y, train, test, cache_dir):
+    """Fit and apply the preprocessing, or load its outputs from the cache."""
+    key = joblib.hash((preprocessing, data.fingerprint, train, test))
+    entry = Path(cache_dir) / key
+    if entry.exists():
+        return load_memmapped(entry), True
+    fitted = clone(preprocessing)
+    X_train = fitted.fit_transform(_rows(X, train), y[train])
+    X_test = fitted.transform(_rows(X, test))
+    features = tuple(
+        sbd.to_pandas(part) if sbd.is_dataframe(part) else part
+        for part in (X_train, X_test)
+    )
+    # write to a temporary directory first, so that another worker never
+    # reads an entry that is only partly written
+    partial = Path(tempfile.mkdtemp(dir=cache_dir, prefix=".partial_"))
+    dump_memmapped(features, partial)
+    try:
+        partial.rename(entry)
+    except OSError:
+        # another worker wrote the same entry in the meantime
+        shutil.rmtree(partial, ignore_errors=True)
+    return features, False
+
+
+def _fit_and_score(estimator, data, train, test, scorer, cache_dir):
+    X, y = data.load()
+    start = time.perf_counter()
+    cache_hit = False
+    if cache_dir is not None and isinstance(estimator, Pipeline):
+        (X_train, X_test), cache_hit = _cached_features(
+            estimator[:-1], data, X, y, train, test, cache_dir
+        )
+        estimator = clone(estimator[-1])
+    else:
+        estimator = clone(estimator)
+        X_train, X_test = _rows(X, train), _rows(X, test)
+    estimator.fit(X_train, y[train])
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    score = scorer(estimator, X_test, y[test])
+    return {
+        "test_score": score,
+        "fit_time": fit_time,
+        "score_time": time.perf_counter() - start,
+        "cache_hit": cache_hit,
+    }
+
+
+def shared_cross_validate(
+    estimator, data, cv=5, scoring=None, n_jobs=None, cache_dir=None
+):
+    """Cross-validate an estimator on a ``SharedDataset``.
+
+    Parameters
+    ----------
+    estimator : estimator
+        The model to evaluate, e.g. a ``tabular_pipeline``.
+    data : SharedDataset
+        The data, which the workers memory-map.
+    cv : int or cross-validation splitter, default=5
+        As for ``cross_validate``.
+    scoring : str or callable, optional
+        As for ``cross_validate`` (a single metric).
+    n_jobs : int, optional
+        The number of worker processes.
+    cache_dir : str or Path, optional
+        When ``estimator`` is a pipeline, the outputs of all its steps but the
+        last one are cached in this directory for each fold, and reused by the
+        pipelines with the same preprocessing that are evaluated on the same
+        data and folds. ``None`` disables the cache.
+
+    Returns
+    -------
+    dict
+        ``test_score``, ``fit_time`` and ``score_time`` (one value per fold,
+        as in ``cross_validate``; with the cache, ``fit_time`` includes
+        loading the features) and ``n_cache_hits``.
+    """
+    if cache_dir is not None:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    _, y = data.load()
+    cv = check_cv(cv, y, classifier=is_classifier(estimator))
+    scorer = check_scoring(estimator, scoring=scoring)
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_score)(estimator, data, train, test, scorer, cache_dir)
+        for train, test in cv.split(np.zeros(data.n_rows), y)
+    )
+    output = {
+        key: np.asarray([result[key] for result in results])
+        for key in ["test_score", "fit_time", "score_time"]
+    }
+    output["n_cache_hits"] = sum(result["cache_hit"] for result in results)
+    return output
+
+
+def _children(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as fp:
+                # the command name is in parentheses and may contain spaces
+                ppid = int(fp.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def _process_memory(pid):
+    """RSS and PSS of a process, in bytes (``None`` when not available)."""
+    rss = pss = None
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as fp:
+            for line in fp:
+                if line.startswith("Rss:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("Pss:"):
+                    pss = int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return rss, pss
+
+
+class _TreeMemorySampler:
+    """Track the peak total RSS and PSS of this process and its descendants."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss = self.peak_pss = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        pids, total_rss, total_pss = [os.getpid()], 0, 0
+        while pids:
+            pid = pids.pop()
+            rss, pss = _process_memory(pid)
+            if rss is None:
+                continue
+            total_rss += rss
+            total_pss += pss
+            pids.extend(_children(pid))
+        if total_rss:
+            self.peak_rss = max(self.peak_rss or 0, total_rss)
+            self.peak_pss = max(self.peak_pss or 0, total_pss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        if Path("/proc/self/smaps_rollup").exists():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if hasattr(self, "_thread"):
+            self._thread.join()
+
+
+def _default_datasets():
+    salaries = pd.read_csv(DATA_DIR / "employee_salaries" / "data.csv")
+    target = pd.read_csv(DATA_DIR / "employee_salaries" / "target.csv")
+    synthetic = generate_synthetic_dataframe(
+        100_000, n_numeric=4, n_categorical=6, seed=0
+    ).to_pandas()
+    signal = 2 * synthetic["num_1"] - synthetic["num_2"]
+    noise = np.random.default_rng(0).normal(scale=signal.std(), size=len(signal))
+    synthetic_target = signal + noise
+    return {
+        "employee_salaries": (salaries, target.iloc[:, 0].to_numpy()),
+        "synthetic (100k rows)": (synthetic, synthetic_target.to_numpy()),
+    }
+
+
+def benchmark_shared_cv(datasets=None, estimators=None, n_jobs=4, cv=5):
+    """Evaluate several models with ``cross_validate`` and ``shared_cross_validate``.
+
+    Parameters
+    ----------
+    datasets : dict, optional
+        Name -> ``(X, y)``. Defaults to employee_salaries and 100k rows of
+        synthetic data.
+    estimators : dict, optional
+        Name -> estimator. Defaults to ``tabular_pipeline(Ridge(alpha))`` for
+        three values of ``alpha``, which share their preprocessing.
+    n_jobs : int, default=4
+        The number of worker processes of both runners.
+    cv : int, default=5
+        The number of folds.
+
+    Returns
+    -------
+    list of dict
+        One row per dataset and runner, with the keys of ``_COLUMNS``; the
+        wall time and memory cover the evaluation of all the estimators.
+    """
+    datasets = _default_datasets() if datasets is None else datasets
+    if estimators is None:
+        estimators = {
+            f"Ridge(alpha={alpha})": tabular_pipeline(Ridge(alpha=alpha))
+            for alpha in [0.1, 1.0, 10.0]
+        }
+    # Ridge with a small alpha is ill-conditioned on the spline features,
+    # which makes the solver warn
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", LinAlgWarning)
+        results = []
+        for name, (X, y) in datasets.items():
+            for runner in ["cross_validate", "shared_cross_validate"]:
+                # start from fresh workers, which do not hold the previous data
+                get_reusable_executor().shutdown(wait=True)
+                scores, n_cache_hits = [], 0
+                start = time.perf_counter()
+                with _TreeMemorySampler() as memory:
+                    if runner == "cross_validate":
+                        for estimator in estimators.values():
+                            cv_results = cross_validate(
+                                estimator, X, y, cv=cv, n_jobs=n_jobs
+                            )
+                            scores.append(cv_results["test_score"].mean())
+                    else:
+                        with tempfile.TemporaryDirectory() as cache_dir:
+                            with SharedDataset(X, y) as data:
+                                for estimator in estimators.values():
+                                    cv_results = shared_cross_validate(
+                                        estimator,
+                                        data,
+                                        cv=cv,
+                                        n_jobs=n_jobs,
+                                        cache_dir=cache_dir,
+                                    )
+                                    scores.append(cv_results["test_score"].mean())
+                                    n_cache_hits += cv_results["n_cache_hits"]
+                results.append(
+                    {
+                        "dataset": name,
+                        "runner": runner,
+                        "n_models": len(estimators),
+                        "n_cache_hits": n_cache_hits,
+                        "wall_time": time.perf_counter() - start,
+                        "peak_total_rss": memory.peak_rss,
+                        "peak_total_pss": memory.peak_pss,
+                        "mean_score": round(float(np.mean(scores)), 4),
+                    }
+                )
+    return results
+
+
+def main():
+    """Benchmark the shared-memory runner on employee_salaries and synthetic data."""
+    n_jobs = int(os.environ.get("N_JOBS", 4))
+    print(f"Cross-validating 3 models with {n_jobs} workers\n")
+    print_results(benchmark_shared_cv(n_jobs=n_jobs), columns=_COLUMNS)
+
+
+if __name__ == "__main__":
+    main()
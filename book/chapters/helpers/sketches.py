@@ -0,0 +1,245 @@
+"""
+Mergeable sketches used to summarize columns that do not fit in memory.
+
+All sketches have a fixed memory footprint, are updated one chunk of values at
+a time with vectorized NumPy operations, and can be merged, so that partial
+summaries computed by different processes can be combined:
+- ``HyperLogLog`` estimates the number of distinct values
+- ``QuantileSketch`` (a KLL-style compactor hierarchy) estimates quantiles
+  and ranks
+- ``CountMinSketch`` estimates value frequencies and tracks the most frequent
+  values
+- ``Moments`` keeps the exact count, mean, variance, minimum and maximum
+"""
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["HyperLogLog", "QuantileSketch", "CountMinSketch", "Moments", "hash_values"]
+
+
+def hash_values(values):
+    """Hash an array of values (numbers or strings) to ``uint64``."""
+    values = np.asarray(values)
+    if values.dtype.kind in "USO":
+        values = values.astype(object)
+    return pd.util.hash_array(values, categorize=False)
+
+
+def _bit_length(x):
+    """Vectorized ``int.bit_length`` for an array of ``uint64``."""
+    # split in two halves that float64 represents exactly, then read the
+    # exponent of each half
+    high = (x >> np.uint64(32)).astype(np.float64)
+    low = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+class HyperLogLog:
+    """Estimate the number of distinct values with ``2 ** precision`` bytes.
+
+    The relative standard error is about ``1.04 / sqrt(2 ** precision)``,
+    i.e. 0.8% with the default precision.
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(2**precision, dtype=np.uint8)
+
+    def update(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        n_remaining_bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(n_remaining_bits)).astype(np.intp)
+        remaining = hashes & np.uint64(2**n_remaining_bits - 1)
+        # position of the leftmost 1-bit in the remaining bits
+        ranks = (n_remaining_bits - _bit_length(remaining) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m**2 / np.sum(2.0 ** -self.registers.astype(float))
+        n_zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and n_zeros:
+            # small range correction (linear counting)
+            estimate = m * np.log(m / n_zeros)
+        return int(round(estimate))
+
+
+class QuantileSketch:
+    """Estimate quantiles and ranks with a hierarchy of compactors.
+
+    Level ``h`` holds items that each stand for ``2 ** h`` values. When a
+    level holds more than ``k`` items, they are sorted and every other item
+    (starting at a random offset) is promoted to the next level. The memory
+    is ``O(k log(n / k))`` and the rank error is ``O(log(n / k) / k)``.
+    """
+
+    def __init__(self, k=256, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def count(self):
+        return sum(len(items) * 2**h for h, items in enumerate(self.levels))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        for h, items in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self._compress()
+        return self
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # an odd item out stays at this level so that no weight is lost
+                n_kept = len(items) % 2
+                self.levels[h] = items[len(items) - n_kept :]
+                offset = self._rng.integers(2)
+                promoted = items[offset : len(items) - n_kept : 2]
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2.0**h) for h, items in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantiles(self, qs):
+        """Estimate the quantiles ``qs`` (in [0, 1]) of the values seen so far."""
+        items, weights = self._weighted_items()
+        if not len(items):
+            return np.full(np.shape(qs), np.nan)
+        cumulative = np.cumsum(weights) - weights / 2
+        return np.interp(np.asarray(qs) * weights.sum(), cumulative, items)
+
+    def rank(self, values):
+        """Estimate the number of values seen so far that are <= ``values``."""
+        items, weights = self._weighted_items()
+        cumulative = np.concatenate([[0.0], np.cumsum(weights)])
+        return cumulative[np.searchsorted(items, values, side="right")]
+
+
+class CountMinSketch:
+    """Estimate value frequencies and keep track of the most frequent values.
+
+    Counts are never under-estimated, and over-estimated by at most
+    ``e * n / width`` with probability ``1 - exp(-depth)``. The
+    ``n_candidates`` values with the largest estimated counts are kept, so
+    that the top values can be listed.
+    """
+
+    def __init__(self, width=2048, depth=4, n_candidates=50):
+        self.width = width
+        self.depth = depth
+        self.n_candidates = n_candidates
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        # value -> hash of the most frequent values seen so far
+        self.candidates = {}
+
+    def _columns(self, hashes):
+        # derive `depth` hash functions from one 64-bit hash (double hashing)
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = hashes >> np.uint64(32)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1 + rows * h2) % np.uint64(self.width)).astype(np.intp)
+
+    def estimate(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        columns = self._columns(hashes)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def update(self, values, counts, hashes):
+        """Add ``counts`` occurrences of each of the (distinct) ``values``."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        counts = np.asarray(counts, dtype=np.int64)
+        columns = self._columns(hashes)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+        top = np.argsort(-counts, kind="stable")[: self.n_candidates]
+        self._update_candidates(
+            dict(zip(np.asarray(values, dtype=object)[top], hashes[top]))
+        )
+        return self
+
+    def merge(self, other):
+        self.table += other.table
+        self._update_candidates(other.candidates)
+        return self
+
+    def _update_candidates(self, new_candidates):
+        candidates = {**self.candidates, **new_candidates}
+        values = list(candidates)
+        estimates = self.estimate(np.fromiter(candidates.values(), np.uint64))
+        keep = np.argsort(-estimates, kind="stable")[: self.n_candidates]
+        self.candidates = {values[i]: candidates[values[i]] for i in keep}
+
+    def top_values(self, k=10):
+        """Return the ``k`` most frequent values as (value, estimated count)."""
+        values = list(self.candidates)
+        if not values:
+            return []
+        estimates = self.estimate(np.fromiter(self.candidates.values(), np.uint64))
+        order = np.argsort(-estimates, kind="stable")[:k]
+        return [(values[i], int(estimates[i])) for i in order]
+
+
+class Moments:
+    """Exact count, mean, variance, minimum and maximum, mergeable."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return self
+        other = Moments()
+        other.count = len(values)
+        other.mean = values.mean()
+        other.m2 = ((values - other.mean) ** 2).sum()
+        other.min, other.max = values.min(), values.max()
+        return self.merge(other)
+
+    def merge(self, other):
+        # Chan et al. parallel algorithm for the variance
+        count = self.count + other.count
+        if not count:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
@@ -0,0 +1,309 @@
+"""
+Keep one-hot encoded features sparse from the ``TableVectorizer`` to the
+estimator.
+
+The ``TableVectorizer`` returns a dataframe, so the one-hot encoding of the
+low-cardinality columns is dense: with many categorical columns, the feature
+matrix is mostly zeros. This module provides:
+- ``SparseTableVectorizer``: runs a ``TableVectorizer`` with the
+  low-cardinality columns passed through, one-hot encodes them into a sparse
+  matrix, and stacks them with the other (dense) features into a single CSR
+  matrix
+- ``sparse_tabular_pipeline``: the same as ``skrub.tabular_pipeline``, with a
+  ``SparseTableVectorizer`` when the estimator accepts sparse input and uses
+  a one-hot encoding (e.g. linear models); for the other estimators (e.g.
+  gradient boosting, which uses the categories natively) it returns
+  ``tabular_pipeline`` unchanged
+- ``benchmark_sparse_output``: compare the memory and fit time of the dense
+  and sparse outputs for a linear model and gradient boosting
+
+The dense features (numbers, datetimes, high-cardinality encodings) take
+three times more memory in a CSR matrix than in a dense array (each value is
+stored with its column index), so the sparse output only pays off when the
+one-hot encoded columns dominate.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder
+from sklearn.utils import get_tags
+from skrub import SquashingScaler, TableVectorizer, tabular_pipeline
+from skrub import _dataframe as sbd
+from skrub import selectors as s
+
+from .benchmarking import DATA_DIR, measure, print_results
+from .dataops_memory import nbytes
+from .generate_synthetic_data import generate_synthetic_dataframe
+
+__all__ = [
+    "SparseTableVectorizer",
+    "sparse_tabular_pipeline",
+    "benchmark_sparse_output",
+]
+
+_COLUMNS = [
+    "dataset",
+    "estimator",
+    "output",
+    "n_features",
+    "density",
+    "features_size",
+    "fit_time",
+    "peak_memory",
+]
+
+
+class SparseTableVectorizer(TransformerMixin, BaseEstimator):
+    """A ``TableVectorizer`` whose one-hot encoded features stay sparse.
+
+    Parameters
+    ----------
+    vectorizer : TableVectorizer, optional
+        The vectorizer to use for all columns; its ``low_cardinality``
+        transformer must be a ``OneHotEncoder``, which is set to produce a
+        float32 sparse output. Defaults to ``TableVectorizer()``.
+    dense_transformer : transformer, optional
+        Applied to the dense features only (all but the one-hot encoded
+        ones), e.g. an imputer and a scaler, before they are stacked with the
+        sparse features.
+
+    Attributes
+    ----------
+    vectorizer_ : TableVectorizer
+        The fitted vectorizer, with the low-cardinality columns passed through.
+    one_hot_encoder_ : OneHotEncoder
+        The encoder fitted on the low-cardinality columns.
+    dense_columns_, sparse_columns_ : list of str
+        The outputs of ``vectorizer_`` that are kept dense, and those that are
+        one-hot encoded.
+    """
+
+    def __init__(self, vectorizer=None, dense_transformer=None):
+        self.vectorizer = vectorizer
+        self.dense_transformer = dense_transformer
+
+    def fit(self, X, y=None):
+        self.fit_transform(X, y)
+        return self
+
+    def fit_transform(self, X, y=None):
+        vectorizer = TableVectorizer() if self.vectorizer is None else self.vectorizer
+        one_hot_encoder = vectorizer.low_cardinality
+        if not isinstance(one_hot_encoder, OneHotEncoder):
+            raise ValueError(
+                "The low_cardinality transformer of the vectorizer must be a"
+                f" OneHotEncoder, got {one_hot_encoder!r}."
+            )
+        self.one_hot_encoder_ = clone(one_hot_encoder).set_params(
+            sparse_output=True, dtype=np.float32
+        )
+        self.vectorizer_ = clone(vectorizer).set_params(low_cardinality="passthrough")
+        vectorized = self.vectorizer_.fit_transform(X, y)
+        low_cardinality = self.vectorizer_.kind_to_columns_["low_cardinality"]
+        self.sparse_columns_ = [
+            output
+            for column in low_cardinality
+            for output in self.vectorizer_.input_to_outputs_[column]
+        ]
+        self.dense_columns_ = [
+            column
+            for column in sbd.column_names(vectorized)
+            if column not in set(self.sparse_columns_)
+        ]
+        if self.dense_transformer is not None:
+            self.dense_transformer_ = clone(self.dense_transformer)
+        return self._stack(vectorized, y, fit=True)
+
+    def transform(self, X):
+        return self._stack(self.vectorizer_.transform(X), None, fit=False)
+
+    def _stack(self, vectorized, y, fit):
+        blocks = []
+        if self.dense_columns_:
+            dense = s.select(vectorized, self.dense_columns_)
+            if self.dense_transformer is not None:
+                if fit:
+                    dense = self.dense_transformer_.fit_transform(dense, y)
+                else:
+                    dense = self.dense_transformer_.transform(dense)
+            if sbd.is_dataframe(dense):
+                dense = sbd.to_numpy(dense)
+            blocks.append(sparse.csr_matrix(dense, dtype=np.float32))
+        if self.sparse_columns_:
+            categories = s.select(vectorized, self.sparse_columns_)
+            if fit:
+                blocks.append(self.one_hot_encoder_.fit_transform(categories))
+            else:
+                blocks.append(self.one_hot_encoder_.transform(categories))
+        return sparse.hstack(blocks, format="csr", dtype=np.float32)
+
+    def get_feature_names_out(self, input_features=None):
+        dense = np.asarray(self.dense_columns_, dtype=object)
+        if self.dense_transformer is not None and self.dense_columns_:
+            dense = self.dense_transformer_.get_feature_names_out()
+        if not self.sparse_columns_:
+            return dense
+        one_hot = self.one_hot_encoder_.get_feature_names_out(self.sparse_columns_)
+        return np.concatenate([dense, one_hot])
+
+
+def _accepts_sparse(estimator):
+    try:
+        return get_tags(estimator).input_tags.sparse
+    except AttributeError:
+        return False
+
+
+def sparse_tabular_pipeline(estimator, n_jobs=None):
+    """``tabular_pipeline``, with sparse one-hot features when possible.
+
+    When the estimator accepts sparse input and ``tabular_pipeline`` would
+    one-hot encode the low-cardinality columns, the vectorizer is replaced by
+    a ``SparseTableVectorizer``, and the imputer and scaler that
+    ``tabular_pipeline`` adds are applied to the dense features only (the
+    one-hot features need neither). Otherwise the pipeline of
+    ``tabular_pipeline`` is returned unchanged.
+
+    Parameters
+    ----------
+    estimator : estimator, str or Pipeline
+        As for ``tabular_pipeline``.
+    n_jobs : int, optional
+        As for ``tabular_pipeline``.
+
+    Returns
+    -------
+    Pipeline
+    """
+    pipeline = tabular_pipeline(estimator, n_jobs=n_jobs)
+    vectorizer, *steps = [step for _, step in pipeline.steps]
+    if not (
+        _accepts_sparse(steps[-1])
+        and isinstance(vectorizer.low_cardinality, OneHotEncoder)
+    ):
+        return pipeline
+    # the imputer and scaler directly follow the vectorizer
+    n_dense_steps = 0
+    for step in steps[:-1]:
+        if not isinstance(step, (SimpleImputer, SquashingScaler)):
+            break
+        n_dense_steps += 1
+    dense_steps, steps = steps[:n_dense_steps], steps[n_dense_steps:]
+    dense_transformer = make_pipeline(*dense_steps) if dense_steps else None
+    return make_pipeline(
+        SparseTableVectorizer(vectorizer, dense_transformer=dense_transformer),
+        *steps,
+    )
+
+
+def _wide_dataset(n_rows, n_categorical, seed=0):
+    """Synthetic data with ``n_categorical`` low-cardinality string columns."""
+    # the generator cycles through 6 sources of values, 3 of which have less
+    # than 40 distinct values (countries, departments and products)
+    df = generate_synthetic_dataframe(
+        n_rows, n_numeric=3, n_categorical=2 * n_categorical, seed=seed
+    ).to_pandas()
+    high_cardinality = ("first_name", "last_name", "city")
+    df = df.drop(columns=[c for c in df.columns if c.startswith(high_cardinality)])
+    return df, df.pop("num_3").to_numpy()
+
+
+def _employee_salaries():
+    X = pd.read_csv(DATA_DIR / "employee_salaries" / "data.csv")
+    y = pd.read_csv(DATA_DIR / "employee_salaries" / "target.csv").iloc[:, 0]
+    return X, y.to_numpy()
+
+
+def _density(features):
+    if sparse.issparse(features):
+        return features.nnz / np.prod(features.shape)
+    return np.count_nonzero(features) / np.prod(features.shape)
+
+
+def benchmark_sparse_output(datasets=None, estimators=None):
+    """Compare dense and sparse features for a linear model and gradient boosting.
+
+    For each estimator, the dense variant is a ``TableVectorizer`` (which
+    one-hot encodes the low-cardinality columns into a dense dataframe)
+    followed by the estimator; the linear model also gets the imputer and
+    scaler of ``tabular_pipeline``. The other variant is
+    ``sparse_tabular_pipeline``: sparse features for the linear model, and
+    the native handling of categories for gradient boosting, which does not
+    accept sparse input.
+
+    Parameters
+    ----------
+    datasets : dict, optional
+        Name -> ``(X, y)``. Defaults to employee_salaries and a wide synthetic
+        table (100k rows, 20 low-cardinality columns).
+    estimators : dict, optional
+        Name -> estimator. Defaults to ``Ridge`` and
+        ``HistGradientBoostingRegressor``.
+
+    Returns
+    -------
+    list of dict
+        One row per dataset, estimator and variant, with the keys of
+        ``_COLUMNS``; ``output`` is ``"dense"``, ``"csr"`` or
+        ``"categorical"``.
+    """
+    if datasets is None:
+        datasets = {
+            "employee_salaries": _employee_salaries(),
+            "synthetic (20 categorical)": _wide_dataset(100_000, 20),
+        }
+    if estimators is None:
+        estimators = {
+            "Ridge": Ridge(),
+            "HistGradientBoosting": HistGradientBoostingRegressor(),
+        }
+    results = []
+    for dataset, (X, y) in datasets.items():
+        for name, estimator in estimators.items():
+            dense = tabular_pipeline(clone(estimator))
+            # the default low_cardinality encoder: a dense one-hot encoding
+            dense.steps[0][1].set_params(
+                low_cardinality=TableVectorizer().low_cardinality
+            )
+            candidates = {
+                "dense": dense,
+                "sparse": sparse_tabular_pipeline(clone(estimator)),
+            }
+            for variant, pipeline in candidates.items():
+                _, stats = measure(pipeline.fit, X, y)
+                features = pipeline[:-1].transform(X)
+                if sparse.issparse(features):
+                    output = "csr"
+                elif isinstance(pipeline.steps[0][1].low_cardinality, OneHotEncoder):
+                    output = "dense"
+                else:
+                    output = "categorical"
+                results.append(
+                    {
+                        "dataset": dataset,
+                        "estimator": name,
+                        "output": output,
+                        "n_features": features.shape[1],
+                        "density": round(_density(features), 3),
+                        "features_size": nbytes(features),
+                        "fit_time": stats["wall_time"],
+                        "peak_memory": stats["peak_memory"],
+                    }
+                )
+                del features
+    return results
+
+
+def main():
+    """Benchmark dense and sparse features on employee_salaries and wide data."""
+    print_results(benchmark_sparse_output(), columns=_COLUMNS)
+
+
+if __name__ == "__main__":
+    main()
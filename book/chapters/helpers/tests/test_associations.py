@@ -0,0 +1,25 @@
+import numpy as np
+
+from ..associations import _wide_dataframe, fast_column_associations
+
+
+def _by_pair(table):
+    return table.set_index(["left_column_name", "right_column_name"])
+
+
+def test_sample_error_covers_exact_value():
+    df = _wide_dataframe(200_000, 20)
+    exact = _by_pair(fast_column_associations(df, compute_pearson=False))
+    sample = _by_pair(
+        fast_column_associations(df, compute_pearson=False, sample_size=500)
+    )
+    difference = (sample["cramer_v"] - exact["cramer_v"].reindex(sample.index)).abs()
+    # without the bias correction, no interval contains the exact value
+    assert (difference <= sample["cramer_v_error"]).mean() > 0.85
+
+
+def test_top_k_matches_exact():
+    df = _wide_dataframe(20_000, 30)
+    exact = fast_column_associations(df, compute_pearson=False).head(6)
+    top_k = fast_column_associations(df, compute_pearson=False, top_k=6)
+    np.testing.assert_allclose(top_k["cramer_v"], exact["cramer_v"])
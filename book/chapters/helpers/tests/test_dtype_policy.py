@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+from ..dtype_policy import audit_dtypes
+
+
+def _frame():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "a": rng.normal(size=50).astype("float64"),
+            "b": rng.normal(size=50).astype("float32"),
+        }
+    )
+
+
+def test_swapped_dtypes_are_an_upcast():
+    X = _frame()
+    swap = FunctionTransformer(lambda X: X.astype({"a": "float32", "b": "float64"}))
+    rows = audit_dtypes(make_pipeline(swap, Ridge()), X, np.arange(50.0))
+    assert [row["step"] for row in rows] == ["functiontransformer", "estimator input"]
+    assert rows[0]["n_float32"] == rows[0]["n_float64"] == 1
+    assert rows[0]["upcast"]
+
+
+def test_estimator_only():
+    X = _frame()
+    rows = audit_dtypes(make_pipeline(Ridge()), X, np.arange(50.0))
+    assert len(rows) == 1
+    assert rows[0]["step"] == "estimator input"
+    assert (rows[0]["n_float32"], rows[0]["n_float64"]) == (1, 1)
+    assert rows[0]["upcast"]
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from ..generate_synthetic_data import _keyed_permutation, generate_rows
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 17, 1000, 4097])
+def test_keyed_permutation_is_a_bijection(size):
+    round_keys = np.arange(1, 5, dtype=np.uint64)
+    out = _keyed_permutation(np.arange(size), size, round_keys)
+    np.testing.assert_array_equal(np.sort(out), np.arange(size))
+
+
+def test_rows_do_not_depend_on_the_range():
+    kwargs = dict(
+        n_high_cardinality=1,
+        vocabulary_size=10_000_000,
+        cardinality_distribution="power_law",
+        seed=3,
+    )
+    rows = generate_rows(0, 2000, **kwargs)
+    assert rows[500:1500].equals(generate_rows(500, 1500, **kwargs))
+    assert rows["high_cardinality_1"].n_unique() > 100
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from sklearn.preprocessing import RobustScaler, StandardScaler
+from skrub import SquashingScaler
+
+from ..plot_squashing_scaler import _sorted_curves
+
+
+@pytest.mark.parametrize("n_features", [1, 3])
+def test_features_are_scaled_separately(n_features):
+    rng = np.random.default_rng(0)
+    values = rng.standard_cauchy((500, n_features)) * np.arange(1, n_features + 1)
+    x, curves = _sorted_curves(values, max_points=50)
+    points = np.sort(values, axis=0)[x]
+    np.testing.assert_array_equal(curves["values"], points)
+    for name, scaler in [
+        ("squash", SquashingScaler()),
+        ("robust", RobustScaler()),
+        ("standard", StandardScaler()),
+    ]:
+        expected = scaler.fit(values).transform(points)
+        np.testing.assert_allclose(curves[name], expected, rtol=1e-10, atol=1e-10)
@@ -0,0 +1,64 @@
+import ast
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression, Ridge
+from skrub import tabular_pipeline
+
+from ..scoring_export import check_export, export_linear_pipeline
+
+
+def _frame(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    # enough distinct n-grams for all the 30 SVD components to carry variance
+    letters = np.asarray(list("abcdefghijklmnopqrstuvwxyz"))
+    words = np.asarray(
+        ["fire"]
+        + ["".join(np.random.default_rng(i).choice(letters, 6)) for i in range(60)]
+    )
+    dates = pd.Timestamp("1990-01-01") + pd.to_timedelta(
+        rng.integers(0, 10_000, n_rows), unit="D"
+    )
+    X = pd.DataFrame(
+        {
+            "title": [" ".join(rng.choice(words, 3)) for _ in range(n_rows)],
+            "department": rng.choice(["A", "B", "C"], n_rows),
+            "hired": dates.strftime("%m/%d/%Y"),
+            "age": rng.normal(40, 10, n_rows),
+        }
+    )
+    X.loc[::17, "hired"] = None
+    y = X["age"] + (dates.year - 1990) + X["title"].str.count("fire") * 5
+    return X, y.to_numpy()
+
+
+@pytest.mark.parametrize("estimator", [Ridge(), LogisticRegression()])
+def test_new_dates_and_strings_are_exact(estimator):
+    X_train, y_train = _frame(300, 0)
+    X_test, _ = _frame(200, 1)
+    if isinstance(estimator, LogisticRegression):
+        y_train = y_train > np.median(y_train)
+    # the SVD of the StringEncoder draws from the global random state
+    np.random.seed(0)
+    pipeline = tabular_pipeline(estimator).fit(X_train, y_train)
+    scorer = export_linear_pipeline(pipeline, X_train, keep_pipeline=False)
+    assert set(scorer.dates) == {"hired"}
+    assert set(scorer.strings) == {"title"}
+    assert set(scorer.tables) == {"department"}
+    assert not X_test["hired"].dropna().isin(X_train["hired"]).all()
+    check_export(scorer, pipeline, X_test)
+    check_export(pickle.loads(pickle.dumps(scorer)), pipeline, X_test)
+
+
+def test_linear_scorer_only_imports_numpy():
+    source = Path(__file__).parents[1] / "linear_scorer.py"
+    modules = set()
+    for node in ast.walk(ast.parse(source.read_text())):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            modules.add(node.module.split(".")[0])
+    assert modules <= {"math", "re", "collections", "datetime", "numpy"}
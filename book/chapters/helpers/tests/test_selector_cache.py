@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+from skrub import selectors as s
+
+from ..selector_cache import cached_expand, cached_selectors
+
+DF = pd.DataFrame({"a": [1], "b": ["x"], "c": [2.0]})
+
+
+@pytest.mark.parametrize(
+    "selector",
+    [s.cols("a", "c"), ["c", "a"], "b", s.numeric() - "a", s.all(), ~s.cols("b")],
+)
+def test_same_columns_as_expand(selector):
+    expected = s.make_selector(selector).expand(DF)
+    assert cached_expand(selector, DF) == expected
+    # the second call reads the cache
+    assert cached_expand(selector, DF) == expected
+    with cached_selectors():
+        assert s.make_selector(selector).expand(DF) == expected
+
+
+@pytest.mark.parametrize("selector", [s.cols("a", "zz"), ["a", "zz"]])
+def test_missing_columns_raise(selector):
+    with pytest.raises(ValueError, match="zz"):
+        s.make_selector(selector).expand(DF)
+    with pytest.raises(ValueError, match="zz"):
+        cached_expand(selector, DF)
+    with cached_selectors(), pytest.raises(ValueError, match="zz"):
+        s.make_selector(selector).expand(DF)
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+
+from ..shared_cv import SharedDataset, shared_cross_validate
+
+
+def _data(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({"a": rng.normal(size=n_rows), "b": rng.normal(size=n_rows)})
+    return X, 2 * X["a"] - X["b"] + rng.normal(scale=0.1, size=n_rows)
+
+
+def test_reused_workers_see_the_new_dataset_in_the_same_directory(tmp_path):
+    X, y = _data(200, 0)
+    with SharedDataset(X, y, directory=tmp_path) as data:
+        shared_cross_validate(Ridge(), data, cv=2, n_jobs=2)
+    X, y = _data(400, 1)
+    with SharedDataset(X, y, directory=tmp_path) as data:
+        scores = shared_cross_validate(Ridge(), data, cv=2, n_jobs=2)["test_score"]
+    X_0, X_1, y_0, y_1 = X[:200], X[200:], y[:200], y[200:]
+    expected = [
+        Ridge().fit(X_1, y_1).score(X_0, y_0),
+        Ridge().fit(X_0, y_0).score(X_1, y_1),
+    ]
+    np.testing.assert_allclose(scores, expected)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import polars as pl
+import pytest
+from skrub import StringEncoder
+
+from ..unique_encoding import EncodeUniques, zipf_strings
+
+
+def test_polars_leading_null():
+    column = pl.Series("division", [None] + ["x y"] * 3 + ["a b", "x z"])
+    encoder = EncodeUniques(StringEncoder(n_components=2))
+    output = encoder.fit_transform(column)
+    assert output.shape == (6, 2)
+    assert encoder.n_unique_ == 4
+    np.testing.assert_array_equal(output.row(1), output.row(2))
+    np.testing.assert_allclose(
+        encoder.transform(column).to_numpy(), output.to_numpy(), atol=1e-5
+    )
+
+
+@pytest.mark.parametrize("make_column", [pd.Series, pl.Series])
+def test_fit_on_rows_matches_encoder(make_column):
+    values = zipf_strings(2000, 200)
+    column = make_column(values.name, values.tolist())
+    expected = StringEncoder(n_components=4, random_state=0).fit_transform(column)
+    encoder = EncodeUniques(StringEncoder(n_components=4, random_state=0))
+    output = encoder.fit_transform(column)
+    np.testing.assert_allclose(output.to_numpy(), expected.to_numpy(), atol=1e-4)
+    np.testing.assert_allclose(
+        encoder.transform(column).to_numpy(), expected.to_numpy(), atol=1e-4
+    )
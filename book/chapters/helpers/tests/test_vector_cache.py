@@ -0,0 +1,64 @@
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from skrub import StringEncoder
+
+from ..vector_cache import CachedEncoder, VectorStore
+
+
+def _words(start, stop):
+    return pd.Series([f"word {i} {i * 7 % 13}" for i in range(start, stop)], name="w")
+
+
+def _check_cached_output(encoder, column):
+    expected = encoder.encoder_.transform(column).to_numpy()
+    np.testing.assert_allclose(
+        encoder.transform(column).to_numpy(), expected, atol=1e-5
+    )
+
+
+def test_eviction_does_not_overwrite_cached_vectors(tmp_path):
+    encoder = CachedEncoder(StringEncoder(n_components=4), tmp_path, max_entries=100)
+    encoder.fit_transform(_words(0, 100))
+    # 95 cached values and 10 new ones: the new ones evict old slots
+    _check_cached_output(encoder, _words(5, 110))
+    assert encoder.n_cache_hits_ == 95
+    assert encoder.n_cache_misses_ == 10
+
+
+def test_more_distinct_values_than_the_store_capacity(tmp_path):
+    encoder = CachedEncoder(StringEncoder(n_components=4), tmp_path, max_entries=100)
+    encoder.fit_transform(_words(0, 50))
+    _check_cached_output(encoder, _words(0, 250))
+    _check_cached_output(encoder, _words(0, 250))
+
+
+def test_cold_fit_encodes_once_and_fills_the_store(tmp_path):
+    column = _words(0, 100)
+    encoder = CachedEncoder(StringEncoder(n_components=4), tmp_path)
+    with mock.patch.object(
+        StringEncoder, "transform", autospec=True, side_effect=StringEncoder.transform
+    ) as transform:
+        output = encoder.fit_transform(pd.concat([column, column], ignore_index=True))
+    transform.assert_not_called()
+    assert not encoder.fit_from_cache_
+    assert encoder.n_cache_misses_ == 100
+    expected = encoder.encoder_.transform(column).to_numpy()
+    np.testing.assert_allclose(output.to_numpy()[:100], expected, atol=1e-5)
+    encoder.transform(column)
+    assert encoder.n_cache_hits_ == 100
+
+
+def test_reopened_store_keeps_the_lru_clock(tmp_path):
+    store = VectorStore(tmp_path, n_features=2, max_entries=10)
+    store.put(np.arange(10), np.zeros((10, 2)))
+    store.flush()
+    for _ in range(5):
+        store.lookup(np.asarray([0], dtype=np.uint64))
+    # the other keys are used after key 0, which is now the oldest
+    store = VectorStore(tmp_path, n_features=2, max_entries=10)
+    store.lookup(np.arange(1, 10, dtype=np.uint64))
+    store.put(np.asarray([10], dtype=np.uint64), np.ones((1, 2)))
+    slots = store.lookup(np.arange(11, dtype=np.uint64))
+    assert slots[0] < 0 and (slots[1:] >= 0).all()
@@ -0,0 +1,248 @@
+"""
+Encode the distinct values of a string column only.
+
+High-cardinality columns such as ``employee_position_title`` or the wine
+``winery`` still repeat each value many times, but the ``StringEncoder``, the
+``MinHashEncoder`` and the ``TextEncoder`` compute a vector for every row.
+This module provides:
+- ``EncodeUniques``: a wrapper around any such encoder that factorizes the
+  column, encodes the distinct values only and gathers the rows with
+  ``np.take``, so that the encoding work scales with the cardinality of the
+  column rather than with its number of rows
+- ``zipf_strings``: a column of strings whose frequencies follow a Zipf law,
+  like most real categorical columns
+- ``benchmark_encode_uniques``: compare each encoder with and without the
+  wrapper (fitted on the rows or on the distinct values), and the difference
+  of their outputs, on employee_salaries, wine and Zipf-distributed strings
+
+``EncodeUniques`` is a single-column transformer, so it can be given to
+``ApplyToCols`` or as the ``high_cardinality`` transformer of the
+``TableVectorizer``. The ``MinHashEncoder`` already hashes each distinct
+string once, so it only gains a smaller memory footprint from the wrapper.
+"""
+
+import importlib.util
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from skrub import MinHashEncoder, StringEncoder
+from skrub import _dataframe as sbd
+from skrub._single_column_transformer import SingleColumnTransformer
+
+from .benchmarking import DATA_DIR, measure, print_results
+
+__all__ = ["EncodeUniques", "zipf_strings", "benchmark_encode_uniques"]
+
+_COLUMNS = [
+    "data",
+    "column",
+    "n_rows",
+    "n_unique",
+    "encoder",
+    "fit_transform_time",
+    "transform_time",
+    "peak_memory",
+    "max_abs_diff",
+]
+
+
+def _factorize(column):
+    """Integer codes of the rows, and the distinct values (nulls included)."""
+    codes, uniques = pd.factorize(sbd.to_numpy(column), use_na_sentinel=False)
+    if sbd.is_pandas(column):
+        return codes, sbd.make_column_like(column, uniques, sbd.name(column))
+    import polars as pl
+
+    # polars nulls come back as NaN, and the dtype of a column of Python
+    # objects is inferred from its first value, which can be null
+    uniques = uniques.astype(object)
+    uniques[pd.isna(uniques)] = None
+    return codes, pl.Series(sbd.name(column), uniques.tolist(), dtype=column.dtype)
+
+
+def _gather(encoded, codes, column):
+    values = np.take(sbd.to_numpy(encoded), codes, axis=0)
+    names = sbd.column_names(encoded)
+    if sbd.is_pandas(column):
+        return pd.DataFrame(values, columns=names, index=column.index)
+    import polars as pl
+
+    return pl.DataFrame(values, schema=names)
+
+
+class EncodeUniques(SingleColumnTransformer):
+    """Apply a string encoder to the distinct values of a column only.
+
+    Parameters
+    ----------
+    encoder : single-column transformer
+        E.g. a ``StringEncoder``, ``MinHashEncoder`` or ``TextEncoder``.
+    fit_on : {"rows", "uniques"}, default="rows"
+        What the encoder is fitted on. ``"rows"`` fits on the whole column as
+        usual, and only ``transform`` is done on the distinct values, so the
+        output is the one of the encoder. With ``"uniques"``, each distinct
+        string counts once: this is the fastest, and it does not change the
+        encoders that do not learn from the data (``MinHashEncoder``,
+        ``TextEncoder`` without dimension reduction), but the weights learned
+        by the ``StringEncoder`` (idf and SVD) then ignore how often each
+        string occurs, and its vectors differ from those of a plain
+        ``StringEncoder``. ``benchmark_encode_uniques`` reports both.
+
+    Attributes
+    ----------
+    encoder_ : transformer
+        The fitted encoder.
+    n_unique_ : int
+        The number of distinct values (including null) seen in ``fit``.
+    """
+
+    def __init__(self, encoder, fit_on="rows"):
+        self.encoder = encoder
+        self.fit_on = fit_on
+
+    def fit_transform(self, column, y=None):
+        if self.fit_on not in ("uniques", "rows"):
+            raise ValueError(
+                f"fit_on should be 'uniques' or 'rows', got {self.fit_on!r}."
+            )
+        codes, uniques = _factorize(column)
+        self.encoder_ = clone(self.encoder)
+        self.n_unique_ = len(uniques)
+        if self.fit_on == "uniques":
+            encoded = self.encoder_.fit_transform(uniques, y=None)
+        else:
+            encoded = self.encoder_.fit(column, y).transform(uniques)
+        self.all_outputs_ = sbd.column_names(encoded)
+        return _gather(encoded, codes, column)
+
+    def transform(self, column):
+        codes, uniques = _factorize(column)
+        return _gather(self.encoder_.transform(uniques), codes, column)
+
+
+def zipf_strings(n_rows, n_unique, exponent=1.1, seed=0, name="zipf"):
+    """A pandas column whose values follow a Zipf law.
+
+    The ``k``-th most frequent of the ``n_unique`` strings has a probability
+    proportional to ``1 / k ** exponent``. The strings are made of a few
+    words, so that they share n-grams like real job titles or product names.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.asarray(
+        [
+            "senior", "junior", "assistant", "manager", "officer", "police",
+            "fire", "rescue", "library", "clerk", "engineer", "technician",
+            "analyst", "director", "supervisor", "nurse", "teacher", "driver",
+            "bus", "program", "specialist", "accountant", "inspector", "aide",
+        ]
+    )  # fmt: skip
+    lengths = rng.integers(2, 5, size=n_unique)
+    vocabulary = np.asarray(
+        [
+            " ".join(rng.choice(words, size=length)) + f" {i}"
+            for i, length in enumerate(lengths)
+        ],
+        dtype=object,
+    )
+    probabilities = 1.0 / np.arange(1, n_unique + 1) ** exponent
+    probabilities /= probabilities.sum()
+    return pd.Series(
+        vocabulary[rng.choice(n_unique, size=n_rows, p=probabilities)], name=name
+    )
+
+
+def _default_encoders():
+    # a fixed random_state, so that the outputs of the variants can be compared
+    encoders = {
+        "StringEncoder": StringEncoder(n_components=30, random_state=0),
+        "MinHashEncoder": MinHashEncoder(n_components=30),
+    }
+    if importlib.util.find_spec("sentence_transformers") is not None:
+        from skrub import TextEncoder
+
+        encoders["TextEncoder"] = TextEncoder(n_components=30, random_state=0)
+    return encoders
+
+
+def _default_columns():
+    salaries = pd.read_csv(DATA_DIR / "employee_salaries" / "data.csv")
+    wine = pd.read_csv(DATA_DIR / "wine" / "data.csv")
+    return {
+        ("employee_salaries", "division"): salaries["division"],
+        ("employee_salaries", "employee_position_title"): salaries[
+            "employee_position_title"
+        ],
+        ("wine", "designation"): wine["designation"],
+        ("wine", "winery"): wine["winery"],
+        ("zipf", "200k rows"): zipf_strings(200_000, 20_000),
+    }
+
+
+def benchmark_encode_uniques(columns=None, encoders=None):
+    """Time each encoder with and without ``EncodeUniques``.
+
+    Parameters
+    ----------
+    columns : dict, optional
+        ``(dataset name, column name)`` -> column. Defaults to two columns of
+        employee_salaries, two of wine and 200k Zipf-distributed strings with
+        20k possible values.
+    encoders : dict, optional
+        Name -> encoder. Defaults to a ``StringEncoder`` and a
+        ``MinHashEncoder`` (30 components), and a ``TextEncoder`` when
+        ``sentence-transformers`` is installed. Encoders that reduce the
+        dimension should have a fixed ``random_state``, for ``max_abs_diff``
+        to be meaningful.
+
+    Returns
+    -------
+    list of dict
+        One row per column and encoder, without the wrapper and with it in
+        each ``fit_on`` mode. ``max_abs_diff`` is the largest difference
+        between the output of the variant and that of the plain encoder.
+    """
+    columns = _default_columns() if columns is None else columns
+    encoders = _default_encoders() if encoders is None else encoders
+    results = []
+    for (data, name), column in columns.items():
+        n_unique = column.nunique(dropna=False)
+        for encoder_name, encoder in encoders.items():
+            variants = {encoder_name: clone(encoder)}
+            for fit_on in ["rows", "uniques"]:
+                variants[f"EncodeUniques({encoder_name}, fit_on={fit_on!r})"] = (
+                    EncodeUniques(encoder, fit_on=fit_on)
+                )
+            reference = None
+            for variant, transformer in variants.items():
+                # a pipeline calls fit_transform on its transformers
+                _, fit_stats = measure(transformer.fit_transform, column)
+                output, transform_stats = measure(transformer.transform, column)
+                output = sbd.to_numpy(output)
+                if reference is None:
+                    reference = output
+                results.append(
+                    {
+                        "data": data,
+                        "column": name,
+                        "n_rows": len(column),
+                        "n_unique": n_unique,
+                        "encoder": variant,
+                        "fit_transform_time": fit_stats["wall_time"],
+                        "transform_time": transform_stats["wall_time"],
+                        "peak_memory": max(
+                            fit_stats["peak_memory"], transform_stats["peak_memory"]
+                        ),
+                        "max_abs_diff": float(np.abs(output - reference).max()),
+                    }
+                )
+    return results
+
+
+def main():
+    """Benchmark the string encoders with and without ``EncodeUniques``."""
+    print_results(benchmark_encode_uniques(), columns=_COLUMNS)
+
+
+if __name__ == "__main__":
+    main()
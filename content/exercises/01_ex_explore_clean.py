@@ -3,12 +3,20 @@
 # For this exercise, we will use the `employee_salaries` dataframe to answer some
 # questions.
 #
-# Run the following code to import the dataframe:
+# Run the following code to import the dataframe. The exercises work with pandas
+# or polars dataframes: set `BACKEND` to `"polars"` to use polars.
 
 # %%
-import pandas as pd
+BACKEND = "pandas"
 
-data = pd.read_csv("../data/employee_salaries/data.csv")
+if BACKEND == "polars":
+    import polars as pl
+
+    data = pl.read_csv("../data/employee_salaries/data.csv")
+else:
+    import pandas as pd
+
+    data = pd.read_csv("../data/employee_salaries/data.csv")
 
 # %% [markdown]
 # Now use the skrub `TableReport` and answer the following questions:
@@ -47,7 +55,7 @@ TableReport(data)
 #     - 9228 rows × 8 columns
 # - How many columns have object/numerical/datetime
 #     - No datetime columns, one integer column (`year_first_hired`), all other columns
-#     are objects.
+#     are objects (strings with polars).
 # - Are there columns with a large number of missing values?
 #     - No, only the `gender` column contains a small fraction (0.2%) of missing
 #     values.
@@ -55,7 +63,7 @@ TableReport(data)
 #     - Yes, `division`, `employee_position_title`, `date_first_hired` have a
 #     cardinality larger than 40.
 # - Were datetime columns parsed correctly?
-#     - No, the `date_first_hired` column has dtype Object.
+#     - No, the `date_first_hired` column has dtype Object (String with polars).
 # - Which columns have outliers?
 #     - No columns seem to include outliers.
 # - Which columns have an imbalanced distribution?
@@ -69,9 +77,10 @@ TableReport(data)
 # Load the given dataframe.
 
 # %%
-import pandas as pd
-
-df = pd.read_csv("../data/cleaner_data.csv")
+if BACKEND == "polars":
+    df = pl.read_csv("../data/cleaner_data.csv")
+else:
+    df = pd.read_csv("../data/cleaner_data.csv")
 
 # %% [markdown]
 # Use the `TableReport` to answer the following questions:
@@ -4,10 +4,16 @@
 %pip install skrub
 
 # %%
-# Consider this example dataframe:
-import pandas as pd
+# Consider this example dataframe. The exercises work with pandas or polars
+# dataframes: set `BACKEND` to `"polars"` to use polars.
+BACKEND = "pandas"
 
-df = pd.DataFrame(
+if BACKEND == "polars":
+    from polars import DataFrame
+else:
+    from pandas import DataFrame
+
+df = DataFrame(
     {
         "metric_1": [10.5, 20.3, 30.1, 40.2],
         "metric_2": [5.1, 15.6, None, 35.8],
@@ -31,10 +31,16 @@ import skrub.selectors as s
 # - Remember that the order of the operations matters! (hint: categorical encoders
 # convert the data to numeric). 
 #
-# Use the following dataframe to test the result.
+# Use the following dataframe to test the result. The exercises work with pandas
+# or polars dataframes: set `BACKEND` to `"polars"` to use polars.
 
 # %%
-import pandas as pd
+BACKEND = "pandas"
+
+if BACKEND == "polars":
+    from polars import DataFrame
+else:
+    from pandas import DataFrame
 
 data = {
     "int": [15, 56, 63, 12, 44],
@@ -50,7 +56,7 @@ data = {
     ]
     + [None],
 }
-df = pd.DataFrame(data)
+df = DataFrame(data)
 df
 
 # %% [markdown]
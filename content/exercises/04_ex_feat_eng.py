@@ -9,12 +9,20 @@
 #
 # **Hint**: use the format `"%d %B %Y"` for the datetime.
 #
+# The exercises work with pandas or polars dataframes: set `BACKEND` to
+# `"polars"` to use polars.
+#
 
 # %%
 %pip install skrub
 
 # %%
-import pandas as pd
+BACKEND = "pandas"
+
+if BACKEND == "polars":
+    from polars import DataFrame
+else:
+    from pandas import DataFrame
 
 data = {
     "admission_dates": [
@@ -27,7 +35,7 @@ data = {
     "age": [25, 34, 45, 52],
     "outcome": ["Recovered", "Under Treatment", "Recovered", "Deceased"],
 }
-df = pd.DataFrame(data)
+df = DataFrame(data)
 print(df)
 
 # %%
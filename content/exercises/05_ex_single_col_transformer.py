@@ -22,12 +22,38 @@
 #     }
 # )
 # ```
+# and, with polars:
+# ```python
+# split_data = X.str.split_exact("-", 2).struct
+# res = pl.DataFrame(
+#     {
+#         "str_id": split_data.field("field_0"),
+#         "num_id": split_data.field("field_1").cast(pl.Int64),
+#         "datetime": pl.from_epoch(
+#             split_data.field("field_2").cast(pl.Int64), time_unit="s"
+#         ),
+#     }
+# )
+# ```
+#
+# The exercises work with pandas or polars dataframes: set `BACKEND` to
+# `"polars"` to use polars.
 
 # %%
 from skrub.core import SingleColumnTransformer, RejectColumn
 import pandas as pd
 from skrub import ApplyToCols
-df_id = pd.DataFrame(
+
+BACKEND = "pandas"
+
+if BACKEND == "polars":
+    import polars as pl
+
+    DataFrame = pl.DataFrame
+else:
+    DataFrame = pd.DataFrame
+
+df_id = DataFrame(
     {
         "id": [
             "BQG-1001-1577836800",
@@ -49,12 +75,17 @@ df_id = pd.DataFrame(
 # %%
 # Solution
 class Unpacker(SingleColumnTransformer):
-    """Unpacker for pandas DataFrames."""
+    """Unpacker for pandas and polars DataFrames."""
 
     def fit_transform(self, X, y=None):
         """Unpack combined string column into separate columns."""
+        if isinstance(X, pd.Series):
+            return self._unpack_pandas(X)
+        return self._unpack_polars(X)
+
+    def _unpack_pandas(self, X):
         if X.dtype != object:
-            raise RejectColumn("UnpackerPandas only works on string columns.")
+            raise RejectColumn("Unpacker only works on string columns.")
         try:
             split_data = X.str.split("-", expand=True)
             res = pd.DataFrame(
@@ -66,7 +97,27 @@ class Unpacker(SingleColumnTransformer):
             )
             return res
         except Exception as exc:
-            raise RejectColumn("UnpackerPandas failed to unpack the column.") from exc
+            raise RejectColumn("Unpacker failed to unpack the column.") from exc
+
+    def _unpack_polars(self, X):
+        import polars as pl
+
+        if X.dtype != pl.String:
+            raise RejectColumn("Unpacker only works on string columns.")
+        try:
+            split_data = X.str.split_exact("-", 2).struct
+            res = pl.DataFrame(
+                {
+                    "str_id": split_data.field("field_0"),
+                    "num_id": split_data.field("field_1").cast(pl.Int64),
+                    "datetime": pl.from_epoch(
+                        split_data.field("field_2").cast(pl.Int64), time_unit="s"
+                    ),
+                }
+            )
+            return res
+        except Exception as exc:
+            raise RejectColumn("Unpacker failed to unpack the column.") from exc
 
 
 ApplyToCols(Unpacker(), allow_reject=True).fit_transform(df_id)
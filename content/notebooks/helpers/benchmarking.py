@@ -0,0 +1,132 @@
+"""
+Small utilities shared by the benchmark scripts in ``helpers``.
+
+They only rely on the standard library so that the benchmarks can run in the
+same environment as the exercises:
+- wall time and CPU time of a call
+- peak memory allocated during a call (tracked with ``tracemalloc``)
+- resident set size (RSS) of the current process
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Datasets shipped with the course (``book/data`` and ``content/data``).
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+
+
+def current_rss():
+    """Return the resident set size of the current process, in bytes.
+
+    On Linux the value is read from ``/proc/self/statm``. On other platforms,
+    the peak RSS reported by ``resource`` is returned instead, and ``None`` if
+    that is not available either (e.g. on Windows).
+    """
+    try:
+        with open("/proc/self/statm") as fp:
+            resident_pages = int(fp.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def current_pss():
+    """Return the proportional set size of the current process, in bytes.
+
+    Unlike the RSS, the PSS splits shared pages (e.g. a memory-mapped file
+    used by several processes) between the processes that map them. It is
+    only available on Linux; ``None`` is returned elsewhere.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as fp:
+            for line in fp:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def measure(func, *args, **kwargs):
+    """Call ``func(*args, **kwargs)`` and measure its cost.
+
+    Returns
+    -------
+    result : object
+        The value returned by ``func``.
+    stats : dict
+        ``wall_time`` and ``cpu_time`` in seconds, ``peak_memory`` in bytes
+        (the peak of the memory allocated during the call, as seen by
+        ``tracemalloc``) and ``rss_delta`` in bytes.
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start_memory, _ = tracemalloc.get_traced_memory()
+    start_rss = current_rss()
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        wall_time = time.perf_counter() - start_wall
+        cpu_time = time.process_time() - start_cpu
+        _, peak_memory = tracemalloc.get_traced_memory()
+        if not was_tracing:
+            tracemalloc.stop()
+    end_rss = current_rss()
+    stats = {
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "peak_memory": peak_memory - start_memory,
+        "rss_delta": None if start_rss is None else end_rss - start_rss,
+    }
+    return result, stats
+
+
+def format_bytes(n_bytes):
+    """Format a number of bytes in a human-readable way, e.g. ``"12.3 MB"``."""
+    if n_bytes is None:
+        return "n/a"
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(n_bytes) < 1024:
+            return f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} TB"
+
+
+def print_results(rows, columns=None):
+    """Print a list of result dictionaries as an aligned text table."""
+    if not rows:
+        return
+    columns = columns or list(rows[0])
+    cells = [[_format_cell(col, row.get(col)) for col in columns] for row in rows]
+    widths = [
+        max(len(col), *(len(line[i]) for line in cells))
+        for i, col in enumerate(columns)
+    ]
+    print("  ".join(col.ljust(w) for col, w in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.ljust(w) for cell, w in zip(line, widths)))
+
+
+def _format_cell(column, value):
+    if value is None:
+        return "n/a"
+    if column.endswith("_time") and isinstance(value, float):
+        return f"{value:.4f}s"
+    if column.endswith(("memory", "rss", "pss", "rss_delta", "size")):
+        return format_bytes(value)
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
@@ -0,0 +1,393 @@
+"""
+Evaluate the independent branches of a DataOps plan concurrently.
+
+skrub evaluates a plan one node after the other, so that in the credit fraud
+example the products are read and vectorized only once the baskets have been
+read and split, although both branches are independent until the ``merge``.
+This module provides:
+- ``evaluate_concurrently``: evaluate a plan (or a learner in a given mode)
+  on a pool of threads, running each node as soon as all its inputs are
+  computed, and record when and on which worker each node ran
+- ``concurrent_report``: a drop-in replacement for ``learner.report()`` that
+  evaluates the plan in the same way and adds a timeline of the workers to
+  the index page
+- ``main``: fit a plan whose two inputs are read from a slow storage, one
+  branch after the other and concurrently
+
+Each node is still computed by skrub's evaluator, with the results of its
+inputs already in the cache, so the results are the same as with
+``learner.fit()``. Threads only help when the nodes wait for I/O or release
+the GIL (as NumPy, scikit-learn and polars do for most of their work): a plan
+whose branches read remote files finishes in about the time of its slowest
+branch.
+
+In modes that do not use ``y`` (e.g. ``"predict"``), the node marked with
+``mark_as_y`` and the nodes that only it uses are skipped. All the outcomes of
+a choice are evaluated, not only the chosen one.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from unittest import mock
+
+import jinja2
+from skrub import TableReport
+from skrub._data_ops import _evaluation, _inspection
+from skrub._data_ops._data_ops import Apply
+from skrub._data_ops._estimator import SkrubLearner
+
+from .benchmarking import print_results
+
+__all__ = ["evaluate_concurrently", "concurrent_report"]
+
+_TIMELINE_BLOCK = """
+    {% if timeline %}
+    <h2>Timeline</h2>
+    <div class="timeline">
+        {% for worker, bars in timeline.workers.items() %}
+        <div class="timeline-row">
+            <span class="timeline-worker">{{ worker }}</span>
+            <div class="timeline-track">
+                {% for bar in bars %}
+                <a class="timeline-bar" href="node_{{ bar.node }}.html"
+                   style="left: {{ bar.left }}%; width: {{ bar.width }}%;"
+                   title="{{ bar.description }}: {{ '%.3f' % bar.start_time }}s to {{ '%.3f' % bar.end_time }}s">{{ bar.node }}</a>
+                {% endfor %}
+            </div>
+        </div>
+        {% endfor %}
+        <p>Total: {{ '%.3f' % timeline.total_time }}s on {{ timeline.workers | length }} worker(s)</p>
+    </div>
+    <style>
+     .timeline-row { display: flex; align-items: center; margin: 2px 0; }
+     .timeline-worker { width: 8em; font-family: monospace; }
+     .timeline-track { position: relative; flex: 1; height: 1.5em; background: #f4f4f4; }
+     .timeline-bar { position: absolute; height: 100%; min-width: 2px; overflow: hidden;
+                     background: #4c9be8; color: white; font-size: 0.8em;
+                     text-align: center; border-right: 1px solid white; }
+    </style>
+    {% endif %}
+"""
+
+
+class _NodeEvaluator(_evaluation._Evaluator):
+    """Evaluate a single node, whose inputs are already in the results cache.
+
+    When the whole plan is evaluated at once, an estimator can see whether an
+    ``Apply`` node is waiting for its output (in which case it transforms
+    instead of, e.g., predicting). Here the node is evaluated on its own, so
+    the answer is computed from the graph beforehand and given as
+    ``has_apply_consumer``.
+    """
+
+    def __init__(self, mode, environment, has_apply_consumer):
+        super().__init__(mode=mode, environment=environment)
+        self.has_apply_consumer = has_apply_consumer
+
+    def handle_data_op(self, data_op):
+        computation = super().handle_data_op(data_op)
+        value = None
+        try:
+            while True:
+                item = computation.send(value)
+                if isinstance(item, _evaluation.HasRunningApplyAncestor):
+                    value = self.has_apply_consumer
+                else:
+                    value = yield item
+        except StopIteration as e:
+            return e.value
+
+
+def _uses_y(mode):
+    return "fit" in mode or mode in ("score", "preview")
+
+
+def _needed_nodes(graph, root, mode):
+    """The nodes that must be computed to evaluate ``root`` in ``mode``."""
+    needed = set()
+    stack = [root]
+    while stack:
+        node_id = stack.pop()
+        if node_id in needed:
+            continue
+        impl = graph["nodes"][node_id]._skrub_impl
+        if impl.is_y and not _uses_y(mode) and node_id != root:
+            continue
+        needed.add(node_id)
+        stack.extend(graph["children"].get(node_id, ()))
+    return needed
+
+
+def _has_apply_consumer(graph, node_id):
+    """Whether an ``Apply`` node uses the output of ``node_id``, maybe indirectly."""
+    stack = list(graph["parents"].get(node_id, ()))
+    seen = set()
+    while stack:
+        consumer = stack.pop()
+        if consumer in seen:
+            continue
+        seen.add(consumer)
+        if isinstance(graph["nodes"][consumer]._skrub_impl, Apply):
+            return True
+        stack.extend(graph["parents"].get(consumer, ()))
+    return False
+
+
+def _evaluate(data_op, mode, environment, n_workers, on_result=None):
+    graph = _evaluation.graph(data_op)
+    nodes = graph["nodes"]
+    root = next(i for i, node in nodes.items() if node is data_op)
+    needed = _needed_nodes(graph, root, mode)
+    inputs = {i: set(graph["children"].get(i, ())) & needed for i in needed}
+    consumers = {i: set(graph["parents"].get(i, ())) & needed for i in needed}
+    n_waiting = {i: len(inputs[i]) for i in needed}
+    records = {}
+    start = time.perf_counter()
+
+    def run(node_id):
+        node = nodes[node_id]
+        node_start = time.perf_counter() - start
+        evaluator = _NodeEvaluator(
+            mode, environment, _has_apply_consumer(graph, node_id)
+        )
+        result = evaluator.run(node)
+        node_end = time.perf_counter() - start
+        if on_result is not None:
+            on_result(node_id, node, result)
+        records[node_id] = {
+            "node": node_id,
+            "description": _inspection._utils.simple_repr(node),
+            "worker": threading.current_thread().name,
+            "start_time": node_start,
+            "end_time": node_end,
+            "duration_time": node_end - node_start,
+        }
+        return node_id
+
+    with ThreadPoolExecutor(n_workers, thread_name_prefix="worker") as pool:
+        running = {pool.submit(run, i) for i in needed if not n_waiting[i]}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node_id = future.result()
+                for consumer in consumers[node_id]:
+                    n_waiting[consumer] -= 1
+                    if not n_waiting[consumer]:
+                        running.add(pool.submit(run, consumer))
+    result = data_op._skrub_impl.results[mode]
+    return result, [records[i] for i in sorted(records)]
+
+
+def _as_data_op(learner_or_data_op):
+    if isinstance(learner_or_data_op, SkrubLearner):
+        return learner_or_data_op.data_op
+    return learner_or_data_op
+
+
+def evaluate_concurrently(learner, environment, mode="fit", n_workers=4):
+    """Evaluate a plan, running the independent nodes on a pool of threads.
+
+    Parameters
+    ----------
+    learner : SkrubLearner or DataOp
+        The learner (``data_op.skb.make_learner()``) or the DataOp to evaluate.
+    environment : dict
+        The values of the variables, e.g. ``data_op.skb.get_data()``.
+    mode : str, default="fit"
+        The learner method to run, e.g. ``"fit"`` or ``"predict"``.
+    n_workers : int, default=4
+        The number of threads. With 1, the nodes run one after the other (in
+        a different order than skrub's evaluator).
+
+    Returns
+    -------
+    result : object
+        The result of the evaluation (the fitted learner for ``"fit"``).
+    records : list of dict
+        For each node: ``node`` (its number in the report), ``description``,
+        ``worker`` (the name of the thread that ran it), ``start_time`` and
+        ``end_time`` (in seconds since the evaluation started) and
+        ``duration_time``.
+    """
+    data_op = _as_data_op(learner)
+    _evaluation.clear_results(data_op, mode)
+    try:
+        result, records = _evaluate(data_op, mode, environment, n_workers)
+    finally:
+        _evaluation.clear_results(data_op, mode)
+    if isinstance(learner, SkrubLearner):
+        learner._set_is_fitted(mode)
+        if mode == "fit":
+            result = learner
+    return result, records
+
+
+def _timeline(records):
+    """The bars of the timeline, grouped by worker, in % of the total time."""
+    total_time = max((r["end_time"] for r in records), default=0.0) or 1.0
+    workers = {}
+    for record in sorted(records, key=lambda r: (r["worker"], r["start_time"])):
+        workers.setdefault(record["worker"], []).append(
+            {
+                **record,
+                "left": 100 * record["start_time"] / total_time,
+                "width": 100 * record["duration_time"] / total_time,
+            }
+        )
+    return {"workers": workers, "total_time": total_time}
+
+
+def _index_page_env(timeline):
+    env = _inspection._get_jinja_env()
+    source = env.loader.get_source(env, "index.html")[0]
+    source = source.replace("</body>", _TIMELINE_BLOCK + "</body>", 1)
+    env.loader = jinja2.ChoiceLoader(
+        [jinja2.DictLoader({"index.html": source}), env.loader]
+    )
+    env.globals["timeline"] = timeline
+    return env
+
+
+def concurrent_report(learner, environment, mode="fit", n_workers=4, **report_kwargs):
+    """Generate the full report of a plan evaluated with ``evaluate_concurrently``.
+
+    The index page shows, below the graph, when each node ran and on which
+    worker; each bar links to the page of its node.
+
+    Parameters
+    ----------
+    learner : SkrubLearner or DataOp
+        The learner or DataOp to evaluate.
+    environment : dict
+        The values of the variables.
+    mode : str, default="fit"
+        The learner method to run.
+    n_workers : int, default=4
+        The number of threads.
+    **report_kwargs
+        ``output_dir``, ``overwrite``, ``open`` and ``title``, as for
+        ``learner.report()``.
+
+    Returns
+    -------
+    dict
+        As ``learner.report()``: ``result``, ``error`` and ``report_path``,
+        plus ``timeline``, the records described in ``evaluate_concurrently``.
+    """
+    data_op = _as_data_op(learner)
+    snippets = {}
+    lock = threading.Lock()
+
+    def render(node_id, node, result):
+        report = _inspection.node_report(node, mode=mode, environment=environment)
+        if isinstance(report, TableReport):
+            report = report.html_snippet()
+        with lock:
+            snippets[node_id] = report
+
+    _evaluation.clear_results(data_op, mode)
+    try:
+        try:
+            result, records = _evaluate(
+                data_op, mode, environment, n_workers, on_result=render
+            )
+            error = None
+        except Exception as e:
+            result, records, error = None, [], e
+        jinja_env = _index_page_env(_timeline(records))
+        node_ids = {
+            id(node): i for i, node in _evaluation.graph(data_op)["nodes"].items()
+        }
+
+        def node_report(node, **kwargs):
+            return snippets[node_ids[id(node)]]
+
+        def evaluate(*args, **kwargs):
+            if error is not None:
+                raise error
+            return result
+
+        with (
+            mock.patch.object(_inspection, "evaluate", evaluate),
+            mock.patch.object(_inspection, "node_report", node_report),
+            mock.patch.object(_inspection, "_get_jinja_env", lambda: jinja_env),
+        ):
+            output = _inspection._make_report(
+                data_op, environment=environment, mode=mode, **report_kwargs
+            )
+    finally:
+        _evaluation.clear_results(data_op, mode)
+    if isinstance(learner, SkrubLearner) and output["result"] is not None:
+        learner._set_is_fitted(mode)
+        if mode == "fit":
+            output["result"] = learner
+    output["timeline"] = records
+    return output
+
+
+def _read_slowly(path, latency):
+    """Read a Parquet file as if it came from a storage with ``latency`` seconds."""
+    import pandas as pd
+
+    time.sleep(latency)
+    return pd.read_parquet(path)
+
+
+def main():
+    """Fit a plan whose inputs are slow to read, sequentially and concurrently."""
+    import tempfile
+
+    import skrub
+    from sklearn.ensemble import ExtraTreesClassifier
+
+    from .credit_fraud import credit_fraud_plan, generate_credit_fraud
+
+    latency = 2.0
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data = generate_credit_fraud(tmp, n_baskets=20_000)
+        baskets = skrub.var("baskets_path", data.baskets_path).skb.apply_func(
+            _read_slowly, latency
+        )
+        products = skrub.var("products_path", data.products_path).skb.apply_func(
+            _read_slowly, latency
+        )
+        predictions = credit_fraud_plan(
+            baskets, products, ExtraTreesClassifier(n_estimators=20)
+        )
+        environment = predictions.skb.get_data()
+        learner = predictions.skb.make_learner()
+
+        start = time.perf_counter()
+        learner.fit(environment)
+        rows.append(
+            {"evaluation": "learner.fit", "fit_time": time.perf_counter() - start}
+        )
+        for n_workers in [1, 2, 4]:
+            start = time.perf_counter()
+            _, records = evaluate_concurrently(
+                learner, environment, "fit", n_workers=n_workers
+            )
+            rows.append(
+                {
+                    "evaluation": f"concurrent, {n_workers} worker(s)",
+                    "fit_time": time.perf_counter() - start,
+                }
+            )
+    print(f"Fitting the credit fraud plan, reading each input takes {latency}s")
+    print_results(rows)
+    print("\nTimeline with 4 workers")
+    print_results(
+        [
+            {
+                k: r[k]
+                for k in ["node", "description", "worker", "start_time", "end_time"]
+            }
+            for r in records
+        ]
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Measure the memory used by each node of a DataOps plan, and release the
+intermediate results as early as possible.
+
+When the full report of a DataOps plan is generated, skrub evaluates the whole
+plan first and keeps the result of every node until the report is written, so
+that the peak memory is the sum of all the intermediate results. This module
+provides:
+- ``profile_dataop_memory``: evaluate a plan (or a learner in a given mode,
+  e.g. ``"fit"`` or ``"predict"``) and record, for each node, the time it
+  took, the size of its output, the peak memory while it ran and the memory
+  still held once it finished
+- ``memory_report``: a drop-in replacement for ``learner.report()`` that
+  renders the page of each node as soon as it has been computed, and adds the
+  memory measurements next to the computation time
+
+With ``release=True`` (the default), the result of a node is freed as soon as
+all the nodes that consume it have run: each node holds a count of its
+consumers, decremented when one of them finishes (the same reference counting
+that skrub uses when a learner is fitted).
+
+Memory is measured with ``tracemalloc``, which sees the allocations made by
+Python, NumPy and pandas but not by every compiled library (e.g. polars).
+"""
+
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+import jinja2
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from skrub import TableReport
+from skrub import _dataframe as sbd
+from skrub._data_ops import _evaluation, _inspection
+from skrub._data_ops._estimator import SkrubLearner
+
+from .benchmarking import format_bytes, print_results
+
+__all__ = ["profile_dataop_memory", "memory_report", "nbytes"]
+
+_MEMORY_BLOCK = """
+                {% set memory = node_memory.get(node_nb) %}
+                {% if memory %}
+                <div>
+                    <h3>Memory</h3>
+                    <p>
+                        Output size: <code>{{ memory.output_size }}</code><br>
+                        Peak memory while computing: <code>{{ memory.peak_memory }}</code><br>
+                        Memory held after this step: <code>{{ memory.live_memory }}</code>
+                    </p>
+                </div>
+                {% endif %}
+"""
+
+
+def nbytes(value):
+    """Estimate the memory used by a value (dataframe, column, array...)."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if sbd.is_dataframe(value) else usage)
+    if sbd.is_dataframe(value) or sbd.is_column(value):
+        # polars
+        return int(value.estimated_size())
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if sparse.issparse(value):
+        value = value.tocsr()
+        return int(value.data.nbytes + value.indices.nbytes + value.indptr.nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(nbytes(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class _MemoryTracker:
+    """Evaluator callback that records the memory of each node and releases results.
+
+    The evaluator calls it once per node, right after the node's result has
+    been computed, so the window since the previous call covers the
+    computation of that node only.
+    """
+
+    def __init__(self, data_op, mode, release, on_result=None):
+        self.mode = mode
+        self.release = release
+        self.on_result = on_result
+        self.graph = _evaluation.graph(data_op)
+        self.node_ids = {id(node): i for i, node in self.graph["nodes"].items()}
+        self.n_consumers = {
+            i: len(parents) for i, parents in self.graph["parents"].items()
+        }
+        self.records = {}
+
+    def start(self):
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        tracemalloc.reset_peak()
+
+    def __call__(self, data_op, result, duration, env_key, **kwargs):
+        node_id = self.node_ids[id(data_op)]
+        peak = tracemalloc.get_traced_memory()[1]
+        if self.on_result is not None:
+            self.on_result(node_id, data_op, result)
+        if self.release:
+            for child in self.graph["children"].get(node_id, ()):
+                self.n_consumers[child] -= 1
+                if self.n_consumers[child] == 0:
+                    self.graph["nodes"][child]._skrub_impl.results.pop(self.mode, None)
+        self.records[node_id] = {
+            "node": node_id,
+            "description": _inspection._utils.simple_repr(data_op),
+            "duration_time": duration,
+            "output_size": nbytes(result),
+            "peak_memory": peak - self.baseline,
+            "live_memory": tracemalloc.get_traced_memory()[0] - self.baseline,
+        }
+        # the peak of the next node starts from the memory held now
+        tracemalloc.reset_peak()
+
+    def to_list(self):
+        return [self.records[i] for i in sorted(self.records)]
+
+
+def _evaluate(data_op, mode, environment, tracker):
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    _evaluation.clear_results(data_op, mode)
+    try:
+        tracker.start()
+        evaluator = _evaluation._Evaluator(
+            mode=mode, environment=environment, callbacks=(tracker,)
+        )
+        return evaluator.run(data_op)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def _as_data_op(learner_or_data_op):
+    if isinstance(learner_or_data_op, SkrubLearner):
+        return learner_or_data_op.data_op
+    return learner_or_data_op
+
+
+def profile_dataop_memory(learner, environment, mode="fit", release=True):
+    """Evaluate a plan and record the time and memory of each node.
+
+    Parameters
+    ----------
+    learner : SkrubLearner or DataOp
+        The learner (``data_op.skb.make_learner()``) or the DataOp to evaluate.
+    environment : dict
+        The values of the variables, e.g. ``data_op.skb.get_data()``.
+    mode : str, default="fit"
+        The learner method to run, e.g. ``"fit"`` or ``"predict"``.
+    release : bool, default=True
+        Whether to free the result of a node once all its consumers have run.
+
+    Returns
+    -------
+    result : object
+        The result of the evaluation (the fitted learner for ``"fit"``).
+    records : list of dict
+        For each node: ``node`` (its number in the report), ``description``,
+        ``duration_time``, ``output_size``, ``peak_memory`` and
+        ``live_memory`` (in bytes, relative to the memory held before the
+        evaluation started).
+    """
+    data_op = _as_data_op(learner)
+    tracker = _MemoryTracker(data_op, mode, release)
+    try:
+        result = _evaluate(data_op, mode, environment, tracker)
+    finally:
+        _evaluation.clear_results(data_op, mode)
+    if isinstance(learner, SkrubLearner):
+        learner._set_is_fitted(mode)
+        if mode == "fit":
+            result = learner
+    return result, tracker.to_list()
+
+
+def _node_page_env(node_memory):
+    env = _inspection._get_jinja_env()
+    source = env.loader.get_source(env, "node.html")[0]
+    anchor = "{% if env_key is none %}"
+    source = source.replace(anchor, _MEMORY_BLOCK + anchor, 1)
+    env.loader = jinja2.ChoiceLoader(
+        [jinja2.DictLoader({"node.html": source}), env.loader]
+    )
+    env.globals["node_memory"] = node_memory
+    return env
+
+
+def memory_report(
+    learner,
+    environment,
+    mode="fit",
+    release=True,
+    **report_kwargs,
+):
+    """Generate the full report of a plan, with the memory used by each node.
+
+    Unlike ``learner.report()``, the page of each node is rendered as soon as
+    the node has been computed, so that (with ``release=True``) the
+    intermediate results do not need to be kept until the end.
+
+    Parameters
+    ----------
+    learner : SkrubLearner or DataOp
+        The learner or DataOp to evaluate.
+    environment : dict
+        The values of the variables.
+    mode : str, default="fit"
+        The learner method to run.
+    release : bool, default=True
+        Whether to free the result of a node once all its consumers have run.
+    **report_kwargs
+        ``output_dir``, ``overwrite``, ``open`` and ``title``, as for
+        ``learner.report()``.
+
+    Returns
+    -------
+    dict
+        As ``learner.report()``: ``result``, ``error`` and ``report_path``,
+        plus ``memory``, the records described in ``profile_dataop_memory``.
+    """
+    data_op = _as_data_op(learner)
+    snippets = {}
+
+    def render(node_id, node, result):
+        report = _inspection.node_report(node, mode=mode, environment=environment)
+        if isinstance(report, TableReport):
+            report = report.html_snippet()
+        snippets[node_id] = report
+
+    tracker = _MemoryTracker(data_op, mode, release, on_result=render)
+    try:
+        try:
+            result, error = _evaluate(data_op, mode, environment, tracker), None
+        except Exception as e:
+            result, error = None, e
+        node_memory = {
+            node_id: {
+                key: format_bytes(record[key])
+                for key in ["output_size", "peak_memory", "live_memory"]
+            }
+            for node_id, record in tracker.records.items()
+        }
+        # the released results are replaced by a marker so that the nodes are
+        # shown as computed; their pages use the snippets rendered above
+        for node_id in snippets:
+            impl = tracker.graph["nodes"][node_id]._skrub_impl
+            impl.results.setdefault(mode, None)
+
+        jinja_env = _node_page_env(node_memory)
+
+        def node_report(node, **kwargs):
+            return snippets[tracker.node_ids[id(node)]]
+
+        def evaluate(*args, **kwargs):
+            if error is not None:
+                raise error
+            return result
+
+        with (
+            mock.patch.object(_inspection, "evaluate", evaluate),
+            mock.patch.object(_inspection, "node_report", node_report),
+            mock.patch.object(_inspection, "_get_jinja_env", lambda: jinja_env),
+        ):
+            output = _inspection._make_report(
+                data_op, environment=environment, mode=mode, **report_kwargs
+            )
+    finally:
+        _evaluation.clear_results(data_op, mode)
+    if isinstance(learner, SkrubLearner) and output["result"] is not None:
+        learner._set_is_fitted(mode)
+        if mode == "fit":
+            output["result"] = learner
+    output["memory"] = tracker.to_list()
+    return output
+
+
+def _example_plan(n_baskets=10_000, products_per_basket=5, seed=0):
+    """A plan with the structure of the credit fraud example, on random data."""
+    import skrub
+    from sklearn.ensemble import ExtraTreesClassifier
+    from skrub import selectors as s
+
+    rng = np.random.default_rng(seed)
+    n_products = n_baskets * products_per_basket
+    baskets = pd.DataFrame(
+        {"ID": np.arange(n_baskets), "fraud_flag": rng.integers(2, size=n_baskets)}
+    )
+    products = pd.DataFrame(
+        {
+            "basket_ID": rng.permutation(np.arange(n_products) % n_baskets),
+            "item": rng.choice([f"item {i}" for i in range(2000)], size=n_products),
+            "make": rng.choice([f"make {i}" for i in range(50)], size=n_products),
+            "cash_price": rng.gamma(2.0, 200.0, size=n_products).round(),
+            "Nbr_of_prod_purchas": rng.integers(1, 4, size=n_products),
+        }
+    )
+    baskets_var = skrub.var("baskets", baskets)
+    products_var = skrub.var("products", products)
+    X = baskets_var[["ID"]].skb.mark_as_X()
+    y = baskets_var["fraud_flag"].skb.mark_as_y()
+    vectorizer = skrub.TableVectorizer(high_cardinality=skrub.StringEncoder())
+    vectorized_products = products_var.skb.apply(vectorizer, cols=s.all() - "basket_ID")
+    aggregated_products = (
+        vectorized_products.groupby("basket_ID").agg("mean").reset_index()
+    )
+    features = X.merge(aggregated_products, left_on="ID", right_on="basket_ID")
+    features = features.drop(columns=["ID", "basket_ID"])
+    return features.skb.apply(ExtraTreesClassifier(n_estimators=20), y=y)
+
+
+def main():
+    """Compare the memory of fitting a plan with and without early release."""
+    predictions = _example_plan()
+    environment = predictions.skb.get_data()
+    learner = predictions.skb.make_learner()
+    for release in [False, True]:
+        _, records = profile_dataop_memory(learner, environment, "fit", release)
+        print(f"\nfit, release={release}")
+        print_results(records)
+        print(f"overall peak: {format_bytes(max(r['peak_memory'] for r in records))}")
+
+
+if __name__ == "__main__":
+    main()
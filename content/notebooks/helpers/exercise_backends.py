@@ -0,0 +1,321 @@
+"""
+Run the pipelines of the exercises with pandas and with polars, side by side.
+
+The exercises in ``content/exercises`` start with a ``BACKEND`` switch that
+loads the data as a pandas or a polars dataframe; the skrub transformers work
+with both. This module provides:
+- ``read_csv``: read a CSV file with the chosen backend
+- ``Unpacker``: the ``SingleColumnTransformer`` of the last exercise, for
+  pandas and polars columns
+- ``EXERCISES``: for each exercise, a function that makes its data with a given
+  number of rows and a function that builds the pipeline of its solution
+- ``compare_backends``: write the data of each exercise to a CSV file, then, for
+  each backend, read it and fit the pipeline in a fresh process, recording the
+  time and the peak memory of the process
+- ``main``: compare the backends at 10k, 100k and 1M rows
+
+The memory is the peak resident set size of the process above its value before
+reading the data: ``tracemalloc`` does not see the memory allocated by polars.
+"""
+
+import concurrent.futures
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import polars as pl
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
+from skrub import (
+    ApplyToCols,
+    Cleaner,
+    DatetimeEncoder,
+    StringEncoder,
+    ToDatetime,
+)
+from skrub import _dataframe as sbd
+from skrub import selectors as s
+from skrub.core import RejectColumn, SingleColumnTransformer
+
+from .benchmarking import current_rss, print_results
+from .dtype_policy import CLEANER_DATA_SETTINGS
+from .generate_synthetic_data import generate_synthetic_dataframe
+from .shared_cv import _TreeMemorySampler
+
+__all__ = ["BACKENDS", "read_csv", "Unpacker", "EXERCISES", "compare_backends"]
+
+BACKENDS = ("pandas", "polars")
+
+
+def read_csv(path, backend="pandas"):
+    """Read a CSV file as a pandas or a polars dataframe."""
+    if backend == "polars":
+        return pl.read_csv(path)
+    return pd.read_csv(path)
+
+
+class Unpacker(SingleColumnTransformer):
+    """Split ``STR-NUM-TIMESTAMP`` strings into 3 columns (pandas or polars)."""
+
+    def fit_transform(self, X, y=None):
+        if not sbd.is_string(X):
+            raise RejectColumn(f"Column {sbd.name(X)!r} does not contain strings.")
+        try:
+            if sbd.is_pandas(X):
+                parts = X.str.split("-", expand=True)
+                return pd.DataFrame(
+                    {
+                        "str_id": parts[0],
+                        "num_id": parts[1].astype("int64"),
+                        "datetime": pd.to_datetime(parts[2].astype("int64"), unit="s"),
+                    }
+                )
+            parts = X.str.split_exact("-", 2).struct
+            return pl.DataFrame(
+                {
+                    "str_id": parts.field("field_0"),
+                    "num_id": parts.field("field_1").cast(pl.Int64),
+                    "datetime": pl.from_epoch(
+                        parts.field("field_2").cast(pl.Int64), time_unit="s"
+                    ),
+                }
+            )
+        except Exception as exc:
+            raise RejectColumn(f"Could not unpack column {sbd.name(X)!r}.") from exc
+
+    def transform(self, X):
+        return self.fit_transform(X)
+
+
+def _tile(data, n_rows):
+    """Repeat the rows of a small example dataframe up to ``n_rows`` rows."""
+    df = pd.DataFrame(data)
+    return df.iloc[np.resize(np.arange(len(df)), n_rows)].reset_index(drop=True)
+
+
+def _cleaner_data(n_rows):
+    return generate_synthetic_dataframe(
+        n_rows, seed=0, **CLEANER_DATA_SETTINGS
+    ).to_pandas()
+
+
+def _apply_to_cols_data(n_rows):
+    data = {
+        "metric_1": [10.5, 20.3, 30.1, 40.2],
+        "metric_2": [5.1, 15.6, None, 35.8],
+        "metric_3": [1.1, 3.3, 2.6, 0.8],
+        "num_id": [101, 102, 103, 104],
+        "str_id": ["A101", "A102", "A103", "A104"],
+        "description": ["apple", None, "cherry", "date"],
+        "name": ["Alice", "Bob", "Charlie", "David"],
+    }
+    return _tile(data, n_rows)
+
+
+def _table_vectorizer_data(n_rows):
+    data = {
+        "int": [15, 56, 63, 12, 44],
+        "float": [5.2, 2.4, 6.2, 10.45, 9.0],
+        "str1": ["public", "private", "private", "private", "public"],
+        "str2": ["officer", "manager", "lawyer", "chef", "teacher"],
+        "bool": [True, False, True, False, True],
+        "datetime-col": [
+            "2020-02-03T12:30:05",
+            "2021-03-15T00:37:15",
+            "2022-02-13T17:03:25",
+            "2023-05-22T08:45:55",
+            None,
+        ],
+    }
+    return _tile(data, n_rows)
+
+
+def _datetime_data(n_rows):
+    data = {
+        "admission_dates": [
+            "03 January 2023",
+            "15 February 2023",
+            "27 March 2023",
+            "10 April 2023",
+        ],
+        "patient_ids": [101, 102, 103, 104],
+        "age": [25, 34, 45, 52],
+        "outcome": ["Recovered", "Under Treatment", "Recovered", "Deceased"],
+    }
+    return _tile(data, n_rows)
+
+
+def _unpacker_data(n_rows):
+    rng = np.random.default_rng(0)
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    prefixes = ["".join(p) for p in rng.choice(letters, size=(n_rows, 3))]
+    timestamps = 1_577_836_800 + rng.integers(0, 5 * 365, size=n_rows) * 86_400
+    ids = [
+        f"{prefix}-{1000 + i}-{timestamp}"
+        for i, (prefix, timestamp) in enumerate(zip(prefixes, timestamps))
+    ]
+    return pd.DataFrame({"id": ids})
+
+
+def _cleaner_pipeline():
+    return Cleaner(
+        drop_if_constant=True,
+        drop_null_fraction=0.5,
+        cast_to_float32=True,
+        datetime_format="%d-%b-%Y",
+    )
+
+
+def _apply_to_cols_pipeline():
+    return make_pipeline(
+        ApplyToCols(StandardScaler(), cols=s.numeric() - "num_id"),
+        ApplyToCols(OrdinalEncoder(), cols=s.string() - "str_id"),
+    )
+
+
+def _table_vectorizer_pipeline():
+    return make_pipeline(
+        ApplyToCols(Cleaner(cast_to_str=True, cast_to_float32=True)),
+        ApplyToCols(
+            StringEncoder(n_components=2), cols=~s.cardinality_below(4) & s.string()
+        ),
+        ApplyToCols(
+            OneHotEncoder(sparse_output=False, drop="if_binary"),
+            cols=s.cardinality_below(4) & s.string(),
+        ),
+        ApplyToCols(DatetimeEncoder(), cols=s.any_date()),
+    )
+
+
+def _datetime_pipeline():
+    return make_pipeline(
+        ApplyToCols(ToDatetime(format="%d %B %Y"), cols="admission_dates"),
+        ApplyToCols(
+            DatetimeEncoder(
+                periodic_encoding="circular",
+                add_total_seconds=True,
+                add_weekday=True,
+                add_day_of_year=True,
+            ),
+            cols=s.any_date(),
+        ),
+    )
+
+
+def _unpacker_pipeline():
+    return make_pipeline(
+        ApplyToCols(Unpacker(), allow_reject=True),
+        ApplyToCols(DatetimeEncoder(), allow_reject=True),
+    )
+
+
+# exercise name -> (make the data as a pandas dataframe, make the pipeline)
+EXERCISES = {
+    "01_ex_explore_clean": (_cleaner_data, _cleaner_pipeline),
+    "02_ex_apply_to_cols": (_apply_to_cols_data, _apply_to_cols_pipeline),
+    "03_ex_table_vec": (_table_vectorizer_data, _table_vectorizer_pipeline),
+    "04_ex_feat_eng": (_datetime_data, _datetime_pipeline),
+    "05_ex_single_col_transformer": (_unpacker_data, _unpacker_pipeline),
+}
+
+
+def _run(exercise, backend, path):
+    """Read the CSV file and fit the pipeline; run in a fresh process."""
+    baseline = current_rss()
+    with _TreeMemorySampler(interval=0.01) as sampler:
+        start = time.perf_counter()
+        df = read_csv(path, backend)
+        read_time = time.perf_counter() - start
+        start = time.perf_counter()
+        output = EXERCISES[exercise][1]().fit_transform(df)
+        fit_time = time.perf_counter() - start
+    peak = max(sampler.peak_rss or 0, current_rss())
+    return {
+        "read_time": read_time,
+        "fit_time": fit_time,
+        "peak_rss": peak - baseline,
+        "output": sbd.to_pandas(output) if sbd.is_polars(output) else output,
+    }
+
+
+def _differing_columns(first, second):
+    """The columns whose values differ between the outputs of both backends.
+
+    The dtypes and the order of the columns are ignored; the columns that are
+    in only one of the outputs are included.
+    """
+    differing = sorted(set(first.columns) ^ set(second.columns))
+    for name in [col for col in first.columns if col in second.columns]:
+        a, b = first[name], second[name]
+        if not a.isna().equals(b.isna()):
+            differing.append(name)
+            continue
+        a, b = a[a.notna()], b[b.notna()]
+        if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+            same = np.allclose(a.astype("float64"), b.astype("float64"), rtol=1e-3)
+        else:
+            same = (a.astype(str).to_numpy() == b.astype(str).to_numpy()).all()
+        if not same:
+            differing.append(name)
+    return differing
+
+
+def compare_backends(exercises=None, scales=(10_000, 100_000, 1_000_000)):
+    """Time and measure the memory of each exercise with pandas and polars.
+
+    Parameters
+    ----------
+    exercises : list of str, optional
+        Keys of ``EXERCISES``; defaults to all of them.
+    scales : tuple of int
+        The numbers of rows of the data.
+
+    Returns
+    -------
+    list of dict
+        One row per exercise and scale, with the read time, the fit time and
+        the peak RSS for each backend, the ratio of the total times (above 1
+        when polars is faster) and the output columns that differ between the
+        backends (e.g. polars keeps nulls as a category of the
+        ``OrdinalEncoder``, and writes booleans as ``"true"``).
+    """
+    exercises = list(EXERCISES) if exercises is None else exercises
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for exercise in exercises:
+            for n_rows in scales:
+                path = Path(tmp) / f"{exercise}.csv"
+                EXERCISES[exercise][0](n_rows).to_csv(path, index=False)
+                row = {"exercise": exercise, "n_rows": n_rows}
+                outputs = {}
+                for backend in BACKENDS:
+                    # a new process for each run, so that the peak RSS of one
+                    # run does not hide that of the next
+                    with concurrent.futures.ProcessPoolExecutor(
+                        1, mp_context=context
+                    ) as executor:
+                        result = executor.submit(_run, exercise, backend, path).result()
+                    outputs[backend] = result.pop("output")
+                    for key, value in result.items():
+                        row[f"{backend}_{key}"] = value
+                row["polars_speedup"] = (
+                    row["pandas_read_time"] + row["pandas_fit_time"]
+                ) / (row["polars_read_time"] + row["polars_fit_time"])
+                row["differing_columns"] = (
+                    ", ".join(_differing_columns(*outputs.values())) or "none"
+                )
+                rows.append(row)
+    return rows
+
+
+def main():
+    """Compare the backends on all the exercises, at 10k, 100k and 1M rows."""
+    print_results(compare_backends())
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,19 @@ This script allows you to create a Polars DataFrame with:
 - Columns with single constant values
 - Datetime columns with custom formats
 - Add missing values to existing columns
+- High-cardinality string columns with a long-tailed (Zipf or power-law)
+  distribution over a large vocabulary, with typos
+- Random access: with ``random_access=True``, each value is computed from a
+  counter-based generator (Philox) keyed on the seed, the column and the row,
+  so that any range of rows can be generated on its own (``generate_rows``)
 """
 
+import hashlib
+
+import numpy as np
 import polars as pl
 import random
+import time
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
 
@@ -65,6 +74,27 @@ PRODUCTS = [
     "Hard Drive", "SSD", "RAM", "Graphics Card", "Motherboard", "CPU"
 ]
 
+# Parts of the job titles of the high-cardinality columns
+TITLE_PREFIXES = [
+    "", "Senior ", "Junior ", "Assistant ", "Deputy ", "Chief ", "Acting ",
+    "Lead ", "Associate ", "Principal ", "Regional ", "Temporary "
+]
+
+TITLE_CORES = [
+    "Police Officer", "Bus Operator", "Firefighter/Rescuer", "Librarian",
+    "Accountant", "Nurse", "Civil Engineer", "Program Manager",
+    "Office Services Coordinator", "Correctional Officer", "Social Worker",
+    "Crossing Guard", "Recreation Specialist", "Fiscal Assistant",
+    "Building Inspector", "Therapist", "Planner", "Mechanic Technician",
+    "Investigator", "Communications Specialist", "Liquor Store Clerk",
+    "Legislative Aide", "Paralegal", "IT Specialist", "Equipment Operator"
+]
+
+TITLE_SUFFIXES = [
+    "", " I", " II", " III", " IV", " Trainee", " Supervisor", " Manager",
+    " (Part-Time)", " - Night Shift"
+]
+
 
 def generate_synthetic_dataframe(
     n_rows: int,
@@ -78,7 +108,14 @@ def generate_synthetic_dataframe(
     n_datetime_columns: int = 0,
     datetime_format: str = "%Y-%m-%d",
     columns_with_nulls: Optional[Dict[str, float]] = None,
-    seed: Optional[int] = None
+    n_high_cardinality: int = 0,
+    vocabulary_size: int = 100_000,
+    cardinality_distribution: str = "zipf",
+    cardinality_exponent: float = 1.1,
+    typo_fraction: float = 0.02,
+    seed: Optional[int] = None,
+    random_access: bool = False,
+    row_offset: int = 0
 ) -> pl.DataFrame:
     """
     Generate a synthetic Polars DataFrame with numeric and categorical features.
@@ -109,8 +146,37 @@ def generate_synthetic_dataframe(
         Dictionary mapping existing column names to null fractions.
         For example: {"first_name": 0.1, "city": 0.2}
         This adds missing values to existing columns after generation.
+    n_high_cardinality : int, default=0
+        Number of high-cardinality string columns (job titles such as
+        "Senior Bus Operator II") to generate
+    vocabulary_size : int, default=100_000
+        Number of distinct titles each high-cardinality column draws from,
+        before typos
+    cardinality_distribution : {"zipf", "power_law"}, default="zipf"
+        How the titles are drawn. With "zipf", the k-th most frequent title
+        has a probability proportional to 1 / k ** cardinality_exponent.
+        "power_law" draws the ranks from a continuous power law with the same
+        exponent: it is a close approximation that does not need a table of
+        vocabulary_size probabilities, for vocabularies of tens of millions
+        of titles
+    cardinality_exponent : float, default=1.1
+        Exponent of the distribution; larger values concentrate the rows on
+        fewer titles
+    typo_fraction : float, default=0.02
+        Fraction of the rows of the high-cardinality columns in which a
+        character is dropped, doubled or swapped with the next one
     seed : int, optional
         Random seed for reproducibility
+    random_access : bool, default=False
+        If True, the values are computed from a counter-based random generator
+        keyed on (seed, column name, row number) instead of drawn one after
+        the other from the global ``random`` state. Any range of rows can
+        then be generated independently, and is identical to the same rows
+        of a larger table. It is also much faster, but gives different values
+        than ``random_access=False`` for the same seed (and a seed of None
+        means 0).
+    row_offset : int, default=0
+        With ``random_access=True``, the number of the first row to generate
         
     Returns
     -------
@@ -135,7 +201,36 @@ def generate_synthetic_dataframe(
     ...     columns_with_nulls={"first_name": 0.1, "city": 0.15},
     ...     seed=42
     ... )
+    >>>
+    >>> # Long-tailed job titles, e.g. to stress high-cardinality encoders
+    >>> df = generate_synthetic_dataframe(
+    ...     n_rows=1_000_000,
+    ...     n_numeric=0,
+    ...     n_categorical=0,
+    ...     n_high_cardinality=1,
+    ...     vocabulary_size=1_000_000,
+    ... )
+    >>>
+    >>> # Rows 9,000,000 to 9,000,999 of a table, without the rows before them
+    >>> df = generate_synthetic_dataframe(
+    ...     n_rows=1000, row_offset=9_000_000, random_access=True, seed=0
+    ... )
     """
+    if cardinality_distribution not in ("zipf", "power_law"):
+        raise ValueError(
+            "cardinality_distribution should be 'zipf' or 'power_law', got "
+            f"{cardinality_distribution!r}"
+        )
+    if random_access:
+        return _generate_random_access(
+            n_rows, n_numeric, n_categorical, n_null_columns, null_fraction,
+            n_constant_columns, constant_column_name, constant_value,
+            n_datetime_columns, datetime_format, columns_with_nulls,
+            n_high_cardinality, vocabulary_size, cardinality_distribution,
+            cardinality_exponent, typo_fraction, seed or 0, row_offset
+        )
+    if row_offset:
+        raise ValueError("row_offset requires random_access=True")
     if seed is not None:
         random.seed(seed)
     
@@ -156,25 +251,7 @@ def generate_synthetic_dataframe(
             data[col_name] = [random.gauss(50, 15) for _ in range(n_rows)]
     
     # Generate categorical columns
-    categorical_sources = [
-        ("first_name", FIRST_NAMES),
-        ("last_name", LAST_NAMES),
-        ("city", CITIES),
-        ("country", COUNTRIES),
-        ("department", DEPARTMENTS),
-        ("product", PRODUCTS),
-    ]
-    
-    for i in range(n_categorical):
-        if i < len(categorical_sources):
-            col_name, source_list = categorical_sources[i]
-            col_name = f"{col_name}"
-        else:
-            # Use a cycling pattern for additional categorical columns
-            source_idx = i % len(categorical_sources)
-            col_name, source_list = categorical_sources[source_idx]
-            col_name = f"{col_name}_{i+1}"
-        
+    for col_name, source_list in _categorical_columns(n_categorical):
         data[col_name] = [random.choice(source_list) for _ in range(n_rows)]
     
     # Generate columns with null values
@@ -205,6 +282,23 @@ def generate_synthetic_dataframe(
             dates.append(date.strftime(datetime_format))
         data[col_name] = dates
     
+    # Generate high-cardinality columns (vectorized with numpy and polars)
+    rng = np.random.default_rng(seed)
+    for i in range(n_high_cardinality):
+        col_name = f"high_cardinality_{i+1}"
+        vocabulary = _synthesize_titles(vocabulary_size, rng)
+        ranks = _sample_ranks(
+            n_rows, vocabulary_size, cardinality_distribution,
+            cardinality_exponent, rng
+        )
+        values = vocabulary.gather(ranks)
+        data[col_name] = _add_typos(
+            values,
+            rng.random(n_rows) < typo_fraction,
+            rng.random(n_rows),
+            rng.integers(0, 3, size=n_rows),
+        ).alias(col_name)
+
     # Convert to DataFrame
     df = pl.DataFrame(data)
     
@@ -222,6 +316,279 @@ def generate_synthetic_dataframe(
     return df
 
 
+def _categorical_columns(n_categorical: int) -> List[tuple]:
+    """The names and value lists of the categorical columns."""
+    categorical_sources = [
+        ("first_name", FIRST_NAMES),
+        ("last_name", LAST_NAMES),
+        ("city", CITIES),
+        ("country", COUNTRIES),
+        ("department", DEPARTMENTS),
+        ("product", PRODUCTS),
+    ]
+    columns = []
+    for i in range(n_categorical):
+        if i < len(categorical_sources):
+            col_name, source_list = categorical_sources[i]
+            col_name = f"{col_name}"
+        else:
+            # Use a cycling pattern for additional categorical columns
+            source_idx = i % len(categorical_sources)
+            col_name, source_list = categorical_sources[source_idx]
+            col_name = f"{col_name}_{i+1}"
+        columns.append((col_name, source_list))
+    return columns
+
+
+def _synthesize_titles(size: int, rng: np.random.Generator) -> pl.Series:
+    """Make ``size`` distinct titles from the prefixes, cores and suffixes.
+
+    The titles are shuffled, so that the most frequent ones are not all built
+    from the first parts.
+    """
+    return _titles(rng.permutation(size))
+
+
+def _titles(index: np.ndarray) -> pl.Series:
+    """The titles with the given indices.
+
+    Title ``i`` combines the parts given by the digits of ``i`` in a mixed
+    radix; when there are more titles than combinations, a grade number is
+    appended.
+    """
+    n_prefixes, n_cores = len(TITLE_PREFIXES), len(TITLE_CORES)
+    n_combinations = n_prefixes * n_cores * len(TITLE_SUFFIXES)
+    parts = pl.DataFrame(
+        {
+            "prefix": pl.Series(TITLE_PREFIXES).gather(index % n_prefixes),
+            "core": pl.Series(TITLE_CORES).gather(
+                index // n_prefixes % n_cores
+            ),
+            "suffix": pl.Series(TITLE_SUFFIXES).gather(
+                index // (n_prefixes * n_cores) % len(TITLE_SUFFIXES)
+            ),
+            "grade": index // n_combinations,
+        }
+    )
+    grade = pl.when(pl.col("grade") > 0).then(
+        pl.format(" Grade {}", pl.col("grade"))
+    ).otherwise(pl.lit(""))
+    return parts.select(
+        pl.concat_str(["prefix", "core", "suffix", grade]).alias("title")
+    ).to_series()
+
+
+def _sample_ranks(
+    n_rows: int,
+    vocabulary_size: int,
+    distribution: str,
+    exponent: float,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Draw ``n_rows`` ranks in ``[0, vocabulary_size)`` from a long tail."""
+    return _ranks_from_uniforms(
+        rng.random(n_rows), vocabulary_size, distribution, exponent
+    )
+
+
+def _ranks_from_uniforms(
+    u: np.ndarray, vocabulary_size: int, distribution: str, exponent: float
+) -> np.ndarray:
+    """Map uniform values in [0, 1) to ranks, with the inverse of the CDF."""
+    if distribution == "zipf":
+        weights = np.arange(1, vocabulary_size + 1, dtype=float) ** -exponent
+        cumulative = np.cumsum(weights)
+        ranks = np.searchsorted(cumulative, u * cumulative[-1])
+    else:
+        # inverse of the CDF of the density x ** -exponent on [1, size + 1)
+        if np.isclose(exponent, 1.0):
+            x = (vocabulary_size + 1.0) ** u
+        else:
+            a = 1.0 - exponent
+            x = (1.0 + u * ((vocabulary_size + 1.0) ** a - 1.0)) ** (1.0 / a)
+        ranks = np.floor(x).astype(np.int64) - 1
+    return np.clip(ranks, 0, vocabulary_size - 1)
+
+
+def _add_typos(
+    values: pl.Series,
+    has_typo: np.ndarray,
+    u_position: np.ndarray,
+    kind: np.ndarray,
+) -> pl.Series:
+    """Drop (kind 0), double (1) or swap (2) one character where ``has_typo``.
+
+    ``u_position`` holds uniform values in [0, 1) that give the position of
+    the character.
+    """
+    lengths = values.str.len_chars().to_numpy()
+    has_typo = has_typo & (lengths > 2)
+    # a position in [1, length - 2], so that there is a next character
+    position = 1 + (u_position * np.maximum(lengths - 2, 1)).astype(np.int64)
+    s, p = pl.col("s"), pl.col("p")
+    return pl.DataFrame(
+        {"s": values, "p": position, "kind": kind, "typo": has_typo}
+    ).select(
+        pl.when(~pl.col("typo")).then(s)
+        .when(pl.col("kind") == 0)
+        .then(s.str.slice(0, p) + s.str.slice(p + 1))
+        .when(pl.col("kind") == 1)
+        .then(s.str.slice(0, p + 1) + s.str.slice(p))
+        .otherwise(
+            s.str.slice(0, p) + s.str.slice(p + 1, 1) + s.str.slice(p, 1)
+            + s.str.slice(p + 2)
+        )
+    ).to_series()
+
+
+def _philox_key(seed: int, stream: str) -> np.ndarray:
+    """The 128-bit Philox key of one column (or other stream) for a seed."""
+    digest = hashlib.blake2b(f"{seed}/{stream}".encode(), digest_size=16)
+    return np.frombuffer(digest.digest(), dtype=np.uint64)
+
+
+def _counter_uniforms(
+    seed: int, stream: str, row_offset: int, n_rows: int
+) -> np.ndarray:
+    """4 uniform values in [0, 1) per row, computed from the row number alone.
+
+    Row ``r`` uses the Philox block at counter ``r``, so the values of a row
+    do not depend on the rows generated before it.
+    """
+    counter = np.array([row_offset, 0, 0, 0], dtype=np.uint64)
+    bits = np.random.Philox(key=_philox_key(seed, stream), counter=counter)
+    raw = bits.random_raw(4 * n_rows).reshape(n_rows, 4)
+    # the 53 high bits, as for numpy's random()
+    return (raw >> np.uint64(11)) * (1.0 / 2**53)
+
+
+def _keyed_permutation(
+    x: np.ndarray, size: int, round_keys: np.ndarray
+) -> np.ndarray:
+    """Shuffle the integers in ``[0, size)`` with a keyed bijection.
+
+    A Feistel network (one round per key) permutes the integers of
+    ``2 * half_bits`` bits, and the values that land outside of
+    ``[0, size)`` are permuted again until they are in it ("cycle walking").
+    The image of a value is computed without the ``size`` others, unlike
+    with ``rng.permutation(size)``.
+    """
+    half_bits = max(1, (max(size - 1, 1).bit_length() + 1) // 2)
+    shift, mask = np.uint64(half_bits), np.uint64((1 << half_bits) - 1)
+
+    def feistel(x):
+        left, right = x >> shift, x & mask
+        for key in round_keys:
+            # the finalizer of splitmix64, as the round function
+            f = (right ^ key) * np.uint64(0x9E3779B97F4A7C15)
+            f = (f ^ (f >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            f = (f ^ (f >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            left, right = right, left ^ ((f ^ (f >> np.uint64(31))) & mask)
+        return (left << shift) | right
+
+    out = feistel(np.asarray(x, dtype=np.uint64))
+    outside = np.flatnonzero(out >= size)
+    while outside.size:
+        out[outside] = feistel(out[outside])
+        outside = outside[out[outside] >= size]
+    return out.astype(np.int64)
+
+
+def _generate_random_access(
+    n_rows, n_numeric, n_categorical, n_null_columns, null_fraction,
+    n_constant_columns, constant_column_name, constant_value,
+    n_datetime_columns, datetime_format, columns_with_nulls,
+    n_high_cardinality, vocabulary_size, cardinality_distribution,
+    cardinality_exponent, typo_fraction, seed, row_offset
+) -> pl.DataFrame:
+    """The ``random_access=True`` version of ``generate_synthetic_dataframe``.
+
+    It makes the same columns, with the same dtypes and distributions, each
+    from its own counter-based stream.
+    """
+    def uniforms(stream):
+        return _counter_uniforms(seed, stream, row_offset, n_rows)
+
+    def choice(source_list, u):
+        indices = (u * len(source_list)).astype(np.int64)
+        return pl.Series(source_list).gather(indices)
+
+    data = {}
+    for i in range(n_numeric):
+        col_name = f"num_{i+1}"
+        u = uniforms(col_name)
+        if i % 3 == 0:
+            data[col_name] = (u[:, 0] * 101).astype(np.int64)
+        elif i % 3 == 1:
+            data[col_name] = u[:, 0] * 1000
+        else:
+            # Box-Muller transform
+            radius = np.sqrt(-2.0 * np.log1p(-u[:, 0]))
+            data[col_name] = 50 + 15 * radius * np.cos(2 * np.pi * u[:, 1])
+
+    for col_name, source_list in _categorical_columns(n_categorical):
+        data[col_name] = choice(source_list, uniforms(col_name)[:, 0])
+
+    for i in range(n_null_columns):
+        col_name = f"with_nulls_{i+1}"
+        u = uniforms(col_name)
+        data[col_name] = choice(CITIES, u[:, 1]).scatter(
+            np.flatnonzero(u[:, 0] < null_fraction), None
+        )
+
+    for i in range(n_constant_columns):
+        data[f"{constant_column_name}_{i+1}"] = pl.repeat(
+            constant_value, n_rows, eager=True
+        )
+
+    for i in range(n_datetime_columns):
+        col_name = f"date_{i+1}"
+        days = (uniforms(col_name)[:, 0] * 1462).astype(np.int64)
+        dates = pl.Series(np.datetime64("2020-01-01") + days)
+        data[col_name] = dates.dt.strftime(datetime_format)
+
+    for i in range(n_high_cardinality):
+        col_name = f"high_cardinality_{i+1}"
+        # the title of each rank is given by a permutation keyed on the seed,
+        # so only the titles of the drawn ranks are built
+        round_keys = np.random.Generator(
+            np.random.Philox(key=_philox_key(seed, f"{col_name}/vocabulary"))
+        ).integers(0, 2**64, size=4, dtype=np.uint64)
+        u = uniforms(col_name)
+        ranks = _ranks_from_uniforms(
+            u[:, 0], vocabulary_size, cardinality_distribution,
+            cardinality_exponent
+        )
+        data[col_name] = _add_typos(
+            _titles(_keyed_permutation(ranks, vocabulary_size, round_keys)),
+            u[:, 1] < typo_fraction,
+            u[:, 2],
+            (u[:, 3] * 3).astype(np.int64),
+        )
+
+    df = pl.DataFrame(
+        {name: pl.Series(name, values) for name, values in data.items()}
+    )
+    for col_name, null_frac in (columns_with_nulls or {}).items():
+        if col_name in df.columns:
+            is_null = uniforms(f"{col_name}/nulls")[:, 0] < null_frac
+            df = df.with_columns(
+                pl.when(pl.Series(is_null)).then(None).otherwise(pl.col(col_name))
+                .alias(col_name)
+            )
+    return df
+
+
+def generate_rows(start: int, stop: int, **kwargs) -> pl.DataFrame:
+    """Rows ``start`` to ``stop - 1`` of a table made with ``random_access=True``.
+
+    The keyword arguments are passed to ``generate_synthetic_dataframe``.
+    """
+    return generate_synthetic_dataframe(
+        stop - start, random_access=True, row_offset=start, **kwargs
+    )
+
+
 def main():
     """Example usage of the synthetic data generator."""
     print("Generating synthetic DataFrame...\n")
@@ -256,5 +623,29 @@ def main():
     
     df.write_csv("synthetic_data.csv")
 
+    # A long-tailed high-cardinality column
+    titles = generate_synthetic_dataframe(
+        n_rows=1_000_000,
+        n_numeric=0,
+        n_categorical=0,
+        n_high_cardinality=1,
+        vocabulary_size=1_000_000,
+        seed=123
+    )["high_cardinality_1"]
+    counts = titles.value_counts(sort=True)["count"]
+    print("\nHigh-cardinality column (1M rows, Zipf over 1M titles):")
+    print(titles.head())
+    print(f"Distinct values: {titles.n_unique()}")
+    print(f"Rows with the 10 most frequent values: {counts.head(10).sum()}")
+    print(f"Values seen only once: {(counts == 1).sum()}")
+
+    # Random access: a slice of a 10M-row table, without the rows before it
+    start = time.perf_counter()
+    rows = generate_rows(9_000_000, 9_001_000, seed=123)
+    elapsed = time.perf_counter() - start
+    same = generate_rows(8_999_000, 9_002_000, seed=123).slice(1000, 1000)
+    print(f"\nRows 9,000,000 to 9,000,999 generated in {elapsed:.3f}s")
+    print(f"Identical to the same rows of a larger slice: {rows.equals(same)}")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,236 @@
+"""
+Write a ``TableReport`` as a small HTML page plus per-column payload files.
+
+A ``TableReport`` HTML file contains the summary card of every column inline
+(twice: in the "Table" and in the "Distributions" tabs), with its plots, its
+statistics and its most frequent values, so reports of wide tables become very
+large and slow to open. ``write_lazy_report`` writes instead:
+- ``index.html``: the report, where the body of each column card is replaced
+  by a placeholder; the card headers, the sample table, the statistics table
+  and the associations are unchanged
+- ``columns/<column index>.json.gz``: the gzip-compressed card bodies of a
+  column
+
+A small script loads the payload of a column only when one of its
+placeholders becomes visible, so opening the report costs much less for wide
+tables. Browsers do not allow pages opened from ``file://`` to fetch other
+files: the report directory must be served over HTTP, for example with
+``python -m http.server --directory <report directory>``.
+"""
+
+import gzip
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import jinja2
+import pandas as pd
+from skrub import TableReport, get_config
+from skrub._reporting import _html
+
+from .benchmarking import DATA_DIR, format_bytes
+
+__all__ = ["write_lazy_report"]
+
+PAYLOAD_DIR = "columns"
+
+_CONTENT_START = '<div class="column-summary-content wrapper">'
+
+_PLACEHOLDER = (
+    '<div class="column-summary-content wrapper" '
+    f'data-lazy-src="{PAYLOAD_DIR}/{{{{ column.idx }}}}.json.gz" '
+    'data-lazy-card="{{ col_id }}" style="min-height: 8em">Loading…</div>\n'
+    "</div>\n"
+)
+
+_LOADER_SCRIPT = """
+<script>
+(function () {
+    const payloads = new Map();
+
+    function loadPayload(src) {
+        if (!payloads.has(src)) {
+            payloads.set(src, fetch(src).then((response) => {
+                if (!response.ok) {
+                    throw new Error(`${response.status} ${response.statusText}`);
+                }
+                const stream = response.body.pipeThrough(
+                    new DecompressionStream("gzip"));
+                return new Response(stream).json();
+            }));
+        }
+        return payloads.get(src);
+    }
+
+    // Crop the matplotlib figure to its content, like the report does for the
+    // plots that are included in the page.
+    function adjustViewBox(svg) {
+        const box = svg.getBBox();
+        if (!box.width || !box.height) {
+            return;
+        }
+        for (const attribute of ["width", "height"]) {
+            const match = (svg.getAttribute(attribute) || "").match(/^([\\d.]+)(.*)$/);
+            const current = svg.viewBox.baseVal[attribute];
+            if (match && current) {
+                const size = Number(match[1]) * box[attribute] / current;
+                svg.setAttribute(attribute, `${size}${match[2]}`);
+            }
+        }
+        svg.setAttribute("viewBox", `${box.x} ${box.y} ${box.width} ${box.height}`);
+    }
+
+    // Attach the report's managers (copy buttons, toggletips) to the new content.
+    function initManagers(report, content) {
+        const elements = [content, ...content.querySelectorAll("[data-manager]")];
+        for (const elem of elements) {
+            for (const name of (elem.dataset.manager || "").split(/\\s+/)) {
+                const cls = report.constructor.managerClasses.get(name);
+                if (cls !== undefined) {
+                    report.exchange.add(new cls(elem, report.exchange));
+                }
+            }
+        }
+    }
+
+    const observer = new IntersectionObserver((entries) => {
+        for (const entry of entries) {
+            if (!entry.isIntersecting) {
+                continue;
+            }
+            const placeholder = entry.target;
+            observer.unobserve(placeholder);
+            loadPayload(placeholder.dataset.lazySrc).then((cards) => {
+                const template = document.createElement("template");
+                template.innerHTML = cards[placeholder.dataset.lazyCard];
+                const content = template.content.firstElementChild;
+                placeholder.replaceWith(content);
+                initManagers(content.getRootNode().host, content);
+                for (const svg of content.querySelectorAll(
+                        "[data-svg-needs-adjust-viewbox] svg")) {
+                    adjustViewBox(svg);
+                }
+            }).catch((error) => {
+                placeholder.textContent = `Could not load the column (${error}). ` +
+                    "The report must be served over HTTP.";
+            });
+        }
+    });
+
+    window.addEventListener("load", () => setTimeout(() => {
+        for (const report of document.querySelectorAll("skrub-table-report")) {
+            const root = report.shadowRoot || report;
+            for (const placeholder of root.querySelectorAll("[data-lazy-src]")) {
+                observer.observe(placeholder);
+            }
+        }
+    }));
+})();
+</script>
+"""
+
+
+def _split_card_template(env):
+    """Split skrub's column card template into the card and its body."""
+    source = env.loader.get_source(env, "column-summary.html")[0]
+    start = source.index(_CONTENT_START)
+    # the last closing tag is the one of the card
+    end = source.rstrip().rindex("</div>")
+    card = source[:start] + _PLACEHOLDER
+    body = '{% import "buttons.html" as buttons %}\n' + source[start:end]
+    return card, body
+
+
+def _lazy_jinja_env():
+    env = _html._get_jinja_env()
+    card, body = _split_card_template(env)
+    env.loader = jinja2.ChoiceLoader(
+        [
+            jinja2.DictLoader(
+                {"column-summary.html": card, "column-summary-body.html": body}
+            ),
+            env.loader,
+        ]
+    )
+    return env
+
+
+def _render_payload(env, column, position):
+    template = env.get_template("column-summary-body.html")
+    config = get_config()
+    return {
+        col_id: template.render(column=column, col_id=col_id, config=config)
+        for col_id in [f"col_{column['idx']}", f"col_{position}_in_sample_tab"]
+    }
+
+
+def write_lazy_report(report, directory, index_name="index.html", compresslevel=6):
+    """Write a report whose column cards are loaded on demand.
+
+    Parameters
+    ----------
+    report : TableReport or dataframe
+        The report to write. A dataframe is first wrapped in a ``TableReport``.
+    directory : str or Path
+        Output directory, created if needed.
+    index_name : str, default="index.html"
+        Name of the HTML page in ``directory``.
+    compresslevel : int, default=6
+        gzip compression level of the column payloads.
+
+    Returns
+    -------
+    Path
+        The path of the HTML page.
+
+    Examples
+    --------
+    >>> write_lazy_report(TableReport(data), "report")  # doctest: +SKIP
+    """
+    if not isinstance(report, TableReport):
+        report = TableReport(report, verbose=0)
+    directory = Path(directory)
+    (directory / PAYLOAD_DIR).mkdir(parents=True, exist_ok=True)
+
+    summary = report._summary
+    env = _lazy_jinja_env()
+    for position, column in enumerate(summary["columns"]):
+        payload = json.dumps(_render_payload(env, column, position)).encode()
+        (directory / PAYLOAD_DIR / f"{column['idx']}.json.gz").write_bytes(
+            gzip.compress(payload, compresslevel)
+        )
+
+    with mock.patch.object(_html, "_get_jinja_env", lambda: env):
+        html = _html.to_html(
+            summary,
+            standalone=True,
+            column_filters=report.column_filters,
+            open_tab=report.open_tab,
+            **report._to_html_kwargs,
+        )
+    html = html.replace("</body>", f"{_LOADER_SCRIPT}</body>", 1)
+    index = directory / index_name
+    index.write_text(html, encoding="utf-8")
+    return index
+
+
+def main():
+    """Compare the size of a regular and a lazy report of employee_salaries."""
+    data = pd.read_csv(DATA_DIR / "employee_salaries" / "data.csv")
+    report = TableReport(data, verbose=0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        regular = Path(tmp_dir) / "report.html"
+        report.write_html(regular)
+        index = write_lazy_report(report, Path(tmp_dir) / "lazy")
+        payloads = list((index.parent / PAYLOAD_DIR).iterdir())
+        print(f"Regular report:     {format_bytes(regular.stat().st_size)}")
+        print(f"Lazy report page:   {format_bytes(index.stat().st_size)}")
+        print(
+            f"Column payloads:    {format_bytes(sum(p.stat().st_size for p in payloads))}"
+            f" in {len(payloads)} files"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,98 @@
+import time
+import weakref
+
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.preprocessing import RobustScaler, StandardScaler
 from skrub import SquashingScaler
 
-
-def generate_data_with_outliers():
-    np.random.seed(0)  # for reproducibility
-    values = np.random.rand(100, 1)
-    n_outliers = 15
-    outlier_indices = np.random.choice(values.shape[0], size=n_outliers, replace=False)
-    values[outlier_indices] = np.random.rand(n_outliers, 1) * 100 - 50
+__all__ = [
+    "generate_data_with_outliers",
+    "iter_data_with_outliers",
+    "plot_feature_with_outliers",
+    "scale_feature_and_plot",
+]
+
+# Number of points drawn per curve; longer series are downsampled.
+MAX_POINTS = 2000
+
+# id of the input array -> (weak reference to the array, fitted scalers)
+_FITTED = {}
+
+
+def generate_data_with_outliers(
+    n_samples=100,
+    n_features=1,
+    outlier_fraction=0.15,
+    outlier_range=(-50, 50),
+    dtype=np.float64,
+    random_state=0,
+):
+    """Generate values uniform in [0, 1) with outliers uniform in ``outlier_range``.
+
+    Parameters
+    ----------
+    n_samples, n_features : int, default=100 and 1
+        Shape of the returned array.
+    outlier_fraction : float, default=0.15
+        Fraction of the values of each feature that are outliers.
+    outlier_range : tuple of float, default=(-50, 50)
+        The outliers are drawn uniformly in this interval.
+    dtype : np.float32 or np.float64, default=np.float64
+        The values are generated directly in this dtype.
+    random_state : int or np.random.Generator, default=0
+        Seed or random generator, for reproducibility.
+
+    Returns
+    -------
+    np.ndarray of shape (n_samples, n_features)
+    """
+    rng = np.random.default_rng(random_state)
+    values = rng.random((n_samples, n_features), dtype=dtype)
+    n_outliers = round(outlier_fraction * n_samples)
+    low, high = outlier_range
+    for column in values.T:
+        outlier_indices = rng.choice(n_samples, size=n_outliers, replace=False)
+        column[outlier_indices] = low + (high - low) * rng.random(n_outliers, dtype)
     return values
 
 
-def plot_feature_with_outliers(values):
+def iter_data_with_outliers(n_samples, chunk_size=100_000, random_state=0, **kwargs):
+    """Yield ``generate_data_with_outliers`` chunks of ``chunk_size`` rows.
+
+    Only one chunk is held in memory at a time. ``kwargs`` are passed to
+    ``generate_data_with_outliers``.
+    """
+    rng = np.random.default_rng(random_state)
+    for start in range(0, n_samples, chunk_size):
+        yield generate_data_with_outliers(
+            min(chunk_size, n_samples - start), random_state=rng, **kwargs
+        )
+
+
+def _minmax_decimate(values, max_points=MAX_POINTS):
+    """Keep the minimum and maximum of consecutive blocks of a long series.
+
+    Unlike taking every k-th value, this keeps the outliers visible.
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    if len(values) <= max_points:
+        return np.arange(len(values)), values
+    starts = np.linspace(0, len(values), max_points // 2, endpoint=False).astype(int)
+    width = len(values) / len(starts)
+    x = np.column_stack([starts, starts + width / 2]).ravel()
+    y = np.column_stack(
+        [np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)]
+    ).ravel()
+    return x, y
+
+
+def plot_feature_with_outliers(values, max_points=MAX_POINTS):
     """Plot a feature with outliers and annotate it."""
-    x = np.arange(values.shape[0])
+    x, y = _minmax_decimate(values, max_points)
     fig, axs = plt.subplots(1, layout="constrained", figsize=(6, 4))
 
-    axs.plot(x, values)
+    axs.plot(x, y)
     _ = axs.set(title="Feature with outliers", ylabel="value", xlabel="Sample ID")
     axs.axhspan(-2, 2, color="gray", alpha=0.15)
 
@@ -43,39 +117,82 @@ def plot_feature_with_outliers(values):
     )
 
 
-def scale_feature_and_plot(values):
+def _fit_scalers(values):
+    """Sort ``values`` and fit the 3 scalers, reusing the result for the same array.
+
+    The arrays are expected not to be modified in place between calls.
+    """
+    cached = _FITTED.get(id(values))
+    if cached is not None and cached[0]() is values:
+        return cached[1]
+    # the scalers work feature by feature and only depend on the distribution
+    # of each feature, and computing quantiles is faster on sorted data
+    values_2d = np.asarray(values, dtype=float)
+    if values_2d.ndim == 1:
+        values_2d = values_2d[:, None]
+    sorted_values = np.sort(values_2d, axis=0)
+    squash_scaler = SquashingScaler().fit(sorted_values)
+    # the SquashingScaler starts with a RobustScaler that has the default
+    # parameters: fitting another one would give the same result
+    robust_scaler = squash_scaler.robust_scaler_ or RobustScaler().fit(sorted_values)
+    standard_scaler = StandardScaler().fit(sorted_values)
+    fitted = sorted_values, squash_scaler, robust_scaler, standard_scaler
+    try:
+        ref = weakref.ref(values, lambda _, key=id(values): _FITTED.pop(key, None))
+    except TypeError:
+        # not an array (e.g. a list): nothing to cache
+        return fitted
+    _FITTED[id(values)] = ref, fitted
+    return fitted
+
+
+def _sorted_curves(values, max_points=MAX_POINTS):
+    """The sorted original and scaled values, at ``max_points`` quantiles at most.
+
+    All 3 scalers are increasing functions of each feature, so the sorted
+    scaled values are the scaled sorted values: only the points that are drawn
+    are transformed. Each feature is sorted on its own.
+    """
+    sorted_values, squash_scaler, robust_scaler, standard_scaler = _fit_scalers(values)
+    n_samples = len(sorted_values)
+    if n_samples > max_points:
+        x = np.unique(np.linspace(0, n_samples - 1, max_points).round().astype(int))
+    else:
+        x = np.arange(n_samples)
+    points = sorted_values[x]
+    return x, {
+        "values": points,
+        "squash": squash_scaler.transform(points),
+        "robust": robust_scaler.transform(points),
+        "standard": standard_scaler.transform(points),
+    }
+
+
+def scale_feature_and_plot(values, max_points=MAX_POINTS):
+    n_samples = len(values)
+    x, curves = _sorted_curves(values, max_points)
 
-    squash_scaler = SquashingScaler()
-    squash_scaled = squash_scaler.fit_transform(values)
-
-    robust_scaler = RobustScaler()
-    robust_scaled = robust_scaler.fit_transform(values)
-
-    standard_scaler = StandardScaler()
-    standard_scaled = standard_scaler.fit_transform(values)
-
-    x = np.arange(values.shape[0])
     fig, axs = plt.subplots(1, 2, layout="constrained", figsize=(8, 5))
 
     ax = axs[0]
-    ax.plot(x, sorted(values), label="Original Values", linewidth=2.5)
-    ax.plot(x, sorted(squash_scaled), label="SquashingScaler")
-    ax.plot(x, sorted(robust_scaled), label="RobustScaler", linestyle="--")
-    ax.plot(x, sorted(standard_scaled), label="StandardScaler")
+    ax.plot(x, curves["values"], label="Original Values", linewidth=2.5)
+    ax.plot(x, curves["squash"], label="SquashingScaler")
+    ax.plot(x, curves["robust"], label="RobustScaler", linestyle="--")
+    ax.plot(x, curves["standard"], label="StandardScaler")
 
     # Add a horizontal band in [-4, +4]
     ax.axhspan(-4, 4, color="gray", alpha=0.15)
-    ax.set(title="Original data", xlim=[0, values.shape[0]], xlabel="Percentile")
+    ax.set(title="Original data", xlim=[0, n_samples], xlabel="Percentile")
     ax.legend()
 
     ax = axs[1]
-    ax.plot(x, sorted(values), label="Original Values", linewidth=2.5)
-    ax.plot(x, sorted(squash_scaled), label="SquashingScaler")
-    ax.plot(x, sorted(robust_scaled), label="RobustScaler", linestyle="--")
-    ax.plot(x, sorted(standard_scaled), label="StandardScaler")
+    ax.plot(x, curves["values"], label="Original Values", linewidth=2.5)
+    ax.plot(x, curves["squash"], label="SquashingScaler")
+    ax.plot(x, curves["robust"], label="RobustScaler", linestyle="--")
+    ax.plot(x, curves["standard"], label="StandardScaler")
 
     ax.set(ylim=[-4, 4])
-    ax.set(title="In range [-4, 4]", xlim=[0, values.shape[0]], xlabel="Percentile")
+    ax.set(title="In range [-4, 4]", xlim=[0, n_samples], xlabel="Percentile")
 
     # Highlight the bounds of the SquashingScaler
     ax.axhline(y=3, alpha=0.2)
@@ -103,3 +220,24 @@ def scale_feature_and_plot(values):
         textcoords="axes fraction",
         arrowprops=dict(arrowstyle="->", color="red"),
     )
+
+
+def main():
+    """Time ``scale_feature_and_plot`` on large features."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    for n_samples in [100, 100_000, 10_000_000]:
+        values = generate_data_with_outliers(n_samples)
+        for call in ["first call", "second call"]:
+            start = time.perf_counter()
+            scale_feature_and_plot(values)
+            plt.gcf().canvas.draw()
+            print(
+                f"{n_samples:>10} samples, {call}: {time.perf_counter() - start:.3f}s"
+            )
+            plt.close("all")
+
+
+if __name__ == "__main__":
+    main()
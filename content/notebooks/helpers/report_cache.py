@@ -0,0 +1,260 @@
+"""
+Compute ``TableReport`` column summaries in parallel and cache them on disk.
+
+``TableReport`` computes the statistics, histograms and most frequent values
+of each column one after the other, and does it again every time a report is
+created. ``CachedTableReport`` is a drop-in replacement that:
+- computes the summaries of the columns in a pool of worker processes
+- stores each summary on disk, keyed by a hash of the column content (and of
+  the report settings), so that re-creating a report on unchanged or partly
+  changed data only processes the columns that changed
+
+The column associations are computed with ``fast_column_associations`` and
+the sample table is still computed by skrub.
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+import polars as pl
+import skrub
+from joblib import Parallel, delayed
+from skrub import TableReport
+from skrub._reporting import _summarize
+
+from .associations import fast_column_associations
+from .benchmarking import DATA_DIR, print_results
+
+__all__ = [
+    "CachedTableReport",
+    "summarize_dataframe_cached",
+    "column_fingerprint",
+    "benchmark_report_cache",
+]
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "skrub_tutorials"
+
+
+def column_fingerprint(column):
+    """Return a hash of the name, dtype and values of a pandas or polars column."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{column.name}|{column.dtype}|{len(column)}".encode())
+    try:
+        if isinstance(column, pl.Series):
+            values_hash = column.hash(seed=0).to_numpy()
+        else:
+            values_hash = pd.util.hash_pandas_object(column, index=False).to_numpy()
+        digest.update(values_hash.tobytes())
+    except TypeError:
+        # unhashable values, e.g. lists stored in an object column
+        digest.update(pickle.dumps(list(column)))
+    return digest.hexdigest()
+
+
+def _summarize_column(column, n_rows, config, with_plots, order_by_column):
+    """Summarize one column; runs in a worker process."""
+    with skrub.config_context(**config):
+        return _summarize._summarize_column(
+            column,
+            0,
+            {"n_rows": n_rows},
+            with_plots=with_plots,
+            order_by_column=order_by_column,
+        )
+
+
+def _load(path):
+    try:
+        with open(path, "rb") as fp:
+            return pickle.load(fp)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _store(path, summary):
+    # write to a temporary file first so that concurrent readers never see a
+    # partially written summary
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as fp:
+        pickle.dump(summary, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def summarize_dataframe_cached(
+    df,
+    *,
+    cache_dir=None,
+    n_jobs=-1,
+    order_by=None,
+    with_plots=True,
+    verbose=1,
+    **kwargs,
+):
+    """Same as skrub's ``summarize_dataframe``, with parallel and cached columns.
+
+    Parameters
+    ----------
+    df : pandas or polars DataFrame
+        The dataframe to summarize.
+    cache_dir : str or Path, optional
+        Where the column summaries are stored. Defaults to
+        ``~/.cache/skrub_tutorials/table_report``.
+    n_jobs : int, default=-1
+        Number of worker processes used for the columns that are not in the
+        cache (-1 means all CPUs). Processes are used rather than threads
+        because the plots are drawn with matplotlib, which is not thread-safe.
+    order_by, with_plots, verbose, **kwargs
+        Passed to ``summarize_dataframe``.
+
+    Returns
+    -------
+    dict
+        The summary used by ``TableReport`` to render the report.
+    """
+    cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR / "table_report")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    config = skrub.get_config()
+
+    if order_by is None:
+        sorted_df = df
+    elif isinstance(df, pl.DataFrame):
+        sorted_df = df.sort(order_by)
+    else:
+        sorted_df = df.sort_values(order_by)
+    columns = [sorted_df[name] for name in sorted_df.columns]
+    order_by_column = None if order_by is None else sorted_df[order_by]
+    settings = repr(
+        (
+            skrub.__version__,
+            sorted(config.items()),
+            with_plots,
+            None if order_by is None else column_fingerprint(order_by_column),
+        )
+    ).encode()
+    paths = [
+        cache_dir
+        / hashlib.blake2b(
+            settings + column_fingerprint(col).encode(), digest_size=16
+        ).hexdigest()
+        for col in columns
+    ]
+
+    summaries = {position: _load(path) for position, path in enumerate(paths)}
+    missing = [position for position, s in summaries.items() if s is None]
+    if verbose > 0:
+        print(
+            f"{len(columns) - len(missing)} / {len(columns)} column summaries "
+            "loaded from the cache",
+            file=sys.stderr,
+        )
+    computed = Parallel(n_jobs=n_jobs if len(missing) > 1 else 1)(
+        delayed(_summarize_column)(
+            columns[position], len(sorted_df), config, with_plots, order_by_column
+        )
+        for position in missing
+    )
+    for position, summary in zip(missing, computed):
+        _store(paths[position], summary)
+        summaries[position] = summary
+
+    def cached_summary(column, position, dataframe_summary, **_):
+        return {**summaries[position], "position": position, "idx": position}
+
+    with (
+        mock.patch.object(_summarize, "_summarize_column", cached_summary),
+        mock.patch.object(
+            _summarize._column_associations,
+            "column_associations",
+            functools.partial(fast_column_associations, n_jobs=n_jobs),
+        ),
+    ):
+        return _summarize.summarize_dataframe(
+            df, order_by=order_by, with_plots=with_plots, verbose=0, **kwargs
+        )
+
+
+class CachedTableReport(TableReport):
+    """A ``TableReport`` whose column summaries are parallel and cached.
+
+    It accepts the same parameters as ``TableReport``, plus ``cache_dir`` and
+    ``n_jobs`` (see ``summarize_dataframe_cached``).
+
+    Examples
+    --------
+    >>> import pandas as pd
+    >>> from helpers import CachedTableReport
+    >>> data = pd.read_csv("../data/employee_salaries/data.csv")
+    >>> CachedTableReport(data)  # doctest: +SKIP
+    """
+
+    def __init__(self, dataframe, *, cache_dir=None, n_jobs=-1, **kwargs):
+        super().__init__(dataframe, **kwargs)
+        self.cache_dir = cache_dir
+        self.n_jobs = n_jobs
+
+    @functools.cached_property
+    def _summary(self):
+        return summarize_dataframe_cached(
+            self.dataframe,
+            cache_dir=self.cache_dir,
+            n_jobs=self.n_jobs,
+            with_plots=self.plot_distributions,
+            with_associations=self.compute_associations,
+            title=self.title,
+            **self._summary_kwargs,
+        )
+
+
+def benchmark_report_cache(df, n_jobs=-1):
+    """Time the report summary of ``df`` with and without the cache.
+
+    The scenarios are: skrub's ``TableReport``, a cold cache, a warm cache and
+    a warm cache after modifying one column.
+    """
+
+    def summarize(report):
+        start = time.perf_counter()
+        report._summary
+        return time.perf_counter() - start
+
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        report = TableReport(df, verbose=0)
+        results.append({"scenario": "TableReport", "summary_time": summarize(report)})
+        for scenario, data in [
+            ("cold cache", df),
+            ("warm cache", df),
+            ("1 column changed", _change_one_column(df)),
+        ]:
+            report = CachedTableReport(
+                data, cache_dir=cache_dir, n_jobs=n_jobs, verbose=0
+            )
+            results.append({"scenario": scenario, "summary_time": summarize(report)})
+    return results
+
+
+def _change_one_column(df):
+    name = df.columns[0]
+    if isinstance(df, pl.DataFrame):
+        return df.with_columns(df[name].shuffle(seed=0))
+    return df.assign(**{name: df[name].sample(frac=1, random_state=0).to_numpy()})
+
+
+def main():
+    """Benchmark the report cache on employee_salaries, repeated 10 times."""
+    data = pd.read_csv(DATA_DIR / "employee_salaries" / "data.csv")
+    data = pd.concat([data] * 10, ignore_index=True)
+    print(f"Summarizing a dataframe of shape {data.shape}\n")
+    print_results(benchmark_report_cache(data), columns=["scenario", "summary_time"])
+
+
+if __name__ == "__main__":
+    main()
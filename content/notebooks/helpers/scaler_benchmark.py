@@ -0,0 +1,179 @@
+"""
+Compare the throughput and memory of scalers on large numeric features.
+
+The data comes from ``generate_data_with_outliers``. For each scaler
+(``SquashingScaler``, ``RobustScaler``, ``StandardScaler`` and
+``QuantileTransformer``) and each dtype (float32 and float64), the benchmark
+measures:
+- in memory: ``fit`` then ``transform`` on the whole matrix
+- chunked: the data arrives in chunks and the scaler only sees one at a time;
+  scalers that have ``partial_fit`` are fitted on every chunk, the others on
+  the first chunk only, and then every chunk is transformed
+
+Throughputs are in values (rows x features) per second, counting only the
+values that were fitted or transformed; the chunks are generated before the
+timings. The output dtype is reported, to spot scalers that upcast float32
+inputs.
+"""
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.preprocessing import QuantileTransformer, RobustScaler, StandardScaler
+from skrub import SquashingScaler
+
+from .benchmarking import measure, print_results
+from .plot_squashing_scaler import generate_data_with_outliers, iter_data_with_outliers
+
+__all__ = ["benchmark_scalers", "DEFAULT_SCALERS"]
+
+DEFAULT_SCALERS = {
+    "SquashingScaler": SquashingScaler(),
+    "RobustScaler": RobustScaler(),
+    "StandardScaler": StandardScaler(),
+    "QuantileTransformer": QuantileTransformer(output_distribution="normal"),
+}
+
+_COLUMNS = [
+    "scaler",
+    "dtype",
+    "mode",
+    "fit_method",
+    "fit_time",
+    "transform_time",
+    "fit_throughput",
+    "transform_throughput",
+    "peak_memory",
+    "output_dtype",
+]
+
+
+def _in_memory(scaler, X):
+    scaler = clone(scaler)
+    _, fit_stats = measure(scaler.fit, X)
+    output, transform_stats = measure(scaler.transform, X)
+    return "fit", X.size, fit_stats, transform_stats, output.dtype
+
+
+def _chunked(scaler, chunks):
+    """Fit with ``partial_fit`` (or on the first chunk), then transform each chunk.
+
+    ``chunks`` is the list of chunks, generated beforehand so that the timings
+    only cover the scaler.
+    """
+    scaler = clone(scaler)
+    has_partial_fit = hasattr(scaler, "partial_fit")
+    fitted = chunks if has_partial_fit else chunks[:1]
+
+    def fit():
+        if has_partial_fit:
+            for chunk in fitted:
+                scaler.partial_fit(chunk)
+        else:
+            scaler.fit(fitted[0])
+
+    def transform():
+        dtype = None
+        for chunk in chunks:
+            dtype = scaler.transform(chunk).dtype
+        return dtype
+
+    _, fit_stats = measure(fit)
+    output_dtype, transform_stats = measure(transform)
+    fit_method = "partial_fit" if has_partial_fit else "fit (first chunk)"
+    n_fitted = sum(chunk.size for chunk in fitted)
+    return fit_method, n_fitted, fit_stats, transform_stats, output_dtype
+
+
+def benchmark_scalers(
+    n_samples=1_000_000,
+    n_features=10,
+    dtypes=(np.float32, np.float64),
+    chunk_size=100_000,
+    scalers=None,
+    outlier_fraction=0.15,
+    random_state=0,
+):
+    """Measure fit and transform throughput and memory of several scalers.
+
+    Parameters
+    ----------
+    n_samples, n_features : int
+        Shape of the data.
+    dtypes : sequence of dtypes, default=(np.float32, np.float64)
+        The dtypes in which the data is generated.
+    chunk_size : int or None, default=100_000
+        Number of rows per chunk for the chunked benchmark; ``None`` skips it.
+    scalers : dict, optional
+        Name -> scaler; defaults to ``DEFAULT_SCALERS``.
+    outlier_fraction : float, default=0.15
+        Passed to ``generate_data_with_outliers``.
+    random_state : int, default=0
+        Seed of the data.
+
+    Returns
+    -------
+    list of dict
+        One row per scaler, dtype and mode, with the keys ``scaler``,
+        ``dtype``, ``mode``, ``fit_method``, ``fit_time``, ``transform_time``,
+        ``fit_throughput``, ``transform_throughput``, ``peak_memory`` (the
+        largest of the fit and transform peaks) and ``output_dtype``. The fit
+        throughput counts the values that were fitted: only the first chunk
+        for the scalers without ``partial_fit``.
+    """
+    scalers = DEFAULT_SCALERS if scalers is None else scalers
+    n_values = n_samples * n_features
+    data_kwargs = dict(n_features=n_features, outlier_fraction=outlier_fraction)
+    results = []
+    for dtype in dtypes:
+        dtype_name = np.dtype(dtype).name
+        X = generate_data_with_outliers(
+            n_samples, dtype=dtype, random_state=random_state, **data_kwargs
+        )
+        runs = [("in memory", lambda scaler: _in_memory(scaler, X))]
+        if chunk_size is not None:
+            chunks = list(
+                iter_data_with_outliers(
+                    n_samples,
+                    chunk_size,
+                    dtype=dtype,
+                    random_state=random_state,
+                    **data_kwargs,
+                )
+            )
+            runs.append(
+                (f"chunks of {chunk_size}", lambda scaler: _chunked(scaler, chunks))
+            )
+        for mode, run in runs:
+            for name, scaler in scalers.items():
+                fit_method, n_fitted, fit_stats, transform_stats, output_dtype = run(
+                    scaler
+                )
+                results.append(
+                    {
+                        "scaler": name,
+                        "dtype": dtype_name,
+                        "mode": mode,
+                        "fit_method": fit_method,
+                        "fit_time": fit_stats["wall_time"],
+                        "transform_time": transform_stats["wall_time"],
+                        "fit_throughput": n_fitted / fit_stats["wall_time"],
+                        "transform_throughput": n_values / transform_stats["wall_time"],
+                        "peak_memory": max(
+                            fit_stats["peak_memory"], transform_stats["peak_memory"]
+                        ),
+                        "output_dtype": np.dtype(output_dtype).name,
+                    }
+                )
+        del X
+    return results
+
+
+def main():
+    """Benchmark the scalers on 1M rows x 10 features."""
+    n_samples, n_features = 1_000_000, 10
+    print(f"Scaling {n_samples} x {n_features} values\n")
+    print_results(benchmark_scalers(n_samples, n_features), columns=_COLUMNS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""
+Export a fitted linear ``tabular_pipeline`` to a scorer that only uses NumPy.
+
+Predicting a single row with a fitted pipeline takes milliseconds: the
+``TableVectorizer`` dispatches every column to its transformers, and every
+scikit-learn step validates its input, while the arithmetic itself takes a
+few microseconds. With a linear estimator, the prediction is a sum of one
+term per input column: each column is encoded on its own by the
+``TableVectorizer``, and the imputer and scaler that follow act on each
+feature separately. This module provides:
+- ``export_linear_pipeline``: turns the fitted pipeline into a
+  ``LinearScorer`` (defined in ``linear_scorer``, which only imports NumPy),
+  made of
+  - a lookup table per one-hot encoded column, which maps every value seen
+    in the training data to its contribution to the prediction (computed once
+    by the pipeline itself)
+  - a closed-form function per numeric column (the float32 cast, imputation,
+    missing indicator, scaling and squashing of the pipeline)
+  - the features of the ``DatetimeEncoder`` and of the ``StringEncoder``,
+    computed with NumPy from the values (the fitted spline bases, n-gram
+    vocabulary, idf weights and SVD components are exported) and followed by
+    the same functions, so that dates and strings that are not in the
+    training data are exact too
+- ``check_export``: the test harness, which checks that the scorer gives the
+  same predictions as the pipeline
+
+Values that are not in the lookup tables (e.g. a new department) are encoded
+by the pipeline and added to the table when the scorer keeps the pipeline
+(``keep_pipeline=True``). Otherwise they get the contribution of a value
+that the pipeline has never seen, which is exact for one-hot encoded columns
+(an unknown category is all zeros). The columns handled by other encoders
+(e.g. the ``MinHashEncoder``, a ``StringEncoder`` with a hashing vectorizer,
+or datetimes with a time zone) also use lookup tables, and their unknown
+values are approximated.
+"""
+
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.base import is_classifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression, Ridge
+from sklearn.preprocessing import StandardScaler
+from skrub import (
+    DatetimeEncoder,
+    SquashingScaler,
+    StringEncoder,
+    TableVectorizer,
+    tabular_pipeline,
+)
+from skrub import _dataframe as sbd
+from skrub._table_vectorizer import PassThrough
+from skrub._to_datetime import ToDatetime
+
+from .benchmarking import DATA_DIR, print_results
+from .linear_scorer import LinearScorer, _key, _to_float
+
+__all__ = ["export_linear_pipeline", "check_export"]
+
+# a value that the pipeline has never seen
+_UNSEEN = "\x00unseen value"
+# the periodic features of the DatetimeEncoder are integers below this
+_N_PERIODIC_VALUES = 367
+
+
+def _feature_chains(pipeline):
+    """Follow each output feature of the vectorizer through the next steps.
+
+    Returns a dict mapping each input feature of the estimator to
+    ``(column, output, ops)``: the input column it is computed from, the
+    output of the vectorizer it is computed from, and the operations applied
+    to that output by the steps that follow the vectorizer.
+    """
+    vectorizer = pipeline[0]
+    chains = {
+        name: (column, name, [])
+        for name, column in vectorizer.output_to_input_.items()
+        if name in vectorizer.all_outputs_
+    }
+    chains = {name: chains[name] for name in vectorizer.all_outputs_}
+    for step in pipeline[1:-1]:
+        names = list(chains)
+        if isinstance(step, SimpleImputer):
+            kept = set(step.get_feature_names_out(names))
+            new_chains = {}
+            for i, name in enumerate(names):
+                if name in kept:
+                    column, output, ops = chains[name]
+                    fill = step.statistics_[i]
+                    fill = 0.0 if np.isnan(fill) else float(fill)
+                    new_chains[name] = (column, output, ops + [("fill", fill)])
+            if step.add_indicator:
+                for i in step.indicator_.features_:
+                    column, output, ops = chains[names[i]]
+                    new_chains[f"missingindicator_{names[i]}"] = (
+                        column,
+                        output,
+                        ops + [("isnan",)],
+                    )
+            chains = new_chains
+        elif isinstance(step, StandardScaler):
+            mean = step.mean_ if step.with_mean else np.zeros(len(names))
+            scale = step.scale_ if step.with_std else np.ones(len(names))
+            for i, name in enumerate(names):
+                _, _, ops = chains[name]
+                ops.append(("affine", 1 / scale[i], -mean[i] / scale[i]))
+        elif isinstance(step, SquashingScaler):
+            robust_index = np.cumsum(step.robust_cols_) - 1
+            minmax_index = np.cumsum(step.minmax_cols_) - 1
+            for i, name in enumerate(names):
+                if step.robust_cols_[i]:
+                    center = step.robust_scaler_.center_[robust_index[i]]
+                    scale = step.robust_scaler_.scale_[robust_index[i]]
+                    a, b = 1 / scale, -center / scale
+                elif step.minmax_cols_[i]:
+                    scale = step.minmax_scaler_.scale_[minmax_index[i]]
+                    a = scale
+                    b = -scale * step.minmax_scaler_.median_[minmax_index[i]]
+                else:
+                    a, b = 0.0, 0.0
+                _, _, ops = chains[name]
+                ops.append(("squash", float(a), float(b), step.max_absolute_value))
+        else:
+            raise ValueError(
+                f"Cannot export the step {step!r}: only SimpleImputer,"
+                " StandardScaler and SquashingScaler are supported between the"
+                " TableVectorizer and the estimator."
+            )
+    expected = list(pipeline[:-1].get_feature_names_out())
+    if list(chains) != expected:
+        raise ValueError("The features of the pipeline could not be followed.")
+    return chains
+
+
+def _coefficients(estimator):
+    if not (hasattr(estimator, "coef_") and hasattr(estimator, "intercept_")):
+        raise ValueError(f"Only linear estimators can be exported, got {estimator!r}.")
+    coef = np.atleast_2d(estimator.coef_)
+    intercept = np.atleast_1d(np.asarray(estimator.intercept_, dtype=np.float64))
+    if intercept.shape[0] != coef.shape[0]:
+        intercept = np.broadcast_to(intercept, coef.shape[0]).copy()
+    return coef.T.astype(np.float64), intercept
+
+
+class _PipelineEncoder:
+    """Computes the contribution of column values with the fitted pipeline."""
+
+    def __init__(self, pipeline, base_row, chains, coef):
+        self.preprocessing = pipeline[:-1]
+        self.base_row = base_row
+        self.owners = [owner for owner, _, _ in chains.values()]
+        self.coef = coef
+
+    def contributions(self, column, values):
+        """The contribution of each value, shape (n_values, n_outputs).
+
+        The values are placed in copies of a row of the training data; the
+        other columns do not matter, because each feature only depends on one
+        column.
+        """
+        frame = self.base_row.iloc[np.zeros(len(values), dtype=np.intp)]
+        frame = frame.reset_index(drop=True)
+        frame[column] = pd.Series(values, dtype=object)
+        with warnings.catch_warnings():
+            # the one-hot encoders warn about the values they have not seen
+            warnings.simplefilter("ignore", UserWarning)
+            features = self.preprocessing.transform(frame)
+        features = np.asarray(features, dtype=np.float64)
+        owned = [i for i, owner in enumerate(self.owners) if owner == column]
+        return features[:, owned] @ self.coef[owned]
+
+
+def _datetime_terms(vectorizer, column, owned, coef):
+    """The ``(format, terms)`` of a datetime column in ``LinearScorer.dates``.
+
+    Returns None for columns with a time zone, which use a lookup table.
+    """
+    steps = vectorizer.all_processing_steps_[column]
+    to_datetime = next((s for s in steps if isinstance(s, ToDatetime)), None)
+    if to_datetime is not None and to_datetime.output_time_zone_ is not None:
+        return None
+    encoder = vectorizer.transformers_[column]
+    sources = {}
+    for feature in encoder.extracted_features_:
+        periodic = encoder._periodic_encoders.get(feature)
+        if periodic is None:
+            sources[f"{column}_{feature}"] = (feature, None)
+            continue
+        # the encoding of every possible value, cast to float32 by the vectorizer
+        values = pd.Series(np.arange(_N_PERIODIC_VALUES), name=column)
+        table = _to_float(periodic.transform(values))
+        for j, name in enumerate(periodic.all_outputs_):
+            sources[name] = (feature, table[:, j])
+    format = None if to_datetime is None else to_datetime.format_
+    return format, [(*sources[output], coef[i], ops) for i, output, ops in owned]
+
+
+def _stack_terms(terms):
+    """Group ``(source, coef, ops)`` terms whose operations have the same kinds.
+
+    Returns a list of ``(sources, coef, ops)``, with the parameters of the
+    operations stacked into arrays, so that a group is computed with a few
+    NumPy operations.
+    """
+    groups = {}
+    for term in terms:
+        groups.setdefault(tuple(op[0] for op in term[2]), []).append(term)
+    stacked = []
+    for kinds, members in groups.items():
+        ops = [
+            (kind, *map(np.asarray, zip(*(ops[j][1:] for _, _, ops in members))))
+            for j, kind in enumerate(kinds)
+        ]
+        sources = np.asarray([source for source, _, _ in members], dtype=np.intp)
+        coef = np.stack([coef for _, coef, _ in members])
+        stacked.append((sources, coef, ops))
+    return stacked
+
+
+def _string_terms(encoder, owned, coef):
+    """The ``(encoding, terms)`` of a string column in ``LinearScorer.strings``.
+
+    Returns None for the vectorizers that are not reproduced with NumPy, whose
+    columns use a lookup table.
+    """
+    vectorizer = encoder.vectorizer_
+    if not (
+        isinstance(vectorizer, TfidfVectorizer)
+        and vectorizer.analyzer in ("char", "char_wb")
+        and vectorizer.lowercase
+        and vectorizer.preprocessor is None
+        and not vectorizer.strip_accents
+        and vectorizer.norm == "l2"
+        and vectorizer.use_idf
+        and not vectorizer.sublinear_tf
+    ):
+        return None
+    n_ngrams = len(vectorizer.vocabulary_)
+    if hasattr(encoder, "tsvd_"):
+        projection = encoder.tsvd_.components_.T
+    else:
+        projection = np.eye(n_ngrams, encoder.n_components_, dtype=np.float32)
+    encoding = (
+        vectorizer.analyzer,
+        vectorizer.ngram_range,
+        {ngram: int(i) for ngram, i in vectorizer.vocabulary_.items()},
+        vectorizer.idf_.astype(np.float64),
+        projection / encoder.scaling_factor_,
+    )
+    sources = {name: k for k, name in enumerate(encoder.all_outputs_)}
+    terms = [(sources[output], coef[i], ops) for i, output, ops in owned]
+    return encoding, _stack_terms(terms)
+
+
+def export_linear_pipeline(pipeline, X, keep_pipeline=True):
+    """Turn a fitted linear ``tabular_pipeline`` into a ``LinearScorer``.
+
+    Parameters
+    ----------
+    pipeline : Pipeline
+        A fitted pipeline made of a ``TableVectorizer``, then any of
+        ``SimpleImputer``, ``StandardScaler`` and ``SquashingScaler``, then a
+        linear estimator (e.g. ``tabular_pipeline(Ridge())`` or
+        ``tabular_pipeline(LogisticRegression())``).
+    X : dataframe
+        The training data: the values of its one-hot encoded columns fill the
+        lookup tables.
+    keep_pipeline : bool, default=True
+        Whether the scorer keeps the pipeline to encode the values that are
+        not in its lookup tables (the pipeline is not pickled with it).
+
+    Returns
+    -------
+    LinearScorer
+    """
+    vectorizer = pipeline[0]
+    if not isinstance(vectorizer, TableVectorizer):
+        raise ValueError(
+            f"The first step should be a TableVectorizer, got {vectorizer!r}."
+        )
+    coef, intercept = _coefficients(pipeline[-1])
+    chains = _feature_chains(pipeline)
+    X = sbd.to_pandas(X) if not sbd.is_pandas(X) else X
+    encoder = _PipelineEncoder(pipeline, X.iloc[[0]], chains, coef)
+    tables, numeric, dates, strings = {}, {}, {}, {}
+    for column in vectorizer.feature_names_in_:
+        owned = [
+            (i, output, ops)
+            for i, (owner, output, ops) in enumerate(chains.values())
+            if owner == column
+        ]
+        transformer = vectorizer.transformers_.get(column)
+        if not owned:
+            # dropped by the vectorizer
+            numeric[column] = []
+        elif isinstance(transformer, PassThrough):
+            numeric[column] = [(coef[i], ops) for i, _, ops in owned]
+        elif isinstance(transformer, DatetimeEncoder) and (
+            terms := _datetime_terms(vectorizer, column, owned, coef)
+        ):
+            dates[column] = terms
+        elif isinstance(transformer, StringEncoder) and (
+            terms := _string_terms(transformer, owned, coef)
+        ):
+            strings[column] = terms
+        else:
+            values = list(pd.unique(X[column].dropna())) + [None, _UNSEEN]
+            index = {_key(v): i for i, v in enumerate(values[:-1])}
+            tables[column] = (index, encoder.contributions(column, values))
+    classes = pipeline[-1].classes_ if is_classifier(pipeline[-1]) else None
+    return LinearScorer(
+        list(vectorizer.feature_names_in_),
+        intercept,
+        tables,
+        numeric,
+        dates,
+        strings,
+        classes,
+        encoder=encoder if keep_pipeline else None,
+    )
+
+
+def check_export(scorer, pipeline, X, rtol=1e-4, atol=1e-5, n_rows=100):
+    """Check that the scorer gives the same predictions as the pipeline.
+
+    The decision function (or the predictions of a regressor) of the whole
+    batch, the predicted classes, and the predictions of the first
+    ``n_rows`` rows given one by one are compared.
+
+    Returns
+    -------
+    float
+        The largest absolute difference of the raw predictions.
+
+    Raises
+    ------
+    AssertionError
+        If the predictions differ.
+    """
+    if is_classifier(pipeline):
+        expected = pipeline.decision_function(X)
+        np.testing.assert_array_equal(scorer.predict(X), pipeline.predict(X))
+    else:
+        expected = pipeline.predict(X)
+    actual = scorer.decision_function(X)
+    np.testing.assert_allclose(actual, expected, rtol=rtol, atol=atol)
+    rows = X.head(n_rows).to_dict(orient="records")
+    row_predictions = np.asarray([scorer.predict_row(row) for row in rows])
+    batch_predictions = scorer.predict(X.head(n_rows))
+    if scorer.classes is None:
+        np.testing.assert_allclose(row_predictions, batch_predictions, rtol=rtol)
+    else:
+        np.testing.assert_array_equal(row_predictions, batch_predictions)
+    return float(np.max(np.abs(actual - expected)))
+
+
+def _microseconds_per_call(func, args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            func(arg)
+        best = min(best, (time.perf_counter() - start) / len(args))
+    return int(round(best * 1e6))
+
+
+def main():
+    """Export Ridge and LogisticRegression pipelines fitted on employee_salaries."""
+    X = pd.read_csv(DATA_DIR / "employee_salaries" / "data.csv")
+    y = pd.read_csv(DATA_DIR / "employee_salaries" / "target.csv").iloc[:, 0]
+    rng = np.random.default_rng(0)
+    is_train = rng.random(len(X)) < 0.8
+    X_train, X_test = X[is_train], X[~is_train].reset_index(drop=True)
+    models = {
+        "Ridge": (Ridge(), y),
+        "LogisticRegression": (LogisticRegression(), y > y.median()),
+    }
+    rows = []
+    for name, (estimator, target) in models.items():
+        pipeline = tabular_pipeline(estimator).fit(X_train, target[is_train])
+        exact = export_linear_pipeline(pipeline, X_train)
+        standalone = export_linear_pipeline(pipeline, X_train, keep_pipeline=False)
+        # rows with values that are not in the lookup tables are predicted by
+        # the pipeline for ``exact`` and approximated for ``standalone``; the
+        # employee_salaries pipelines only have tables for one-hot encoded
+        # columns, for which both are exact
+        max_difference = check_export(exact, pipeline, X_test)
+        approximate = standalone.decision_function(X_test)
+        expected = (
+            pipeline.decision_function(X_test)
+            if is_classifier(pipeline)
+            else pipeline.predict(X_test)
+        )
+        single_rows = [X_test.iloc[[i]] for i in range(100)]
+        row_dicts = X_test.head(1000).to_dict(orient="records")
+        # the first call encodes the datetime and string values, the next
+        # ones reuse their contributions
+        cold_rows = export_linear_pipeline(pipeline, X_train, keep_pipeline=False)
+        cold_batch = export_linear_pipeline(pipeline, X_train, keep_pipeline=False)
+        for variant, func, batch_func, repeat in [
+            ("pipeline", pipeline.predict, pipeline.predict, 3),
+            ("scorer, first call", cold_rows.predict_row, cold_batch.predict, 1),
+            ("scorer", exact.predict_row, exact.predict, 3),
+        ]:
+            args = single_rows if variant == "pipeline" else row_dicts
+            rows.append(
+                {
+                    "model": name,
+                    "variant": variant,
+                    "row_microseconds": _microseconds_per_call(func, args, repeat),
+                    "batch_microseconds": _microseconds_per_call(
+                        batch_func, [X_test], repeat
+                    ),
+                    "max_difference": (
+                        0.0 if variant == "pipeline" else max_difference
+                    ),
+                }
+            )
+        print(
+            f"{name}: {exact.n_fallbacks} unknown values encoded by the pipeline;"
+            " largest difference without the pipeline:"
+            f" {np.max(np.abs(approximate - expected)):.3g}"
+        )
+    print(f"\n{len(X_test)} rows in the batch\n")
+    print_results(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Resolve each selector once per dataframe schema.
+
+A selector such as ``s.numeric() - "num_id"`` is resolved by calling a dtype
+check on every column of the dataframe. ``ApplyToCols``, ``SelectCols`` and
+``DropCols`` resolve their selector in ``fit`` only (``transform`` reuses the
+list of columns found in ``fit``), but the selector is resolved again for every
+fold of a cross-validation, every model of a grid search and every call to
+``s.select``, and on a table with thousands of columns it adds up. Most
+selectors only look at the names and the dtypes of the columns, so their result
+is the same for all the dataframes that have the same schema. This module
+provides:
+- ``schema_fingerprint``: a key made of the names and dtypes of the columns
+- ``cached_expand``: ``selector.expand(df)``, memoized on the selector and the
+  schema fingerprint of ``df``
+- ``cached_selectors``: a context manager in which all the selectors (including
+  those used by the skrub transformers) are resolved with ``cached_expand``
+- ``main``: compare the time to resolve selectors and to fit ``ApplyToCols``
+  on wide dataframes, with and without the cache
+
+Selectors that look at the values of the columns (``has_nulls``,
+``cardinality_below`` and the ones made with ``s.filter``) are never cached.
+With pandas, ``string()`` and ``boolean()`` also look at the values of the
+columns with the ``object`` dtype, so they are only cached for dataframes that
+have no such column (e.g. after ``df.convert_dtypes()``).
+"""
+
+import contextlib
+import time
+from collections import OrderedDict
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import polars as pl
+from sklearn.preprocessing import FunctionTransformer
+from skrub import ApplyToCols
+from skrub import _dataframe as sbd
+from skrub import selectors as s
+from skrub.selectors import _base
+
+from .benchmarking import print_results
+
+__all__ = ["schema_fingerprint", "cached_expand", "cached_selectors"]
+
+# predicates of the built-in selectors that only look at the dtype
+_DTYPE_PREDICATES = {
+    selector.predicate
+    for selector in [
+        s.numeric(),
+        s.integer(),
+        s.float(),
+        s.any_date(),
+        s.categorical(),
+        s.object(),
+        s.has_dtype("int64"),
+    ]
+}
+# with pandas, these also look at the values of the object columns
+_OBJECT_PREDICATES = {s.string().predicate, s.boolean().predicate}
+
+_CACHE = OrderedDict()
+_MAX_CACHE_SIZE = 256
+_original_expand = _base.Selector.expand
+
+
+class _Schema:
+    """The names and dtypes of the columns, hashed on the names only.
+
+    Hashing thousands of pandas extension dtypes takes milliseconds, while the
+    hashes of the column names are cached by Python. Two schemas with the same
+    names and different dtypes end up in the same bucket of the cache, and are
+    told apart by ``__eq__``.
+    """
+
+    __slots__ = ("library", "names", "dtypes")
+
+    def __init__(self, library, names, dtypes):
+        self.library, self.names, self.dtypes = library, names, dtypes
+
+    def __hash__(self):
+        return hash(self.names)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, _Schema)
+            and self.library == other.library
+            and self.names == other.names
+            and self.dtypes == other.dtypes
+        )
+
+    def has_object_columns(self):
+        return self.library == "pandas" and any(
+            dtype == object for dtype in self.dtypes
+        )
+
+
+def schema_fingerprint(df):
+    """The names and dtypes of the columns of a pandas or polars dataframe.
+
+    The result is hashable, and equal for two dataframes if and only if they
+    have the same columns, in the same order, with the same dtypes.
+    """
+    if sbd.is_pandas(df):
+        return _Schema("pandas", tuple(df.columns), tuple(df.dtypes))
+    return _Schema("polars", tuple(df.columns), tuple(df.dtypes))
+
+
+def _selector_key(selector, object_columns):
+    """A hashable description of the selector, or ``None`` if it is not cacheable.
+
+    It does not depend on the identity of the selector, because the
+    transformers are cloned (and so are their selectors) for each fold.
+    """
+    if isinstance(selector, (_base.All, _base.Cols)):
+        return (type(selector), tuple(getattr(selector, "columns", ())))
+    if isinstance(selector, _base.Inv):
+        key = _selector_key(selector.complement, object_columns)
+        return None if key is None else (_base.Inv, key)
+    if isinstance(selector, (_base.Or, _base.And, _base.Sub, _base.XOr)):
+        left = _selector_key(selector.left, object_columns)
+        right = _selector_key(selector.right, object_columns)
+        if left is None or right is None:
+            return None
+        return (type(selector), left, right)
+    if isinstance(selector, _base.Filter):
+        if not (
+            isinstance(selector, _base.NameFilter)
+            or selector.predicate in _DTYPE_PREDICATES
+            or (selector.predicate in _OBJECT_PREDICATES and not object_columns)
+        ):
+            return None
+        key = (
+            type(selector),
+            selector.predicate,
+            tuple(selector.args),
+            tuple(sorted(selector.kwargs.items())),
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+    return None
+
+
+def _expand(selector, df):
+    """``selector.expand(df)`` without the cache.
+
+    Subclasses such as ``Cols`` override ``expand`` (to keep the requested
+    order and to raise on missing columns); the others use the method of the
+    base class, which is replaced by ``cached_expand`` in ``cached_selectors``.
+    """
+    expand = type(selector).expand
+    if expand is cached_expand:
+        expand = _original_expand
+    return expand(selector, df)
+
+
+def cached_expand(selector, df):
+    """Return ``selector.expand(df)``, memoized on the schema of ``df``.
+
+    Parameters
+    ----------
+    selector : selector, str or list of str
+        Anything accepted by ``s.make_selector``.
+    df : pandas or polars DataFrame
+        The dataframe on which the selector is resolved.
+
+    Returns
+    -------
+    list of str
+        The names of the matched columns. A new list is returned on each call,
+        so that modifying it does not modify the cache.
+    """
+    selector = _base.make_selector(selector)
+    fingerprint = schema_fingerprint(df)
+    key = _selector_key(selector, fingerprint.has_object_columns())
+    if key is None:
+        return _expand(selector, df)
+    key = (key, fingerprint)
+    if (columns := _CACHE.get(key)) is not None:
+        _CACHE.move_to_end(key)
+        return list(columns)
+    columns = _expand(selector, df)
+    _CACHE[key] = tuple(columns)
+    if len(_CACHE) > _MAX_CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return list(columns)
+
+
+@contextlib.contextmanager
+def cached_selectors():
+    """Resolve all the selectors with ``cached_expand`` in the ``with`` block.
+
+    This covers the selectors of ``ApplyToCols``, ``ApplyToFrame``,
+    ``SelectCols``, ``DropCols`` and of the ``TableVectorizer``, as well as
+    ``s.select``. The cache is emptied when the block exits.
+    """
+    try:
+        with mock.patch.object(_base.Selector, "expand", cached_expand):
+            yield
+    finally:
+        _CACHE.clear()
+
+
+def _wide_frame(n_columns, n_rows=100, seed=0):
+    """A pandas dataframe with numeric, string and datetime columns.
+
+    The string columns have the ``string`` dtype, see the module docstring.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {"num_id": np.arange(n_rows), "str_id": np.arange(n_rows).astype(str)}
+    for i in range(n_columns - 2):
+        kind = i % 3
+        if kind == 0:
+            columns[f"num_{i}"] = rng.normal(size=n_rows)
+        elif kind == 1:
+            columns[f"str_{i}"] = rng.choice(["a", "b", "c"], size=n_rows)
+        else:
+            columns[f"date_{i}"] = pd.Timestamp("2024-01-01") + pd.to_timedelta(
+                rng.integers(0, 365, size=n_rows), unit="D"
+            )
+    return pd.DataFrame(columns).convert_dtypes(
+        convert_integer=False, convert_floating=False
+    )
+
+
+def _best_time(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _resolve_all(selectors, df):
+    for selector in selectors:
+        selector.expand(df)
+
+
+def main():
+    """Time the resolution of 4 selectors, and ``ApplyToCols.fit``."""
+    selectors = [
+        s.numeric() - "num_id",
+        s.string() - "str_id",
+        s.any_date(),
+        s.all() - "num_id",
+    ]
+    rows = []
+    for n_columns in [500, 5000]:
+        pandas_df = _wide_frame(n_columns)
+        for library, df in [
+            ("pandas", pandas_df),
+            ("polars", pl.from_pandas(pandas_df)),
+        ]:
+            # a transformer that does nothing, so that mostly the selection is timed
+            apply = ApplyToCols(FunctionTransformer(), cols=s.numeric() - "num_id")
+            results = {}
+            for cache in ["no cache", "cache"]:
+                context = (
+                    cached_selectors() if cache == "cache" else contextlib.nullcontext()
+                )
+                with context:
+                    results[cache] = [sel.expand(df) for sel in selectors]
+                    resolve_time = _best_time(lambda: _resolve_all(selectors, df), 5)
+                    fit_time = _best_time(lambda: apply.fit(df), 5)
+                rows.append(
+                    {
+                        "data": f"{n_columns} columns ({library})",
+                        "selectors": cache,
+                        "fingerprint_time": _best_time(
+                            lambda: schema_fingerprint(df), 5
+                        ),
+                        "resolve_time": resolve_time,
+                        "apply_to_cols_fit_time": fit_time,
+                    }
+                )
+            same = results["cache"] == results["no cache"]
+            print(f"{n_columns} columns ({library}): same columns: {same}")
+    print()
+    print_results(rows)
+
+
+if __name__ == "__main__":
+    main()
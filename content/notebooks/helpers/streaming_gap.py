@@ -0,0 +1,242 @@
+"""
+Train a ``GapEncoder`` on text that does not fit in memory, one batch at a
+time.
+
+``GapEncoder.fit`` needs the whole column in memory and makes several passes
+over it, which is slow on the free-text wine columns. ``partial_fit`` updates
+the topics with one batch at a time. On its own, it does not stream well:
+without ``hashing=True`` the n-gram vocabulary is learned on the first batch
+only, with ``hashing=True`` it starts the training over on every batch, and
+the activations of every distinct string seen so far are kept in ``H_dict_``
+(which also makes each batch slower than the previous one). This module
+provides:
+- ``iter_csv_batches``: read one column of a CSV file in batches
+- ``synthetic_descriptions``: new wine descriptions made of sentences of the
+  real ones, to scale the dataset up
+- ``partial_fit_gap_encoder``: train a ``GapEncoder`` (with hashed n-grams)
+  on a stream of batches, with a bounded number of cached activations,
+  reading the next batches in a background thread, and recording the loss
+  on a validation sample as training goes
+- ``main``: compare the convergence over time of the streaming training and
+  of ``fit`` on an in-memory sample
+
+The loss is the Kullback-Leibler divergence returned by
+``GapEncoder.score``, divided by the number of rows (lower is better).
+"""
+
+import queue
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from skrub import GapEncoder
+
+from .benchmarking import DATA_DIR, print_results
+
+__all__ = [
+    "iter_csv_batches",
+    "synthetic_descriptions",
+    "partial_fit_gap_encoder",
+]
+
+WINE_CSV = DATA_DIR / "wine" / "data.csv"
+
+
+def iter_csv_batches(path, column, batch_size=1000):
+    """Yield the non-null values of one column of a CSV file, in batches."""
+    for chunk in pd.read_csv(path, usecols=[column], chunksize=batch_size):
+        yield chunk[column].dropna().reset_index(drop=True)
+
+
+def synthetic_descriptions(n_rows, seed=0, source=None):
+    """Make ``n_rows`` descriptions by recombining sentences of real ones.
+
+    Each new description has as many sentences as a randomly drawn real
+    description, each drawn at random from all the real sentences.
+    """
+    if source is None:
+        source = pd.read_csv(WINE_CSV, usecols=["description"])["description"]
+    rng = np.random.default_rng(seed)
+    split = source.dropna().map(lambda text: re.split(r"(?<=\.)\s+", text))
+    sentences = np.asarray([s for text in split for s in text], dtype=object)
+    lengths = split.map(len).to_numpy()[rng.integers(0, len(split), size=n_rows)]
+    picks = rng.integers(0, len(sentences), size=lengths.sum())
+    bounds = np.cumsum(lengths)[:-1]
+    return pd.Series(
+        [" ".join(parts) for parts in np.split(sentences[picks], bounds)],
+        name="description",
+    )
+
+
+def _prefetch(iterable, size):
+    """Iterate over ``iterable`` in a background thread, ``size`` items ahead."""
+    if size == 0:
+        yield from iterable
+        return
+    items = queue.Queue(maxsize=size)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+        items.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while (item := items.get()) is not done:
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def _bound_activations(encoder, max_cached):
+    """Keep only the most recently added half when there are too many."""
+    if max_cached is not None and len(encoder.H_dict_) > max_cached:
+        keys = list(encoder.H_dict_)[-(max_cached // 2) :]
+        encoder.H_dict_ = {key: encoder.H_dict_[key] for key in keys}
+
+
+def partial_fit_gap_encoder(
+    batches,
+    encoder=None,
+    max_cached_activations=20_000,
+    prefetch=2,
+    validation=None,
+    eval_every=10,
+):
+    """Train a ``GapEncoder`` with ``partial_fit`` on a stream of batches.
+
+    Parameters
+    ----------
+    batches : iterable of pandas or polars Series
+        E.g. ``iter_csv_batches(path, "description")``.
+    encoder : GapEncoder, optional
+        The (unfitted) encoder to train. Defaults to
+        ``GapEncoder(n_components=10, hashing=True, random_state=0)``;
+        without ``hashing``, the n-grams that do not appear in the first
+        batch are ignored.
+    max_cached_activations : int or None, default=20_000
+        The maximum number of distinct strings whose activations are kept to
+        warm-start the next batches; ``None`` keeps them all.
+    prefetch : int, default=2
+        How many batches are read ahead in a background thread (0 reads them
+        in the main thread). Reading and parsing the next batches then
+        overlaps with the updates of the topics.
+    validation : Series, optional
+        A sample on which the loss is computed every ``eval_every`` batches
+        and after the last one.
+    eval_every : int, default=10
+        See ``validation``.
+
+    Returns
+    -------
+    encoder : GapEncoder
+        The trained encoder.
+    history : list of dict
+        One row per evaluation, with the keys ``n_batches``, ``n_rows``,
+        ``elapsed_time`` (excluding the evaluations), ``n_cached`` (the
+        number of cached activations) and ``loss``.
+    """
+    if encoder is None:
+        encoder = GapEncoder(n_components=10, hashing=True, random_state=0)
+    else:
+        encoder = clone(encoder)
+    history = []
+    n_rows, elapsed, start = 0, 0.0, time.perf_counter()
+
+    def evaluate(n_batches):
+        nonlocal elapsed, start
+        elapsed += time.perf_counter() - start
+        n_cached = len(encoder.H_dict_)
+        loss = encoder.score(validation) / len(validation)
+        # score caches the activations of the validation strings: drop them
+        for key in list(encoder.H_dict_)[n_cached:]:
+            del encoder.H_dict_[key]
+        history.append(
+            {
+                "n_batches": n_batches,
+                "n_rows": n_rows,
+                "elapsed_time": elapsed,
+                "n_cached": n_cached,
+                "loss": loss,
+            }
+        )
+        start = time.perf_counter()
+
+    n_batches = 0
+    for n_batches, batch in enumerate(_prefetch(batches, prefetch), 1):
+        encoder.partial_fit(batch)
+        if not hasattr(encoder, "vocabulary"):
+            # partial_fit starts over on each batch unless it finds the
+            # vocabulary of the first one, which it only keeps without hashing
+            encoder.vocabulary = None
+        _bound_activations(encoder, max_cached_activations)
+        n_rows += len(batch)
+        if validation is not None and n_batches % eval_every == 0:
+            evaluate(n_batches)
+    if validation is not None and (
+        not history or history[-1]["n_batches"] != n_batches
+    ):
+        evaluate(n_batches)
+    return encoder, history
+
+
+def _data_size(column):
+    return int(column.memory_usage(deep=True))
+
+
+def main():
+    """Compare streaming training on 100k rows with ``fit`` on in-memory samples."""
+    n_rows, batch_size = 100_000, 2000
+    descriptions = pd.read_csv(WINE_CSV, usecols=["description"])["description"]
+    validation = descriptions.sample(2000, random_state=0).reset_index(drop=True)
+    encoder = GapEncoder(n_components=10, hashing=True, random_state=0)
+    rows = []
+    # timed without tracemalloc, which slows the GapEncoder down a lot
+    for n_samples in [10_000, 50_000]:
+        sample = synthetic_descriptions(n_samples, seed=1)
+        start = time.perf_counter()
+        fitted = clone(encoder).fit(sample)
+        rows.append(
+            {
+                "training": "fit",
+                "n_rows": n_samples,
+                "elapsed_time": time.perf_counter() - start,
+                "data_size": _data_size(sample),
+                "cached_activations": len(fitted.H_dict_),
+                "loss": f"{fitted.score(validation) / len(validation):.2f}",
+            }
+        )
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "descriptions.csv"
+        synthetic_descriptions(n_rows, seed=1).to_frame().to_csv(path, index=False)
+        batch = next(iter_csv_batches(path, "description", batch_size))
+        _, history = partial_fit_gap_encoder(
+            iter_csv_batches(path, "description", batch_size),
+            encoder,
+            validation=validation,
+            eval_every=5,
+        )
+    for record in history:
+        rows.append(
+            {
+                "training": f"partial_fit, batches of {batch_size}",
+                "n_rows": record["n_rows"],
+                "elapsed_time": record["elapsed_time"],
+                "data_size": _data_size(batch),
+                "cached_activations": record["n_cached"],
+                "loss": f"{record['loss']:.2f}",
+            }
+        )
+    print_results(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""
+Build a ``TableReport`` from a CSV or Parquet file read in chunks.
+
+``TableReport`` needs the whole dataframe in memory. ``StreamingTableReport``
+instead consumes the table one chunk at a time and only keeps, for each
+column, a set of fixed-size mergeable sketches (see ``helpers.sketches``):
+- null and row counters
+- a HyperLogLog sketch for the number of distinct values
+- a quantile sketch and exact moments for numeric and datetime columns, used
+  for the statistics, the histograms and the outlier counts
+- a count-min sketch for the most frequent values of the other columns
+
+The memory used does not depend on the number of rows, and partial reports
+built by different processes (e.g. one per Parquet file) can be merged. The
+report is rendered with skrub's templates, so it looks like a regular
+``TableReport``; the statistics are estimates, and associations between
+columns are not computed.
+"""
+
+import functools
+import time
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from skrub import TableReport, _config
+from skrub._reporting import _plotting, _summarize
+from skrub._reporting import _utils as _report_utils
+
+from .benchmarking import DATA_DIR, format_bytes, measure, print_results
+from .sketches import CountMinSketch, HyperLogLog, Moments, QuantileSketch, hash_values
+
+__all__ = [
+    "StreamingTableReport",
+    "iter_chunks",
+    "stream_table_report",
+    "benchmark_streaming_report",
+]
+
+# Number of points drawn from the quantile sketch to plot a histogram
+_N_HISTOGRAM_POINTS = 2000
+_QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+def iter_chunks(source, chunksize=100_000, **read_kwargs):
+    """Yield pandas dataframes of at most ``chunksize`` rows from a file.
+
+    ``.parquet`` files are read by row batches with pyarrow; other files are
+    read with ``pd.read_csv``, which receives the extra ``read_kwargs``.
+    """
+    source = Path(source)
+    if source.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, chunksize=chunksize, **read_kwargs)
+
+
+class _ColumnSketch:
+    """All the sketches kept for one column."""
+
+    def __init__(self, kind, dtype_name, *, hll_precision, quantile_k, n_top_values):
+        self.kind = kind
+        self.dtype_name = dtype_name
+        self.n_rows = 0
+        self.null_count = 0
+        self.n_distinct = HyperLogLog(hll_precision)
+        if kind == "other":
+            self.frequencies = CountMinSketch(n_candidates=n_top_values)
+        else:
+            self.moments = Moments()
+            self.quantiles = QuantileSketch(quantile_k)
+            self.is_increasing = self.is_decreasing = True
+            self.first = self.last = None
+
+    def update(self, column):
+        self.n_rows += len(column)
+        null_mask = column.isna().to_numpy()
+        self.null_count += int(null_mask.sum())
+        values = column[~null_mask]
+        if self.kind == "other":
+            counts = values.astype(str).value_counts(sort=False)
+            hashes = hash_values(counts.index.to_numpy())
+            self.frequencies.update(counts.index.to_numpy(), counts.to_numpy(), hashes)
+        else:
+            if self.kind == "datetime":
+                values = values.astype("datetime64[ns]").astype("int64")
+            values = pd.to_numeric(values, errors="coerce").dropna().to_numpy(float)
+            hashes = hash_values(np.unique(values))
+            self._update_order(values)
+            self.moments.update(values)
+            self.quantiles.update(values)
+        self.n_distinct.update(hashes)
+
+    def _update_order(self, values):
+        if not len(values):
+            return
+        diff = np.diff(values)
+        if self.last is not None:
+            diff = np.concatenate([[values[0] - self.last], diff])
+        self.is_increasing &= bool((diff >= 0).all())
+        self.is_decreasing &= bool((diff <= 0).all())
+        self.first = values[0] if self.first is None else self.first
+        self.last = values[-1]
+
+    def merge(self, other):
+        """Merge the sketch of the rows that follow the rows of this sketch."""
+        self.n_rows += other.n_rows
+        self.null_count += other.null_count
+        self.n_distinct.merge(other.n_distinct)
+        if self.kind == "other":
+            self.frequencies.merge(other.frequencies)
+            return self
+        self.moments.merge(other.moments)
+        self.quantiles.merge(other.quantiles)
+        if other.first is not None:
+            self._update_order(np.asarray([other.first, other.last]))
+            self.is_increasing &= other.is_increasing
+            self.is_decreasing &= other.is_decreasing
+        return self
+
+    def summary(self, name, position, with_plots):
+        """Column summary in the format produced by skrub's ``summarize_dataframe``."""
+        n_rows = max(1, self.n_rows)
+        summary = {
+            "position": position,
+            "idx": position,
+            "name": name,
+            "dtype": self.dtype_name,
+            "value_is_constant": False,
+            "is_ordered": self.kind != "other"
+            and (self.is_increasing or self.is_decreasing),
+            "null_count": self.null_count,
+            "null_proportion": self.null_count / n_rows,
+        }
+        if summary["null_proportion"] == 0.0:
+            summary["nulls_level"] = "ok"
+        elif summary["null_proportion"] == 1.0:
+            summary["nulls_level"] = "critical"
+        else:
+            summary["nulls_level"] = "warning"
+        if self.null_count == self.n_rows:
+            summary["plot_names"] = []
+            return summary
+        n_unique = max(1, self.n_distinct.estimate())
+        summary["n_unique"] = n_unique
+        summary["unique_proportion"] = n_unique / n_rows
+        summary["is_high_cardinality"] = (
+            n_unique > _config.get_config()["cardinality_threshold"]
+        )
+        if self.kind == "other":
+            self._add_value_counts(summary, with_plots)
+        else:
+            self._add_distribution(summary, with_plots)
+        summary["plot_names"] = [k for k in summary if k.endswith("_plot")]
+        return summary
+
+    def _add_value_counts(self, summary, with_plots):
+        value_counts = self.frequencies.top_values(10)
+        summary["value_counts"] = value_counts
+        summary["most_frequent_values"] = [v for v, _ in value_counts]
+        if summary["n_unique"] == 1:
+            summary["value_is_constant"] = True
+            summary["constant_value"] = value_counts[0][0]
+        elif with_plots:
+            summary["value_counts_plot"] = _plotting.value_counts(
+                value_counts,
+                summary["n_unique"],
+                self.n_rows,
+                color=_plotting.COLORS[1],
+            )
+
+    def _add_distribution(self, summary, with_plots):
+        moments = self.moments
+        if moments.min == moments.max:
+            summary["value_is_constant"] = True
+            summary["constant_value"] = self._to_output(moments.min)
+            return
+        if self.kind == "datetime":
+            summary["min"] = self._to_output(moments.min).isoformat()
+            summary["max"] = self._to_output(moments.max).isoformat()
+        else:
+            quantiles = self.quantiles.quantiles(_QUANTILES)
+            # the minimum and maximum are known exactly
+            quantiles[0], quantiles[-1] = moments.min, moments.max
+            summary.update(
+                is_duration=False,
+                duration_unit=None,
+                mean=moments.mean,
+                standard_deviation=moments.std,
+                quantiles=dict(zip(_QUANTILES, quantiles)),
+                inter_quartile_range=quantiles[3] - quantiles[1],
+            )
+        # a column whose values are spread like the full column, used to draw
+        # the histogram; the counts are then rescaled to the number of values
+        points = self.quantiles.quantiles(
+            (np.arange(_N_HISTOGRAM_POINTS) + 0.5) / _N_HISTOGRAM_POINTS
+        )
+        points = pd.Series(self._to_output(points), name=summary["name"])
+        if with_plots:
+            summary["histogram_plot"], data = _plotting.histogram(
+                points, color=_plotting.COLORS[0]
+            )
+        else:
+            data = _plotting.histogram_data(points)
+        scale = moments.count / _N_HISTOGRAM_POINTS
+        for key in ["bin_counts", "n_low_outliers", "n_high_outliers"]:
+            data[key] = np.round(np.asarray(data[key]) * scale).astype(int)
+        summary["histogram_data"] = data
+
+    def _to_output(self, values):
+        if self.kind == "datetime":
+            return pd.to_datetime(values)
+        return values
+
+
+class StreamingTableReport:
+    """Summarize a table chunk by chunk, with a memory that does not grow.
+
+    Parameters
+    ----------
+    n_sample_rows : int, default=10
+        Number of rows (half from the first chunk, half from the last) shown
+        in the sample table of the report.
+    hll_precision : int, default=14
+        Precision of the HyperLogLog sketches (``2 ** precision`` bytes each).
+    quantile_k : int, default=256
+        Capacity of each level of the quantile sketches.
+    n_top_values : int, default=50
+        Number of candidate most frequent values tracked per column.
+
+    Examples
+    --------
+    >>> report = StreamingTableReport()
+    >>> for chunk in iter_chunks("big_table.csv"):  # doctest: +SKIP
+    ...     report.update(chunk)
+    >>> report.to_table_report().open()  # doctest: +SKIP
+    """
+
+    def __init__(
+        self, n_sample_rows=10, hll_precision=14, quantile_k=256, n_top_values=50
+    ):
+        self.n_sample_rows = n_sample_rows
+        self.hll_precision = hll_precision
+        self.quantile_k = quantile_k
+        self.n_top_values = n_top_values
+        self.columns = {}
+        self.head = None
+        self.tail = None
+
+    @property
+    def n_rows(self):
+        return next(iter(self.columns.values())).n_rows if self.columns else 0
+
+    def update(self, chunk):
+        """Add a chunk (a pandas or polars dataframe) to the summary."""
+        if not isinstance(chunk, pd.DataFrame):
+            chunk = chunk.to_pandas()
+        if self.head is None:
+            self.head = chunk.head(-(self.n_sample_rows // -2))
+            for name in chunk.columns:
+                self.columns[name] = self._make_column_sketch(chunk[name])
+        elif list(chunk.columns) != list(self.columns):
+            raise ValueError("All chunks must have the same columns.")
+        self.tail = chunk.tail(self.n_sample_rows // 2)
+        for name, sketch in self.columns.items():
+            sketch.update(chunk[name])
+        return self
+
+    def _make_column_sketch(self, column):
+        if pd.api.types.is_datetime64_any_dtype(column):
+            kind = "datetime"
+        elif pd.api.types.is_numeric_dtype(column) and not (
+            pd.api.types.is_bool_dtype(column)
+        ):
+            kind = "numeric"
+        else:
+            kind = "other"
+        return _ColumnSketch(
+            kind,
+            _report_utils.get_dtype_name(column),
+            hll_precision=self.hll_precision,
+            quantile_k=self.quantile_k,
+            n_top_values=self.n_top_values,
+        )
+
+    def merge(self, other):
+        """Merge the report of the rows that follow the rows of this report."""
+        if other.head is None:
+            return self
+        if self.head is None:
+            self.columns, self.head = other.columns, other.head
+        else:
+            for name, sketch in self.columns.items():
+                sketch.merge(other.columns[name])
+        self.tail = other.tail
+        return self
+
+    def _sample(self):
+        return pd.concat([self.head, self.tail]).reset_index(drop=True)
+
+    def summary(self, with_plots=True):
+        """The summary dictionary used by ``TableReport`` to render the report."""
+        if self.head is None:
+            raise ValueError("The report is empty: call update() first.")
+        columns = [
+            sketch.summary(name, position, with_plots)
+            for position, (name, sketch) in enumerate(self.columns.items())
+        ]
+
+        def column_summary(column, position, dataframe_summary, **_):
+            return columns[position]
+
+        with mock.patch.object(_summarize, "_summarize_column", column_summary):
+            summary = _summarize.summarize_dataframe(
+                self._sample(),
+                with_plots=with_plots,
+                with_associations=False,
+                max_top_slice_size=len(self.head),
+                max_bottom_slice_size=len(self.tail),
+                verbose=0,
+            )
+        summary["n_rows"] = self.n_rows
+        return summary
+
+    def to_table_report(self, with_plots=True, **kwargs):
+        """Return a ``TableReport`` rendering the sketches."""
+        return _SketchTableReport(
+            self._sample(),
+            self.summary(with_plots=with_plots),
+            plot_distributions=with_plots,
+            compute_associations=False,
+            **kwargs,
+        )
+
+
+class _SketchTableReport(TableReport):
+    def __init__(self, sample, summary, **kwargs):
+        super().__init__(sample, **kwargs)
+        self._precomputed_summary = summary
+
+    @functools.cached_property
+    def _summary(self):
+        return self._precomputed_summary
+
+
+def stream_table_report(source, chunksize=100_000, read_kwargs=None, **kwargs):
+    """Build a ``StreamingTableReport`` from a CSV or Parquet file.
+
+    ``source`` may also be a list of files, which are summarized by parallel
+    joblib workers (``n_jobs``, passed in ``kwargs``) and then merged in
+    order.
+    """
+    n_jobs = kwargs.pop("n_jobs", 1)
+    if isinstance(source, (list, tuple)):
+        reports = Parallel(n_jobs=n_jobs)(
+            delayed(stream_table_report)(s, chunksize, read_kwargs, **kwargs)
+            for s in source
+        )
+        return functools.reduce(StreamingTableReport.merge, reports)
+    report = StreamingTableReport(**kwargs)
+    for chunk in iter_chunks(source, chunksize, **(read_kwargs or {})):
+        report.update(chunk)
+    return report
+
+
+def benchmark_streaming_report(path, chunksize=100_000):
+    """Compare ``TableReport`` and ``StreamingTableReport`` on a CSV file."""
+
+    def in_memory():
+        return TableReport(pd.read_csv(path), verbose=0)._summary
+
+    def streaming():
+        return stream_table_report(path, chunksize).summary()
+
+    results = []
+    for method, func in [("TableReport", in_memory), ("streaming", streaming)]:
+        _, stats = measure(func)
+        results.append({"method": method, **stats})
+    return results
+
+
+def main():
+    """Benchmark on employee_salaries repeated 50 times, written to a CSV file."""
+    import tempfile
+
+    data = pd.read_csv(DATA_DIR / "employee_salaries" / "data.csv")
+    data = pd.concat([data] * 50, ignore_index=True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "employee_salaries.csv"
+        data.to_csv(path, index=False)
+        print(f"{len(data)} rows, {format_bytes(path.stat().st_size)} on disk\n")
+        start = time.perf_counter()
+        results = benchmark_streaming_report(path)
+        print_results(results, columns=["method", "wall_time", "peak_memory"])
+        print(f"\nTotal time: {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Keep the vectors computed by string encoders in a memory-mapped cache on disk.
+
+Encoding the wine ``description`` column with a ``StringEncoder`` or a
+``TextEncoder`` takes seconds to minutes, and it is done again every time the
+notebook runs. This module provides:
+- ``VectorStore``: an on-disk table of vectors indexed by the 64-bit hash of
+  a string. The vectors are a memory-mapped ``.npy`` file, so reading them
+  costs a memory copy, and the least recently used entries are evicted when
+  the store is full
+- ``CachedEncoder``: a wrapper around a string encoder that stores the
+  fitted encoder (keyed by its parameters and a hash of the training column)
+  and the vectors it produces (in one ``VectorStore`` per fitted encoder),
+  so that fitting again on the same data and encoding strings that were seen
+  before read everything from the cache
+
+The vectors depend on the fitted encoder: a ``StringEncoder`` fitted on
+another cross-validation fold computes other vectors, and gets its own store.
+Encoders that do not learn from the data (``MinHashEncoder``, ``TextEncoder``
+without ``n_components``) share their vectors between folds.
+
+A cache directory should be used by one process at a time.
+"""
+
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from skrub import StringEncoder
+from skrub import _dataframe as sbd
+from skrub._single_column_transformer import SingleColumnTransformer
+
+from .benchmarking import DATA_DIR, format_bytes, measure, print_results
+from .unique_encoding import _factorize
+
+__all__ = ["VectorStore", "CachedEncoder"]
+
+
+def _hash_strings(values):
+    """64-bit hashes of an array of strings (nulls all have the same hash)."""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+class VectorStore:
+    """A memory-mapped table of vectors, indexed by 64-bit keys.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Where the store is kept; it is created if needed, and reopened with
+        its content otherwise.
+    n_features : int
+        The length of the vectors.
+    max_entries : int, default=100_000
+        The capacity of the store. When it is full, the least recently used
+        tenth of the entries (or more, if needed) is evicted.
+    dtype : dtype, default=np.float32
+        The dtype of the vectors.
+    """
+
+    def __init__(self, directory, n_features, max_entries=100_000, dtype=np.float32):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta_path = self.directory / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            if meta["n_features"] != n_features or meta["max_entries"] != max_entries:
+                raise ValueError(
+                    f"The store in {self.directory} holds {meta['n_features']}"
+                    f" features and {meta['max_entries']} entries, not"
+                    f" {n_features} and {max_entries}."
+                )
+            mode = "r+"
+        else:
+            meta = {"n_features": n_features, "max_entries": max_entries, "clock": 0}
+            mode = "w+"
+        self.meta = meta
+
+        def open_array(name, shape, dtype):
+            return np.lib.format.open_memmap(
+                self.directory / f"{name}.npy", mode=mode, dtype=dtype, shape=shape
+            )
+
+        self.vectors = open_array("vectors", (max_entries, n_features), dtype)
+        self.keys = open_array("keys", (max_entries,), np.uint64)
+        # 0 marks a free slot; the clock starts at 1
+        self.last_used = open_array("last_used", (max_entries,), np.int64)
+        used = np.flatnonzero(self.last_used)
+        self._slots = pd.Series(used, index=self.keys[used])
+        self._write_meta()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _write_meta(self):
+        (self.directory / "meta.json").write_text(json.dumps(self.meta))
+
+    def _tick(self):
+        self.meta["clock"] += 1
+        return self.meta["clock"]
+
+    def lookup(self, keys):
+        """The slot of each key, -1 for the keys that are not stored."""
+        slots = self._slots.reindex(keys).to_numpy()
+        slots = np.where(np.isnan(slots), -1, slots).astype(np.int64)
+        found = slots[slots >= 0]
+        self.last_used[found] = self._tick()
+        # a store reopened with an older clock would evict the wrong entries
+        self._write_meta()
+        return slots
+
+    def get(self, slots):
+        """Copy the vectors of the given slots from the memory map."""
+        return np.take(self.vectors, slots, axis=0)
+
+    def put(self, keys, vectors):
+        """Store new vectors and return their slots.
+
+        Storing them can evict the vectors of slots returned by ``lookup``:
+        read those first. When there are more keys than the capacity of the
+        store, only the first ``max_entries`` are stored, and the slot of the
+        others is -1.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        max_entries = self.meta["max_entries"]
+        all_slots = np.full(len(keys), -1, dtype=np.int64)
+        keys, vectors = keys[:max_entries], vectors[:max_entries]
+        free = np.flatnonzero(self.last_used == 0)
+        if len(free) < len(keys):
+            n_evicted = max(len(keys) - len(free), max_entries // 10)
+            used = np.flatnonzero(self.last_used)
+            oldest = used[np.argsort(self.last_used[used], kind="stable")[:n_evicted]]
+            self._slots = self._slots[~self._slots.isin(oldest)]
+            self.last_used[oldest] = 0
+            free = np.flatnonzero(self.last_used == 0)
+        slots = free[: len(keys)]
+        self.vectors[slots] = vectors
+        self.keys[slots] = keys
+        self.last_used[slots] = self._tick()
+        self._slots = pd.concat([self._slots, pd.Series(slots, index=keys)])
+        all_slots[: len(slots)] = slots
+        return all_slots
+
+    def flush(self):
+        for array in [self.vectors, self.keys, self.last_used]:
+            array.flush()
+        self._write_meta()
+
+
+class CachedEncoder(SingleColumnTransformer):
+    """A string encoder whose fits and vectors are cached on disk.
+
+    Parameters
+    ----------
+    encoder : single-column transformer
+        E.g. a ``StringEncoder``, ``MinHashEncoder`` or ``TextEncoder``.
+    cache_dir : str or Path
+        The cache directory, which can be shared by several encoders.
+    max_entries : int, default=100_000
+        The capacity of the vector store of each fitted encoder.
+
+    Attributes
+    ----------
+    encoder_ : transformer
+        The fitted encoder, loaded from the cache when it was fitted on the
+        same data before.
+    fit_from_cache_ : bool
+        Whether ``encoder_`` was loaded from the cache.
+    n_cache_hits_, n_cache_misses_ : int
+        The number of distinct strings found in (or added to) the vector store
+        by the last ``fit_transform`` or ``transform``.
+    """
+
+    def __init__(self, encoder, cache_dir, max_entries=100_000):
+        self.encoder = encoder
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def fit_transform(self, column, y=None):
+        cache_dir = Path(self.cache_dir)
+        fit_key = joblib.hash(
+            (type(self.encoder).__name__, self.encoder.get_params(), sbd.name(column))
+        )
+        data_key = joblib.hash(_hash_strings(sbd.to_numpy(column)))
+        fit_path = cache_dir / "fits" / f"{fit_key}_{data_key}.pkl"
+        if fit_path.exists():
+            self.encoder_, self.store_key_ = joblib.load(fit_path)
+            self.fit_from_cache_ = True
+            self.all_outputs_ = list(self.encoder_.get_feature_names_out())
+            return self.transform(column)
+        self.encoder_ = clone(self.encoder)
+        output = self.encoder_.fit_transform(column, y)
+        self.store_key_ = joblib.hash(self.encoder_)
+        fit_path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump((self.encoder_, self.store_key_), fit_path)
+        self.fit_from_cache_ = False
+        self.all_outputs_ = list(self.encoder_.get_feature_names_out())
+        # the vectors of the rows are stored, rather than computed again
+        store = self._get_store()
+        codes, uniques = _factorize(column)
+        keys = _hash_strings(sbd.to_numpy(uniques))
+        missing = np.flatnonzero(store.lookup(keys) < 0)
+        self.n_cache_hits_ = len(keys) - len(missing)
+        self.n_cache_misses_ = len(missing)
+        if len(missing):
+            _, first_rows = np.unique(codes, return_index=True)
+            store.put(keys[missing], sbd.to_numpy(output)[first_rows[missing]])
+            store.flush()
+        return output
+
+    def _get_store(self):
+        return VectorStore(
+            Path(self.cache_dir) / "vectors" / self.store_key_,
+            n_features=len(self.all_outputs_),
+            max_entries=self.max_entries,
+        )
+
+    def transform(self, column):
+        store = self._get_store()
+        codes, uniques = _factorize(column)
+        keys = _hash_strings(sbd.to_numpy(uniques))
+        slots = store.lookup(keys)
+        missing = np.flatnonzero(slots < 0)
+        self.n_cache_hits_ = len(keys) - len(missing)
+        self.n_cache_misses_ = len(missing)
+        # copied before ``put``, which can evict the slots that were just found
+        unique_values = np.empty(
+            (len(keys), len(self.all_outputs_)), store.vectors.dtype
+        )
+        unique_values[slots >= 0] = store.get(slots[slots >= 0])
+        if len(missing):
+            new_values = sbd.make_column_like(
+                uniques, sbd.to_numpy(uniques)[missing], sbd.name(uniques)
+            )
+            vectors = sbd.to_numpy(self.encoder_.transform(new_values))
+            unique_values[missing] = vectors
+            # the vectors beyond the capacity of the store are not cached
+            store.put(keys[missing], vectors)
+            store.flush()
+        values = unique_values[codes]
+        if sbd.is_pandas(column):
+            return pd.DataFrame(values, columns=self.all_outputs_, index=column.index)
+        import polars as pl
+
+        return pl.DataFrame(values, schema=self.all_outputs_)
+
+
+def main():
+    """Encode the wine descriptions with a cold and a warm cache."""
+    descriptions = pd.read_csv(DATA_DIR / "wine" / "data.csv")["description"]
+    cache_dir = Path(tempfile.mkdtemp(prefix="vector_cache_"))
+    rows = []
+    try:
+        variants = [
+            ("StringEncoder", lambda: StringEncoder()),
+            ("cold cache", lambda: CachedEncoder(StringEncoder(), cache_dir)),
+            ("warm cache", lambda: CachedEncoder(StringEncoder(), cache_dir)),
+        ]
+        for name, make_encoder in variants:
+            encoder = make_encoder()
+            output, fit_stats = measure(encoder.fit_transform, descriptions)
+            _, transform_stats = measure(encoder.transform, descriptions)
+            rows.append(
+                {
+                    "variant": name,
+                    "fit_transform_time": fit_stats["wall_time"],
+                    "transform_time": transform_stats["wall_time"],
+                    "peak_memory": fit_stats["peak_memory"],
+                    "output_dtype": str(sbd.to_numpy(output).dtype),
+                }
+            )
+        size = sum(f.stat().st_size for f in cache_dir.rglob("*") if f.is_file())
+        print_results(rows)
+        print(f"\ncache size: {format_bytes(size)}")
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    main()
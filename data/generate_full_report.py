@@ -1,9 +1,31 @@
 # %%
+import sys
+from pathlib import Path
+
 import skrub
 from sklearn.ensemble import ExtraTreesClassifier
 from skrub import selectors as s
 
-data = skrub.datasets.fetch_credit_fraud()
+# the course helpers live next to the book chapters
+sys.path.append(str(Path(__file__).resolve().parent.parent / "book" / "chapters"))
+from helpers import (  # noqa: E402
+    CREDIT_FRAUD_BASKETS,
+    generate_credit_fraud,
+    load_credit_fraud,
+    memory_report,
+)
+
+# None downloads the real dataset; a number (e.g. 10 for ten times as many
+# baskets) generates tables with the same schema offline instead
+SYNTHETIC_SCALE = None
+
+if SYNTHETIC_SCALE is None:
+    data = skrub.datasets.fetch_credit_fraud()
+else:
+    generate_credit_fraud(
+        "credit_fraud_synthetic", n_baskets=SYNTHETIC_SCALE * CREDIT_FRAUD_BASKETS
+    )
+    data = load_credit_fraud("credit_fraud_synthetic")
 
 baskets = skrub.var("baskets", data.baskets)
 products = skrub.var("products", data.products)  # add a new variable
@@ -27,7 +49,10 @@ predictions = features.skb.apply(ExtraTreesClassifier(n_jobs=-1), y=y)
 
 # %%
 learner = predictions.skb.make_learner()
-learner.report(
+# same as learner.report(), but each node page also shows the memory used by
+# the node, and intermediate results are freed once all their consumers ran
+memory_report(
+    learner,
     environment=predictions.skb.get_data(),
     mode="fit",
     output_dir="dataop_report",
@@ -0,0 +1,253 @@
+"""
+Store the files of the freeze trees once, in a content-addressed store.
+
+Quarto keeps the executed cells of each document (``execute-results/html.json``)
+and their figures in a ``_freeze`` folder per project, and the same figures
+(and ``site_libs`` files) appear in ``book/_freeze``, ``book/content`` and
+``slides/_freeze``. This script provides:
+- ``pack``: after a render, move the content of every file of the trees to
+  ``.freeze_store/blobs/<sha256>`` and replace the file by a hard link to its
+  blob, so that identical files take the disk space of one. Files whose size
+  and modification time did not change since the last ``pack`` are not read
+  again. The path -> hash manifest is written to ``.freeze_store/manifest.json``
+- ``checkout``: before a render, recreate the missing files of the trees from
+  the manifest, and give a private copy of its files to each document whose
+  source changed since it was frozen (quarto writes its new results in place,
+  which would change every other path linked to the same blob)
+- ``stats``: the number of files and bytes in the trees, and in the store
+
+A document is stale when the ``hash`` of its ``html.json`` (the MD5 of the
+source, as computed by quarto) differs from the MD5 of its ``.qmd`` file.
+The blobs, and so the files linked to them, are read-only: a render that
+was not preceded by ``checkout`` fails on the first frozen file it writes,
+instead of changing it in every tree. When hard links are not supported
+(e.g. across file systems), the files are copied instead.
+
+Usage, from the root of the repository::
+
+    python freeze_store.py checkout
+    quarto render
+    python freeze_store.py pack
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import stat
+from pathlib import Path
+
+TREES = ["book/_freeze", "book/content", "slides/_freeze"]
+STORE = ".freeze_store"
+_CHUNK_SIZE = 1 << 20
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_key(stat):
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def _tree_files(trees):
+    for tree in trees:
+        for path in sorted(Path(tree).rglob("*")):
+            if path.is_file():
+                yield path.as_posix()
+
+
+def _load_manifest(store):
+    path = Path(store) / "manifest.json"
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text("utf-8"))
+
+
+def _write_manifest(store, manifest):
+    path = Path(store) / "manifest.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True), "utf-8")
+    os.replace(tmp, path)
+
+
+def _blob_path(store, digest):
+    return Path(store) / "blobs" / digest[:2] / digest
+
+
+def _link_or_copy(source, target):
+    """Replace ``target`` by a hard link to ``source``; return the bytes copied."""
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".freeze_store.tmp")
+    try:
+        os.link(source, tmp)
+        copied = 0
+    except OSError:
+        shutil.copyfile(source, tmp)
+        copied = Path(source).stat().st_size
+    os.replace(tmp, target)
+    return copied
+
+
+def _make_read_only(path):
+    mode = os.stat(path).st_mode
+    os.chmod(path, stat.S_IMODE(mode) & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _detach(path):
+    """Replace a hard link by a private, writable copy; return the bytes copied."""
+    if os.stat(path).st_nlink == 1 and os.access(path, os.W_OK):
+        return 0
+    tmp = Path(path).with_name(Path(path).name + ".freeze_store.tmp")
+    shutil.copyfile(path, tmp)
+    os.replace(tmp, path)
+    return os.stat(path).st_size
+
+
+def _document_dir(path):
+    """The freeze folder of the document a file belongs to, or None (site_libs)."""
+    parts = Path(path).parts
+    for marker in ("execute-results", "figure-html"):
+        if marker in parts[:-1]:
+            return Path(*parts[: parts.index(marker)])
+    return None
+
+
+def _is_stale(tree, document_dir):
+    """Whether the source of a frozen document changed since it was executed."""
+    results = document_dir / "execute-results" / "html.json"
+    if not results.exists():
+        return True
+    project = Path(tree).parent
+    relative = document_dir.relative_to(tree)
+    for suffix in (".qmd", ".ipynb"):
+        source = project / relative.with_suffix(suffix)
+        if source.exists():
+            frozen = json.loads(results.read_text("utf-8"))["hash"]
+            return hashlib.md5(source.read_bytes()).hexdigest() != frozen
+    # the source was moved or deleted: quarto does not use these results
+    return False
+
+
+def pack(trees=TREES, store=STORE):
+    """Move the files of the trees to the store and replace them by hard links.
+
+    Returns
+    -------
+    dict
+        ``files``, ``total_bytes`` (the size of the trees), ``unique_bytes``
+        (the size of the store), ``read_bytes`` (hashed because they changed
+        since the last ``pack``), ``written_bytes`` (new blobs that could not
+        be linked, and files that could not be replaced by a link) and
+        ``pruned_blobs``.
+    """
+    old_manifest = _load_manifest(store)
+    manifest = {}
+    stats = dict(files=0, total_bytes=0, read_bytes=0, written_bytes=0)
+    for path in _tree_files(trees):
+        stat = os.stat(path)
+        entry = old_manifest.get(path)
+        if entry is not None and entry["stat"] == _stat_key(stat):
+            digest = entry["sha256"]
+        else:
+            digest = _sha256(path)
+            stats["read_bytes"] += stat.st_size
+        blob = _blob_path(store, digest)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            stats["written_bytes"] += _link_or_copy(path, blob)
+        _make_read_only(blob)
+        if not os.path.samefile(path, blob):
+            stats["written_bytes"] += _link_or_copy(blob, path)
+        manifest[path] = {"sha256": digest, "stat": _stat_key(os.stat(path))}
+        stats["files"] += 1
+        stats["total_bytes"] += stat.st_size
+
+    used = {entry["sha256"] for entry in manifest.values()}
+    stats["pruned_blobs"] = 0
+    for blob in (Path(store) / "blobs").glob("*/*"):
+        if blob.name not in used:
+            blob.unlink()
+            stats["pruned_blobs"] += 1
+    stats["unique_bytes"] = sum(
+        _blob_path(store, digest).stat().st_size for digest in used
+    )
+    _write_manifest(store, manifest)
+    return stats
+
+
+def checkout(trees=TREES, store=STORE):
+    """Prepare the trees for a render.
+
+    Missing files are linked from the store, and the files of the documents
+    that quarto will execute again are replaced by private copies.
+
+    Returns
+    -------
+    dict
+        ``restored`` (files), ``stale_documents``, ``detached`` (files) and
+        ``written_bytes``.
+    """
+    manifest = _load_manifest(store)
+    stats = dict(restored=0, stale_documents=0, detached=0, written_bytes=0)
+    for path, entry in manifest.items():
+        if not any(Path(path).is_relative_to(tree) for tree in trees):
+            continue
+        if not os.path.exists(path):
+            stats["written_bytes"] += _link_or_copy(
+                _blob_path(store, entry["sha256"]), path
+            )
+            stats["restored"] += 1
+
+    for tree in trees:
+        stale = {}
+        for path in _tree_files([tree]):
+            document_dir = _document_dir(path)
+            if document_dir is not None and document_dir not in stale:
+                stale[document_dir] = _is_stale(tree, document_dir)
+            # site_libs are copied again by quarto at every render
+            if document_dir is None or stale[document_dir]:
+                copied = _detach(path)
+                stats["detached"] += bool(copied)
+                stats["written_bytes"] += copied
+        stats["stale_documents"] += sum(stale.values())
+    return stats
+
+
+def tree_stats(trees=TREES, store=STORE):
+    """The number of files and bytes in the trees, and the size of the store."""
+    manifest = _load_manifest(store)
+    files = list(_tree_files(trees))
+    digests = {entry["sha256"] for entry in manifest.values()}
+    return {
+        "files": len(files),
+        "total_bytes": sum(os.stat(path).st_size for path in files),
+        "unique_files": len({_sha256(path) for path in files}),
+        "store_blobs": len(digests),
+        "store_bytes": sum(
+            _blob_path(store, digest).stat().st_size
+            for digest in digests
+            if _blob_path(store, digest).exists()
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("command", choices=["pack", "checkout", "stats"])
+    parser.add_argument("--store", default=STORE)
+    parser.add_argument("trees", nargs="*", default=TREES)
+    args = parser.parse_args()
+    command = {"pack": pack, "checkout": checkout, "stats": tree_stats}[args.command]
+    for key, value in command(args.trees, args.store).items():
+        print(f"{key}: {value:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+"""
+Prepare the rendered website for fast serving, serve it, and load test it.
+
+``python -m http.server`` speaks HTTP/1.0 (one connection per request), sends
+no caching headers and compresses nothing, so the large pages of the site (the
+TableReports, ``dataop_report/node_*.html``, the JupyterLite bundle) are sent
+in full at every load. This script provides:
+- ``build``: a post-build step that copies each static asset (CSS, JS, images,
+  fonts) referenced by the HTML and CSS files to a name that contains the hash
+  of its content (``style.css`` -> ``style.3f2a9c01d4.css``), rewrites the
+  references, and writes ``.gz`` (and, if the ``brotli`` package is
+  installed, ``.br``) variants of the text files next to them
+- ``serve``: a threaded HTTP/1.1 server (keep-alive) that sends the
+  precompressed variant accepted by the client, ``Cache-Control: immutable``
+  for fingerprinted files and ``no-cache`` with an ``ETag`` for the others,
+  and answers ``Range`` and ``If-None-Match`` requests
+- ``loadtest``: request the pages of a site from several threads for a few
+  seconds, and report the requests per second, the bytes transferred and the
+  latency; ``--compare`` also runs it against ``http.server`` on the same
+  files
+
+The original files are kept, so that the references that are not rewritten
+(e.g. files loaded by JavaScript) still work.
+
+Usage, from the root of the repository::
+
+    python static_site.py build _build
+    python static_site.py serve _build --port 8000
+    python static_site.py loadtest _build --compare
+"""
+
+import argparse
+import email.utils
+import gzip
+import hashlib
+import http.client
+import os
+import re
+import shutil
+import socket
+import statistics
+import threading
+import time
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_SUFFIXES = {
+    ".css", ".js", ".mjs", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp",
+    ".ico", ".woff", ".woff2", ".ttf", ".eot",
+}  # fmt: skip
+COMPRESSED_SUFFIXES = {
+    ".html", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".xml", ".map",
+    ".wasm", ".ipynb", ".csv", ".md",
+}  # fmt: skip
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_FINGERPRINTED = re.compile(r"\.[0-9a-f]{10}\.[^./]+$")
+_HTML_REFERENCE = re.compile(r"""(\b(?:src|href)\s*=\s*)(["'])([^"'#?]+)""")
+_CSS_REFERENCE = re.compile(r"""(url\(\s*)(["']?)([^"')#?]+)""")
+
+
+def _content_hash(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:10]
+
+
+def _is_local(url):
+    return not (urlsplit(url).scheme or url.startswith(("//", "#", "data:")))
+
+
+def _rewrite(path, root, pattern, fingerprints):
+    """Point the references of a text file to the fingerprinted assets."""
+    text = path.read_text("utf-8", errors="surrogateescape")
+
+    def replace(match):
+        prefix, quote, url = match.groups()
+        if not _is_local(url):
+            return match.group(0)
+        base = root if url.startswith("/") else path.parent
+        target = os.path.normpath(base / unquote(url.lstrip("/")))
+        if target not in fingerprints:
+            return match.group(0)
+        # keeps the directory of the reference, and the leading "/" of "/app.js"
+        head, slash, _ = url.rpartition("/")
+        return f"{prefix}{quote}{head}{slash}{fingerprints[target]}"
+
+    new_text = pattern.sub(replace, text)
+    if new_text != text:
+        path.write_text(new_text, "utf-8", errors="surrogateescape")
+        return True
+    return False
+
+
+def _accepted_encodings(header):
+    """The content codings of an ``Accept-Encoding`` header whose q-value is not 0.
+
+    A coding that is not listed is accepted if ``*`` is (with a q-value above 0).
+    """
+    q_values = {}
+    for item in header.split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        if not name:
+            continue
+        q_value = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q_value = float(value)
+                except ValueError:
+                    q_value = 0.0
+        q_values[name.lower()] = q_value
+    wildcard = q_values.get("*", 0.0)
+    return {name for name in ENCODINGS if q_values.get(name, wildcard) > 0}
+
+
+def _fingerprint(path):
+    """Copy (or link) an asset to its fingerprinted name; return the new name."""
+    name = f"{path.stem}.{_content_hash(path)}{path.suffix}"
+    target = path.with_name(name)
+    if not target.exists():
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copyfile(path, target)
+    return name
+
+
+def _compress(path, min_size):
+    """Write the precompressed variants of a file; return the bytes written."""
+    written = 0
+    mtime = path.stat().st_mtime
+    data = None
+    compressors = {".gz": partial(gzip.compress, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors[".br"] = partial(brotli.compress, quality=11)
+    for suffix, compress in compressors.items():
+        variant = path.with_name(path.name + suffix)
+        if variant.exists() and variant.stat().st_mtime >= mtime:
+            continue
+        if data is None:
+            data = path.read_bytes()
+            if len(data) < min_size:
+                return 0
+        compressed = compress(data)
+        if len(compressed) < 0.9 * len(data):
+            variant.write_bytes(compressed)
+            written += len(compressed)
+    return written
+
+
+def build(directory, min_size=1024):
+    """Fingerprint the assets of a site and write precompressed variants.
+
+    Parameters
+    ----------
+    directory : str or Path
+        The output directory of the render (e.g. ``_build``).
+    min_size : int, default=1024
+        Files smaller than this are not compressed.
+
+    Returns
+    -------
+    dict
+        ``fingerprinted`` (assets), ``rewritten`` (HTML and CSS files),
+        ``compressed`` (files) and ``compressed_bytes`` (written).
+    """
+    root = Path(directory)
+    files = [p for p in sorted(root.rglob("*")) if p.is_file()]
+    assets = [
+        p
+        for p in files
+        if p.suffix in ASSET_SUFFIXES and not _FINGERPRINTED.search(p.name)
+    ]
+    stats = dict(fingerprinted=0, rewritten=0, compressed=0, compressed_bytes=0)
+    fingerprints = {}
+    # the other assets first, so that the hash of a stylesheet covers the
+    # names of the fonts and images it refers to
+    for asset in sorted(assets, key=lambda p: p.suffix == ".css"):
+        if asset.suffix == ".css":
+            stats["rewritten"] += _rewrite(asset, root, _CSS_REFERENCE, fingerprints)
+        fingerprints[os.path.normpath(asset)] = _fingerprint(asset)
+        stats["fingerprinted"] += 1
+    for page in files:
+        if page.suffix == ".html":
+            stats["rewritten"] += _rewrite(page, root, _HTML_REFERENCE, fingerprints)
+
+    for path in sorted(root.rglob("*")):
+        if path.is_file() and path.suffix in COMPRESSED_SUFFIXES:
+            written = _compress(path, min_size)
+            stats["compressed"] += bool(written)
+            stats["compressed_bytes"] += written
+    return stats
+
+
+def _parse_range(header, size):
+    """The (start, stop) of a single ``bytes=`` range, None, or "invalid"."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if match is None or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, stop = max(size - int(last), 0), size
+    else:
+        start = int(first)
+        stop = min(int(last) + 1, size) if last else size
+    if start >= size or start >= stop:
+        return "invalid"
+    return start, stop
+
+
+class PrecompressedHandler(SimpleHTTPRequestHandler):
+    """Serve the files of a site built with ``build``.
+
+    The precompressed variant of a file is sent when the client accepts its
+    encoding, and the ``Range`` requests are answered from the original file.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # the headers and the body are written separately: without this, on
+        # a kept-alive connection the body waits for the delayed ACK (~40 ms)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send_head(self):
+        self._length = None
+        path = Path(self.translate_path(self.path))
+        if path.is_dir():
+            if not urlsplit(self.path).path.endswith("/"):
+                # let http.server send the redirect to the trailing slash
+                return super().send_head()
+            if not (path / "index.html").is_file():
+                return super().send_head()
+            path = path / "index.html"
+        if not path.is_file():
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        stat = path.stat()
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        range_header = self.headers.get("Range")
+        encoding, served = None, path
+        if range_header is None:
+            accepted = _accepted_encodings(self.headers.get("Accept-Encoding", ""))
+            for name, suffix in ENCODINGS.items():
+                variant = path.with_name(path.name + suffix)
+                if name in accepted and variant.is_file():
+                    encoding, served = name, variant
+                    break
+        if encoding is not None:
+            etag = f'{etag[:-1]}-{encoding}"'
+
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._send_caching_headers(path, etag)
+            self.end_headers()
+            return None
+
+        size = served.stat().st_size
+        requested = None if range_header is None else _parse_range(range_header, size)
+        if requested == "invalid":
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        file = open(served, "rb")
+        if requested is None:
+            self.send_response(HTTPStatus.OK)
+            start, stop = 0, size
+        else:
+            start, stop = requested
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Range", f"bytes {start}-{stop - 1}/{size}")
+            file.seek(start)
+        self._length = stop - start
+        self.send_header("Content-Type", self.guess_type(str(path)))
+        self.send_header("Content-Length", str(self._length))
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        self._send_caching_headers(path, etag)
+        self.end_headers()
+        return file
+
+    def _send_caching_headers(self, path, etag):
+        cache = IMMUTABLE if _FINGERPRINTED.search(path.name) else "no-cache"
+        self.send_header("Cache-Control", cache)
+        self.send_header("ETag", etag)
+        self.send_header(
+            "Last-Modified", email.utils.formatdate(path.stat().st_mtime, usegmt=True)
+        )
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Vary", "Accept-Encoding")
+
+    def copyfile(self, source, outputfile):
+        if self._length is None:
+            # a directory listing
+            return super().copyfile(source, outputfile)
+        remaining = self._length
+        while remaining:
+            chunk = source.read(min(remaining, 1 << 16))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(directory, host="127.0.0.1", port=8000, handler=None, quiet=False):
+    """A ``ThreadingHTTPServer`` serving ``directory`` (not started)."""
+    handler = PrecompressedHandler if handler is None else handler
+    server = ThreadingHTTPServer(
+        (host, port), partial(handler, directory=str(directory))
+    )
+    server.daemon_threads = True
+    server.quiet = quiet
+    return server
+
+
+def _site_paths(directory):
+    """The URL paths of the pages of a site, and of the files they refer to."""
+    root = Path(directory)
+    paths = []
+    for page in sorted(root.rglob("*.html")):
+        paths.append("/" + page.relative_to(root).as_posix())
+        text = page.read_text("utf-8", errors="replace")
+        for _, _, url in _HTML_REFERENCE.findall(text):
+            target = Path(os.path.normpath(page.parent / unquote(url)))
+            if _is_local(url) and not url.startswith("/") and target.is_file():
+                paths.append("/" + target.relative_to(root).as_posix())
+    return list(dict.fromkeys(paths))
+
+
+def load_test(host, port, paths, n_threads=8, duration=5.0, encoding="br, gzip"):
+    """Request ``paths`` in a loop from ``n_threads`` threads for ``duration`` s.
+
+    Connections are kept open when the server allows it.
+
+    Returns
+    -------
+    dict
+        ``requests``, ``errors``, ``requests_per_second``,
+        ``bytes_per_second`` (of response bodies), ``median_time`` and
+        ``p99_time`` (the latency of one request).
+    """
+    latencies = []
+    counts = {"errors": 0, "bytes": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(offset):
+        connection = None
+        local_latencies, local_bytes, local_errors = [], 0, 0
+        i = offset
+        while time.perf_counter() < stop_at:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection(host, port, timeout=30)
+                connection.request("GET", path, headers={"Accept-Encoding": encoding})
+                response = connection.getresponse()
+                body = response.read()
+                if response.will_close:
+                    connection.close()
+                    connection = None
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection = None
+                continue
+            local_latencies.append(time.perf_counter() - start)
+            local_bytes += len(body)
+            local_errors += response.status >= 400
+        if connection is not None:
+            connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            counts["bytes"] += local_bytes
+            counts["errors"] += local_errors
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": counts["errors"],
+        "requests_per_second": len(latencies) / elapsed,
+        "bytes_per_second": counts["bytes"] / elapsed,
+        "median_time": statistics.median(latencies) if latencies else float("nan"),
+        "p99_time": (
+            latencies[int(0.99 * (len(latencies) - 1))] if latencies else float("nan")
+        ),
+    }
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    """The handler of ``python -m http.server``, without the request log."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _run_load_test(directory, handler, n_threads, duration):
+    server = make_server(directory, port=0, handler=handler, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        return load_test(
+            host, port, _site_paths(directory), n_threads=n_threads, duration=duration
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _print_load_test(name, result):
+    print(
+        f"{name:<12} {result['requests_per_second']:>9.1f} req/s "
+        f"{result['bytes_per_second'] / 2**20:>8.1f} MiB/s "
+        f"median {result['median_time'] * 1000:>7.2f} ms "
+        f"p99 {result['p99_time'] * 1000:>7.2f} ms "
+        f"({result['requests']} requests, {result['errors']} errors)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="fingerprint and compress")
+    build_parser.add_argument("directory")
+    build_parser.add_argument("--min-size", type=int, default=1024)
+    serve_parser = subparsers.add_parser("serve", help="serve a built site")
+    serve_parser.add_argument("directory")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    test_parser = subparsers.add_parser("loadtest", help="measure requests/s")
+    test_parser.add_argument("directory")
+    test_parser.add_argument("--threads", type=int, default=8)
+    test_parser.add_argument("--duration", type=float, default=5.0)
+    test_parser.add_argument(
+        "--compare", action="store_true", help="also test python -m http.server"
+    )
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for key, value in build(args.directory, args.min_size).items():
+            print(f"{key}: {value:,}")
+        if brotli is None:
+            print("brotli is not installed: only the gzip variants were written")
+    elif args.command == "serve":
+        server = make_server(args.directory, args.host, args.port)
+        print(f"Serving {args.directory} on http://{args.host}:{args.port}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    else:
+        print(f"{len(_site_paths(args.directory))} paths, {args.threads} threads")
+        handlers = {"precompressed": PrecompressedHandler}
+        if args.compare:
+            handlers = {"http.server": _QuietHandler, **handlers}
+        for name, handler in handlers.items():
+            result = _run_load_test(
+                args.directory, handler, args.threads, args.duration
+            )
+            _print_load_test(name, result)
+
+
+if __name__ == "__main__":
+    main()